@@ -0,0 +1,110 @@
+"""Compare record_data encodings: stored bytes per run and encode/decode time.
+
+    python -m benchmarks.codec --size 10k --output benchmarks/results/codec.json
+
+`legacy` is the JSON text stored before the record codec. Every other variant is a RecordCodec
+serializer/compression pair, with and without a preset dictionary trained on the first runs. Runs are
+measured both trimmed to [API] RECORD_KEYS, as they are stored now, and as full API records.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+
+import src.services.record_codec as record_codec
+from src.services.data_manager import DICTIONARY_SAMPLE_SIZE
+from src.services.record_codec import RecordCodec, SERIALIZERS, COMPRESSIONS
+
+from .run import parse_size, load_config, git_commit
+from .synthetic import RecordGenerator
+
+
+def _timed(run) -> tuple:
+    gc.collect()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        value = run()
+        return value, time.perf_counter() - started
+    finally:
+        gc.enable()
+
+
+def _installed(serializer: str, compression: str) -> bool:
+    return ((serializer != "msgpack" or record_codec.msgpack is not None)
+            and (compression != "zstd" or record_codec.zstandard is not None))
+
+
+def compare(shape: str, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    results = []
+
+    def add(variant: str, encoded: list, encode_seconds: float, decode_seconds: float):
+        size = sum(len(value) for value in encoded)
+        result = {
+            "shape": shape, "variant": variant, "runs": len(records), "bytes": size,
+            "bytes_per_run": round(size / len(records), 1),
+            "encode_us_per_run": round(encode_seconds / len(records) * 1e6, 2),
+            "decode_us_per_run": round(decode_seconds / len(records) * 1e6, 2),
+        }
+        results.append(result)
+        print(f"{shape:<6} {variant:<22} {result['bytes_per_run']:9.1f} B {result['encode_us_per_run']:9.2f} us "
+              f"{result['decode_us_per_run']:9.2f} us", file=sys.stderr)
+
+    encoded, encode_seconds = _timed(lambda: [json.dumps(r, sort_keys=True).encode("utf-8") for r in records])
+    _, decode_seconds = _timed(lambda: [json.loads(value) for value in encoded])
+    add("legacy", encoded, encode_seconds, decode_seconds)
+
+    for serializer in SERIALIZERS:
+        for compression in COMPRESSIONS:
+            if not _installed(serializer, compression):
+                continue
+            for with_dictionary in (False, True) if compression != "none" else (False,):
+                codec = RecordCodec(serializer, compression)
+                if with_dictionary:
+                    codec.add_dictionary(1, codec.build_dictionary(records[:DICTIONARY_SAMPLE_SIZE]))
+                encoded, encode_seconds = _timed(lambda: [codec.encode(r) for r in records])
+                decoded, decode_seconds = _timed(lambda: [codec.decode(value) for value in encoded])
+                if decoded != records:
+                    raise AssertionError(f"{serializer}+{compression} did not round-trip")
+                add(f"{serializer}+{compression}{'+dict' if with_dictionary else ''}",
+                    encoded, encode_seconds, decode_seconds)
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compare record_data storage encodings on synthetic runs")
+    parser.add_argument("--size", default="10k", help="number of synthetic runs, e.g. 10k")
+    parser.add_argument("--output", default=os.path.join("benchmarks", "results", "codec.json"),
+                        help="JSON results file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    size = parse_size(args.size)
+    config = load_config()
+    keys = [key.strip() for key in config.get("API", "RECORD_KEYS", fallback="*").split(",") if key.strip()]
+    full = RecordGenerator(seed=size).records(size)
+    trimmed = [{key: record[key] for key in keys if key in record} for record in full] if keys != ["*"] else full
+
+    print(f"{'shape':<6} {'variant':<22} {'size':>11} {'encode':>12} {'decode':>12}", file=sys.stderr)
+    results = compare("stored", trimmed) + compare("full", full)
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
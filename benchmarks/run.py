@@ -0,0 +1,221 @@
+"""Benchmark the storage, analysis and list-rendering hot paths on synthetic histories.
+
+    python -m benchmarks.run --sizes 1k,10k,100k --output benchmarks/results/latest.json
+
+Each stage is timed once without tracing, then (unless --no-memory) repeated under tracemalloc for its
+peak Python allocation. Results are written as JSON so runs can be diffed across commits.
+"""
+import argparse
+import configparser
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from src.utils import get_resource_path, APP_ROOT
+import src.services.data_manager as data_manager
+from src.services.rogue_service import RogueService
+
+from .synthetic import RecordGenerator
+
+UID = "bench"
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(text[-1], 1)
+    return int(float(text[:-1] if multiplier > 1 else text) * multiplier)
+
+
+def load_config() -> configparser.ConfigParser:
+    parser = configparser.ConfigParser()
+    parser.read(get_resource_path("config/app_config.ini"), encoding="utf-8")
+    return parser
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=APP_ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Bench:
+    def __init__(self, measure_memory: bool):
+        self.measure_memory = measure_memory
+        self.results: List[Dict[str, Any]] = []
+
+    def stage(self, size: int, name: str, items: int, run: Callable[[], Any],
+              setup: Optional[Callable[[], Any]] = None):
+        if setup:
+            setup()
+        gc.collect()
+        started = time.perf_counter()
+        run()
+        seconds = time.perf_counter() - started
+
+        peak = None
+        if self.measure_memory:
+            if setup:
+                setup()
+            gc.collect()
+            tracemalloc.start()
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        result = {
+            "size": size, "stage": name, "items": items, "seconds": round(seconds, 6),
+            "items_per_second": round(items / seconds, 1) if seconds > 0 else None, "peak_bytes": peak,
+        }
+        self.results.append(result)
+        peak_text = f"{peak / 2 ** 20:9.1f} MiB" if peak is not None else ""
+        print(f"{size:>9,} {name:<22} {seconds * 1000:11.2f} ms {result['items_per_second'] or 0:14,.0f}/s {peak_text}",
+              file=sys.stderr)
+
+    def skip(self, size: int, name: str, reason: str):
+        self.results.append({"size": size, "stage": name, "skipped": reason})
+        print(f"{size:>9,} {name:<22} skipped: {reason}", file=sys.stderr)
+
+
+def create_tk_list():
+    """A RunsListFrame in a real (possibly Xvfb) Tk root, or a reason why none is available."""
+    try:
+        import tkinter as tk
+        from tkinter import ttk
+        from src.ui.styles import StyleManager
+        from src.ui.components import RunsListFrame
+
+        root = tk.Tk()
+    except Exception as e:
+        return None, None, f"Tk unavailable ({e})"
+    root.geometry("360x820")
+    runs_list = RunsListFrame(root, StyleManager(ttk.Style(root)))
+    runs_list.pack(fill="both", expand=True)
+    root.update()
+    return root, runs_list, None
+
+
+def bench_size(bench: Bench, size: int, config, db_dir: str, tk_list):
+    generator = RecordGenerator(seed=size)
+    theme = generator.theme_name
+    payload = generator.payload(size)
+    records = payload["history"]["records"]
+
+    def fresh_service() -> RogueService:
+        data_manager.DB_PATH = os.path.join(db_dir, f"bench_{size}.db")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(data_manager.DB_PATH + suffix):
+                os.remove(data_manager.DB_PATH + suffix)
+        return RogueService(None, config)
+
+    state: Dict[str, Any] = {}
+
+    def reset():
+        if "service" in state:
+            state["service"].db_manager.close()
+        state["service"] = fresh_service()
+
+    service = state["service"] = fresh_service()
+    rules = service.theme_rules[theme]
+
+    bench.stage(size, "merge_insert", size,
+                lambda: state["service"].db_manager.merge_and_save_runs(UID, theme, records, rules=rules), setup=reset)
+    service = state["service"]
+    bench.stage(size, "merge_unchanged", size,
+                lambda: service.db_manager.merge_and_save_runs(UID, theme, records, rules=rules))
+    bench.stage(size, "get_all_runs", size, lambda: service.db_manager.get_all_runs(UID, theme))
+
+    def determine_endings():
+        rules._success_endings.clear()
+        for record in records:
+            service._determine_ending(record, rules)
+
+    bench.stage(size, "determine_ending", size, determine_endings)
+    bench.stage(size, "analyze_records", size, lambda: service._analyze_records(payload, records, theme, rules))
+    # get_cached_analysis needs a stored profile, or it returns None without analyzing anything.
+    service.db_manager.save_profile(UID, service.profile_from(payload))
+
+    def cached_analysis():
+        service.cache.clear()
+        analysis = service.get_cached_analysis(UID, theme)
+        if not analysis or "error" in analysis:
+            raise RuntimeError(f"cached_analysis got no analysis: {analysis!r}")
+
+    bench.stage(size, "cached_analysis", size, cached_analysis)
+
+    root, runs_list, reason = tk_list
+    if runs_list is None:
+        bench.skip(size, "runs_list_update", reason)
+        bench.skip(size, "runs_list_scroll", reason)
+    else:
+        def update_list():
+            runs_list.set_source(size, lambda offset, limit: service.get_runs_page(UID, theme, offset, limit))
+            root.update_idletasks()
+
+        def scroll_list():
+            for first in range(0, size, max(1, size // 200)):
+                runs_list._scroll_to(first)
+                root.update_idletasks()
+
+        bench.stage(size, "runs_list_update", size, update_list)
+        bench.stage(size, "runs_list_scroll", min(size, 200), scroll_list)
+
+    service.db_manager.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark storage, analysis and rendering on synthetic data")
+    parser.add_argument("--sizes", default="1k,10k,100k", help="comma separated run counts, e.g. 1k,10k,100k,1m")
+    parser.add_argument("--output", default=os.path.join("benchmarks", "results", "latest.json"),
+                        help="JSON results file")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peak memory pass")
+    parser.add_argument("--no-ui", action="store_true", help="skip the RunsListFrame stages")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    sizes = [parse_size(size) for size in args.sizes.split(",") if size.strip()]
+    config = load_config()
+    bench = Bench(measure_memory=not args.no_memory)
+    tk_list = (None, None, "disabled with --no-ui") if args.no_ui else create_tk_list()
+
+    with tempfile.TemporaryDirectory(prefix="rogue-bench-") as db_dir:
+        for size in sizes:
+            bench_size(bench, size, config, db_dir, tk_list)
+
+    if tk_list[0] is not None:
+        tk_list[0].destroy()
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "stats_backend": config.get("ANALYSIS", "STATS_BACKEND", fallback="python"),
+        "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None,
+        "results": bench.results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""Synthetic `history.records` following docs/api/rogue_api_structure.md, for benchmarks."""
+import json
+import random
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from src.utils import get_resource_path
+
+MODES = {0: "稳妥作战", 8: "险路恶敌", 12: "直面魂灵", 15: "直面魂灵", 18: "直面魂灵"}
+PROFESSIONS = ["PIONEER", "WARRIOR", "TANK", "SNIPER", "CASTER", "MEDIC", "SUPPORT", "SPECIAL"]
+STAGES = ["坏邻居", "不容拒绝", "本能污染", "生人勿近", "猩红甬道", "谢幕", "假想对冲", "惊惧", "洞天福地", "天途半道"]
+TAGS = [("挥金如土", "tag_gold"), ("天途半道", "tag_half"), ("孤注一掷", "tag_alone"), ("步步为营", "tag_steady")]
+
+
+def _load_json(relative_path: str) -> Dict[str, Any]:
+    with open(get_resource_path(relative_path), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class RecordGenerator:
+    """Deterministic (per seed) record generator; relics, totems and squads come from the real configs
+    so endings, rolling runs and fifth-ending wins all occur at plausible rates."""
+
+    def __init__(self, theme_name: Optional[str] = None, seed: int = 0):
+        theme_configs = _load_json("config/rogue_theme_config.json")
+        self.theme_name = theme_name or next(iter(theme_configs))
+        config = theme_configs[self.theme_name]
+        self.theme_id = config.get("theme_id", "rogue_4")
+        rules = config["ending_rules"]
+
+        self.ending_relics = [ending["relic"] for ending in rules["endings"]]
+        self.companion_relics = [companion["relic"] for companion in rules.get("ending_5_companions", [])]
+        self.rolling_relic = rules["is_rolling_relic"]
+        self.primary_totem = config["analysis_rules"]["primary_totem_id"]
+        self.filler_relics = [f"{self.theme_id}_relic_{kind}_{i}" for kind in ("fight", "explore", "legacy")
+                              for i in range(1, 41)]
+        self.squads = list(_load_json("config/aliases.json"))
+        self.random = random.Random(seed)
+
+    def _char(self) -> Dict[str, Any]:
+        r = self.random
+        return {
+            "id": f"char_{r.randint(100, 499)}_{r.choice('abcdefgh')}",
+            "rarity": r.randint(2, 5), "profession": r.choice(PROFESSIONS),
+            "level": r.randint(1, 90), "evolvePhase": r.randint(0, 2), "potentialRank": r.randint(0, 5),
+            "skinId": "", "upgradePhase": r.randint(0, 1),
+        }
+
+    def _band(self) -> Dict[str, str]:
+        # Like the API, each band id always carries the same squad name.
+        index = self.random.randrange(len(self.squads))
+        return {"id": f"{self.theme_id}_band_{index + 1}", "name": self.squads[index]}
+
+    def record(self, start_ts: int) -> Dict[str, Any]:
+        r = self.random
+        success = r.random() < 0.45
+        relics = r.sample(self.filler_relics, r.randint(6, 30))
+        if r.random() < 0.15:
+            relics.append(self.rolling_relic)
+        if success:
+            relics += [relic for relic in self.ending_relics if r.random() < 0.35]
+            if self.ending_relics[-1] in relics and self.companion_relics and r.random() < 0.6:
+                relics.append(r.choice(self.companion_relics))
+        r.shuffle(relics)
+
+        grade = r.choice(list(MODES))
+        duration = r.randint(900, 4 * 3600)
+        nodes = r.randint(3, 40)
+        return {
+            "id": str(uuid.UUID(int=r.getrandbits(128), version=4)),
+            "modeGrade": grade, "mode": MODES[grade], "success": int(success),
+            "lastChars": [self._char() for _ in range(r.randint(8, 13))],
+            "initChars": [self._char() for _ in range(3)],
+            "troopChars": [self._char() for _ in range(r.randint(10, 20))],
+            "gainRelicList": relics,
+            "cntCrossedZone": r.randint(1, 6), "cntArrivedNode": nodes,
+            "cntBattleNormal": r.randint(0, nodes), "cntBattleElite": r.randint(0, 6),
+            "cntBattleBoss": r.randint(0, 3), "cntGainRelicItem": len(relics), "cntRecruitUpgrade": r.randint(0, 20),
+            "totemList": [{"id": self.primary_totem, "count": r.randint(0, 4)}]
+                         + [{"id": f"{self.theme_id}_fragment_D_{i:02d}", "count": 1} for i in range(r.randint(0, 4))],
+            "tagList": [{"id": tag_id, "name": name, "description": name, "pic": ""}
+                        for name, tag_id in r.sample(TAGS, r.randint(0, 2))],
+            "lastStage": r.choice(STAGES),
+            "score": r.randint(0, 1200) if success else r.randint(0, 600),
+            "band": self._band(),
+            "startTs": str(start_ts), "endTs": str(start_ts + duration),
+            "endingText": f"<@ro.ending>耗时 {duration // 60} 分钟</>" if success else "",
+            "isCollect": r.random() < 0.02,
+        }
+
+    def records(self, count: int, end_ts: Optional[int] = None, spacing: int = 3 * 3600) -> List[Dict[str, Any]]:
+        """`count` records newest first, as the API returns them, spaced `spacing` seconds apart."""
+        end_ts = end_ts or int(time.time())
+        return [self.record(end_ts - i * spacing) for i in range(count)]
+
+    def payload(self, count: int, **kwargs) -> Dict[str, Any]:
+        """A full rogue `data` object around `count` records."""
+        return {
+            "topics": [{"id": self.theme_id, "isSelected": True, "name": self.theme_name}],
+            "gameUserInfo": {"name": "Bench#0001", "level": 120},
+            "career": {"invest": 9621, "gold": 43195, "node": 24519, "hope": 29157, "step": 15224},
+            "history": {"records": self.records(count, **kwargs)},
+        }
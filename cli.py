@@ -0,0 +1,258 @@
+"""Headless entry point: fetches and analyzes runs without Tk and prints JSON / NDJSON for scripts and cron."""
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
+import os
+import sys
+import json
+import argparse
+import logging
+import configparser
+
+from src.utils import get_resource_path
+from src.bootstrap import read_env_token, load_account_tokens
+from src.metrics import metrics
+from src.services.data_manager import BREAKDOWN_DIMENSIONS
+from src.services.rogue_service import RogueService
+from src.services.run_exporter import EXPORT_FORMATS
+from src.services.snapshot_importer import SnapshotImporter
+
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
+
+EXIT_OK = 0
+EXIT_PARTIAL = 1
+EXIT_USAGE = 2
+EXIT_FAILED = 3
+
+
+def load_config():
+    config_path = get_resource_path("config/app_config.ini")
+    if not os.path.exists(config_path):
+        return None
+    parser = configparser.ConfigParser()
+    parser.read(config_path, encoding='utf-8')
+    return parser
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="罗德岛集成战略分析仪（无界面模式）")
+    parser.add_argument("--theme", action="append", dest="themes", metavar="NAME",
+                        help="要分析的主题，可重复指定；默认分析所有已配置主题")
+    parser.add_argument("--window", action="append", dest="windows", metavar="SPEC",
+                        help="统计窗口，可重复或用逗号分隔：7d、last50、2024-01-01..2024-03-31、season:NAME、all；"
+                             "默认见 [ANALYSIS] WINDOWS")
+    parser.add_argument("--breakdown", action="append", dest="breakdowns", choices=BREAKDOWN_DIMENSIONS,
+                        help="按分队（squad）、难度（difficulty）或最深结局（ending）分组统计，可重复指定")
+    parser.add_argument("--breakdown-window", metavar="SPEC",
+                        help="分组统计的窗口，格式同 --window；默认为全部对局")
+    parser.add_argument("--format", choices=("json", "ndjson"), default="json", help="输出格式，默认 json")
+    parser.add_argument("--all-accounts", action="store_true",
+                        help="同时拉取 HYPERGRYPH_TOKENS 中的所有账号")
+    parser.add_argument("--offline", action="store_true",
+                        help="不访问网络，只分析本地数据库中已有的数据")
+    parser.add_argument("--uid", action="append", dest="uids", metavar="UID",
+                        help="离线模式下只分析指定 UID，可重复指定；默认分析数据库中的所有 UID")
+    parser.add_argument("--export", metavar="PATH",
+                        help="将本地数据库中的对局记录分块流式导出到文件后退出（可用 --uid/--theme 筛选）")
+    parser.add_argument("--export-format", choices=("auto",) + EXPORT_FORMATS, default="auto",
+                        help="导出格式，默认按扩展名判断；parquet/arrow 需安装 pyarrow，未安装时回退为 csv")
+    parser.add_argument("--import-snapshots", metavar="DIR",
+                        help="并行导入目录中保存的 rogue 接口响应（*.json / *.json.gz）后退出；"
+                             "UID 取自 --uid，或 DIR 下以 UID 命名的子目录")
+    parser.add_argument("--reimport", action="store_true",
+                        help="忽略导入进度记录，重新导入所有快照文件")
+    parser.add_argument("--serve", action="store_true",
+                        help="启动本地 HTTP 分析服务（端点：/player /stats /breakdown /runs /search /health）")
+    parser.add_argument("--port", type=int, help="HTTP 分析服务端口，默认见 [SERVER] PORT")
+    parser.add_argument("-o", "--output", help="写入文件而不是标准输出")
+    parser.add_argument("-v", "--verbose", action="store_true", help="在标准错误输出中打印运行日志")
+    return parser.parse_args(argv)
+
+
+def fetch_accounts(config, service, tokens):
+    # Imported here so --offline runs never load requests.
+    from src.services.account_fetcher import MultiAccountFetcher
+
+    results = MultiAccountFetcher(config, service, tokens).fetch_all()
+    return [(r.uid, r.error) for r in results]
+
+
+def serve(config, service, offline: bool, port=None) -> int:
+    from src.server.analysis_server import AnalysisServer
+
+    default_uid = None
+    if offline:
+        uids = {uid for theme in service.theme_rules for uid in service.db_manager.get_uids(theme)}
+        default_uid = next(iter(uids)) if len(uids) == 1 else None
+    else:
+        from src.api.skland_client import SklandClient
+
+        token = read_env_token()
+        if not token:
+            logging.critical("HYPERGRYPH_TOKEN is not configured (environment or .env).")
+            return EXIT_USAGE
+        service.client = SklandClient(config)
+        with service.client.deadline():
+            if not service.client.authenticate(token):
+                logging.critical("Authentication failed.")
+                return EXIT_FAILED
+            service.analyze_all_themes()
+        default_uid = service.client.uid
+
+    server = AnalysisServer(service, config, default_uid=default_uid, port=port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        service.db_manager.close()
+    return EXIT_OK
+
+
+def export_runs(config, service, args) -> int:
+    from src.services.run_exporter import RunExporter
+
+    exporter = RunExporter.from_config(service.db_manager, config, service.record_keys)
+    try:
+        path, exported = exporter.export(args.export, args.export_format, args.uids, args.themes)
+    except (OSError, ValueError) as e:
+        logging.critical(f"Export failed: {e}")
+        return EXIT_USAGE
+    finally:
+        service.db_manager.close()
+    print(f"Exported {exported} runs to {path}", file=sys.stderr)
+    return EXIT_OK
+
+
+def import_snapshots(config, service, args) -> int:
+    if args.uids and len(args.uids) > 1:
+        logging.critical("--import-snapshots accepts at most one --uid.")
+        return EXIT_USAGE
+    if not os.path.exists(args.import_snapshots):
+        logging.critical(f"{args.import_snapshots} does not exist.")
+        return EXIT_USAGE
+    last_report = 0.0
+
+    def report(progress):
+        nonlocal last_report
+        if progress.files_done < progress.files_total and progress.elapsed - last_report < 1:
+            return
+        last_report = progress.elapsed
+        print(f"\r[{progress.files_done}/{progress.files_total}] {progress.runs_read} runs read, "
+              f"{progress.runs_merged} merged, {progress.failed} failed, {progress.elapsed:.0f}s",
+              end="", file=sys.stderr, flush=True)
+
+    try:
+        result = SnapshotImporter.from_config(service, config).run(
+            args.import_snapshots, uid=args.uids[0] if args.uids else None, restart=args.reimport, progress=report)
+    finally:
+        if last_report:
+            print(file=sys.stderr)
+        service.db_manager.close()
+    print(f"Imported {result.files} files ({result.skipped_files} already imported, {result.failed_files} failed): "
+          f"{result.unique_runs} unique runs, {result.inserted} inserted, {result.updated} updated.", file=sys.stderr)
+    if result.failed_files and not (result.files or result.skipped_files):
+        return EXIT_FAILED
+    return EXIT_PARTIAL if result.failed_files else EXIT_OK
+
+
+def analyze_accounts(service, accounts, themes, windows=None, breakdowns=(), breakdown_window=None):
+    for uid, error in accounts:
+        if error:
+            yield {"uid": uid, "theme": None, "error": error}
+            continue
+        for theme in themes:
+            try:
+                analysis = service.get_cached_analysis(uid, theme, windows)
+            except Exception as e:
+                logging.error(f"Analysis of theme '{theme}' for UID {uid} failed: {e}")
+                yield {"uid": uid, "theme": theme, "error": str(e)}
+                continue
+            if analysis and "error" in analysis:
+                yield {"uid": uid, "theme": theme, "error": analysis["error"]}
+            elif analysis and breakdowns:
+                yield {"uid": uid, "theme": theme, "analysis": analysis, "breakdowns": {
+                    dimension: service.get_breakdown(uid, theme, dimension, breakdown_window)
+                    for dimension in breakdowns}}
+            else:
+                yield {"uid": uid, "theme": theme, "analysis": analysis}
+
+
+def write_results(results, output_format, stream) -> list:
+    collected = []
+    for result in results:
+        collected.append(result)
+        if output_format == "ndjson":
+            stream.write(json.dumps(result, ensure_ascii=False) + "\n")
+            stream.flush()
+    if output_format == "json":
+        json.dump(collected, stream, ensure_ascii=False, indent=2)
+        stream.write("\n")
+    return collected
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        stream=sys.stderr
+    )
+    logging.info(f"Imports took {IMPORT_SECONDS * 1000:.1f}ms.")
+
+    config = load_config()
+    if config is None:
+        logging.critical("config/app_config.ini not found.")
+        return EXIT_USAGE
+    metrics.configure(config)
+
+    service = RogueService(None, config)
+    themes = args.themes or list(service.theme_rules)
+    unknown = [theme for theme in themes if theme not in service.theme_rules]
+    if unknown:
+        logging.critical(f"Unknown theme(s): {', '.join(unknown)}")
+        return EXIT_USAGE
+    try:
+        windows = service.parse_windows(args.windows) if args.windows else None
+        breakdown_window = next(iter(service.parse_windows([args.breakdown_window or ""])), None)
+    except ValueError as e:
+        logging.critical(str(e))
+        return EXIT_USAGE
+
+    if args.serve:
+        return serve(config, service, args.offline, args.port)
+    if args.export:
+        return export_runs(config, service, args)
+    if args.import_snapshots:
+        return import_snapshots(config, service, args)
+
+    if args.offline:
+        uids = args.uids or sorted({uid for theme in themes for uid in service.db_manager.get_uids(theme)})
+        accounts = [(uid, None) for uid in uids]
+    else:
+        primary_token = read_env_token()
+        tokens = load_account_tokens(primary_token) if args.all_accounts else [t for t in [primary_token] if t]
+        if not tokens:
+            logging.critical("HYPERGRYPH_TOKEN is not configured (environment or .env).")
+            return EXIT_USAGE
+        accounts = fetch_accounts(config, service, tokens)
+
+    stream = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        results = write_results(analyze_accounts(service, accounts, themes, windows, args.breakdowns or (),
+                                                       breakdown_window), args.format, stream)
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+        service.db_manager.close()
+
+    failures = sum("error" in result for result in results)
+    if not failures:
+        return EXIT_OK
+    return EXIT_FAILED if failures == len(results) else EXIT_PARTIAL
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,5 @@
 import os
+import argparse
 import logging
 import configparser
 import sys
@@ -7,9 +8,11 @@ from tkinter import messagebox
 
 try:
     from src.utils import get_resource_path, get_persistent_path
-    from src.bootstrap import ensure_token_configured
+    from src.metrics import metrics
+    from src.bootstrap import ensure_token_configured, load_account_tokens
     from src.api.skland_client import SklandClient
     from src.services.rogue_service import RogueService
+    from src.services.account_fetcher import MultiAccountFetcher
     from src.ui.app_window import AppWindow
     from src.ui.controller import UIController
 except ImportError as e:
@@ -44,29 +47,53 @@ def setup_logging():
     )
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="罗德岛集成战略分析仪")
+    parser.add_argument("--rebuild-aggregates", action="store_true",
+                        help="根据当前主题配置重新计算所有本地对局的统计汇总后退出")
+    parser.add_argument("--recode-storage", action="store_true",
+                        help="按 [STORAGE] 配置重新训练字典并重新编码所有本地对局记录后退出")
+    parser.add_argument("--fetch-all-accounts", action="store_true",
+                        help="并发拉取 HYPERGRYPH_TOKEN 与 HYPERGRYPH_TOKENS 中所有账号的数据并写入本地数据库后退出")
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
+    if args.rebuild_aggregates:
+        setup_logging()
+        RogueService(None, load_config()).rebuild_aggregates()
+        logging.info("Aggregates rebuilt.")
+        return
+    if args.recode_storage:
+        setup_logging()
+        RogueService(None, load_config()).db_manager.recode_runs()
+        return
+
     hypergryph_token = ensure_token_configured()
 
     setup_logging()
     logging.info("Token configured. Starting application.")
 
     config = load_config()
+    metrics.configure(config)
 
-    skland_client = SklandClient(config)
-    if not skland_client.authenticate(hypergryph_token):
-        logging.critical("认证失败，请检查你的Token。")
-        root = tk.Tk()
-        root.withdraw()
-        messagebox.showerror("认证失败", "无法通过您的Token进行认证。\n\n请检查.env文件中的HYPERGRYPH_TOKEN是否正确、有效。")
-        return
+    if args.fetch_all_accounts:
+        results = MultiAccountFetcher(config, RogueService(None, config), load_account_tokens(hypergryph_token)).fetch_all()
+        sys.exit(0 if all(r.ok for r in results) else 1)
 
+    # Authentication runs on the controller's background thread so the window (and any locally stored
+    # analysis) shows up without waiting for the network.
+    skland_client = SklandClient(config)
     rogue_service = RogueService(skland_client)
 
     app = AppWindow(config)
-    controller = UIController(app, rogue_service, "萨卡兹的无终奇语")
+    default_theme = config.get("APP", "DEFAULT_THEME", fallback=next(iter(rogue_service.theme_rules), ""))
+    controller = UIController(app, rogue_service, default_theme, hypergryph_token)
 
     controller.initial_load()
     app.mainloop()
+    controller.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,105 @@
+"""Selective parsing of the rogue endpoint response.
+
+Only `code`, `message`, `data.gameUserInfo`, `data.career`, the topic names and the wanted keys of each
+`data.history.records` entry are kept. `select_rogue_fields` prunes a fully decoded body, which is the
+fastest option with the C json decoder. `parse_rogue_stream` uses ijson (when installed) to parse the
+body as it is read, so `itemInfo` and dropped record fields are never materialised: several times lower
+peak memory at the cost of more CPU, which mostly overlaps the download.
+"""
+import json
+from typing import Any, Dict, IO, Iterable, Optional
+
+try:
+    import ijson
+    from ijson.common import ObjectBuilder
+except ImportError:
+    ijson = None
+
+TOPIC_KEYS = frozenset({"id", "name", "isSelected"})
+
+# prefix -> (place in the result, keys to keep or None for the whole object)
+_SCALAR_TARGETS = {"code", "message"}
+_TARGETS = {
+    "data.gameUserInfo": ("gameUserInfo", None),
+    "data.career": ("career", None),
+    "data.topics.item": ("topics", TOPIC_KEYS),
+    "data.history.records.item": ("records", None),
+}
+
+
+def _select(obj: Dict[str, Any], keys: Optional[Iterable[str]]) -> Dict[str, Any]:
+    return obj if keys is None else {key: obj[key] for key in keys if key in obj}
+
+
+def select_rogue_fields(response: Dict[str, Any], record_keys: Optional[Iterable[str]]) -> Dict[str, Any]:
+    """Prune an already decoded response to the same shape parse_rogue_stream produces."""
+    data = response.get("data")
+    if not isinstance(data, dict):
+        return response
+    return {
+        "code": response.get("code"), "message": response.get("message"),
+        "data": {
+            "gameUserInfo": data.get("gameUserInfo", {}),
+            "career": data.get("career", {}),
+            "topics": [_select(topic, TOPIC_KEYS) for topic in data.get("topics", [])],
+            "history": {"records": [
+                _select(record, record_keys) for record in data.get("history", {}).get("records", [])
+            ]},
+        },
+    }
+
+
+def _parse_incrementally(fp: IO[bytes], record_keys: Optional[frozenset]) -> Dict[str, Any]:
+    result: Dict[str, Any] = {}
+    parts: Dict[str, Any] = {"gameUserInfo": {}, "career": {}, "topics": [], "records": []}
+    has_data = False
+
+    builder, target, allowed = None, None, None
+    events = ijson.parse(fp, use_float=True)
+    for prefix, event, value in events:
+        if builder is None:
+            if prefix in _TARGETS and event == "start_map":
+                target = prefix
+                allowed = record_keys if prefix == "data.history.records.item" else _TARGETS[prefix][1]
+                builder = ObjectBuilder()
+                builder.event(event, value)
+            elif prefix in _SCALAR_TARGETS:
+                result[prefix] = value
+            elif prefix == "data" and event == "start_map":
+                has_data = True
+            continue
+
+        # Consume the events of unwanted keys in a tight loop; they never reach the builder.
+        while prefix == target and event == "map_key" and allowed is not None and value not in allowed:
+            skipped = f"{target}.{value}"
+            skipped_child = skipped + "."
+            for prefix, event, value in events:
+                if prefix != skipped and not prefix.startswith(skipped_child):
+                    break
+
+        builder.event(event, value)
+        if prefix == target and event == "end_map":
+            name = _TARGETS[target][0]
+            if isinstance(parts[name], list):
+                parts[name].append(builder.value)
+            else:
+                parts[name] = builder.value
+            builder = None
+
+    if has_data:
+        result["data"] = {
+            "gameUserInfo": parts["gameUserInfo"], "career": parts["career"], "topics": parts["topics"],
+            "history": {"records": parts["records"]},
+        }
+    return result
+
+
+def parse_rogue_stream(fp: IO[bytes], record_keys: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """Parse a rogue response body from a binary file-like object; `record_keys` None keeps whole records."""
+    record_keys = frozenset(record_keys) if record_keys is not None else None
+    if ijson is not None:
+        try:
+            return _parse_incrementally(fp, record_keys)
+        except ijson.JSONError as e:
+            raise ValueError(f"Malformed rogue response: {e}") from e
+    return select_rogue_fields(json.load(fp), record_keys)
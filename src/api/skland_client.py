@@ -1,43 +1,132 @@
+import os
 import requests
 import json
 import time
 import hmac
 import hashlib
 import logging
-from typing import Optional, Tuple, Dict, Any
+from typing import Optional, Tuple, Dict, Any, Callable, Iterable
 from urllib.parse import urlparse, urlencode
 
+from src.utils import get_persistent_path
+from src.metrics import metrics
+from .rate_limiter import HostRateLimiter
+from . import rogue_parser
+from .transport import HttpTransport
+
+SESSION_DIR = get_persistent_path("data/sessions")
+
+# Response codes the signed endpoints return when cred/token are no longer accepted.
+AUTH_ERROR_CODES = {10000, 10002}
+
 
 class SklandClient:
-    def __init__(self, config):
+    def __init__(self, config, rate_limiter: Optional[HostRateLimiter] = None):
         self.config = config
-        self.session = requests.Session()
-        self.session.headers.update({"User-Agent": self.config.get("APP", "USER_AGENT")})
+        self.transport = HttpTransport(config, rate_limiter)
         self.cred: Optional[str] = None
         self.token: Optional[str] = None
         self.uid: Optional[str] = None
+        self._hypergryph_token: Optional[str] = None
+
+        self.stream_parse = config.get("API", "RESPONSE_PARSER", fallback="selective") == "streaming"
+        if self.stream_parse and rogue_parser.ijson is None:
+            logging.warning("RESPONSE_PARSER is 'streaming' but ijson is not installed, using the selective parser.")
+            self.stream_parse = False
+
+    def authenticate(self, hypergryph_token: str, use_cache: bool = True) -> bool:
+        with metrics.span("auth") as span:
+            started = time.perf_counter()
+            self._hypergryph_token = hypergryph_token
+            if use_cache and self._load_session(hypergryph_token):
+                span.set(cached=True)
+                logging.info(f"Reused cached session for UID {self.uid} in {time.perf_counter() - started:.3f}s.")
+                return True
+
+            logging.info("Starting authentication...")
+            oauth_code = self._get_oauth_code(hypergryph_token)
+            if not oauth_code: return False
 
-    def authenticate(self, hypergryph_token: str) -> bool:
-        logging.info("Starting authentication...")
-        oauth_code = self._get_oauth_code(hypergryph_token)
-        if not oauth_code: return False
+            cred, token = self._get_cred_and_token(oauth_code)
+            if not cred or not token: return False
 
-        cred, token = self._get_cred_and_token(oauth_code)
-        if not cred or not token: return False
+            self.cred, self.token = cred, token
 
-        self.cred, self.token = cred, token
+            uid = self._get_game_uid()
+            if not uid: return False
 
-        uid = self._get_game_uid()
-        if not uid: return False
+            self.uid = uid
+            self._save_session(hypergryph_token)
+            logging.info(f"Authentication successful in {time.perf_counter() - started:.3f}s.")
+            return True
 
-        self.uid = uid
-        logging.info("Authentication successful.")
+    @staticmethod
+    def _token_fingerprint(hypergryph_token: str) -> str:
+        return hashlib.sha256(hypergryph_token.encode('utf-8')).hexdigest()
+
+    def _session_path(self, hypergryph_token: str) -> str:
+        return os.path.join(SESSION_DIR, f"{self._token_fingerprint(hypergryph_token)[:16]}.json")
+
+    def _read_session(self, hypergryph_token: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._session_path(hypergryph_token), 'r', encoding='utf-8') as f:
+                session = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if session.get("token_fingerprint") != self._token_fingerprint(hypergryph_token):
+            return None
+        return session
+
+    def peek_cached_uid(self, hypergryph_token: str) -> Optional[str]:
+        """UID of the last session for this token, even if expired; used to show local data before auth."""
+        session = self._read_session(hypergryph_token)
+        return session.get("uid") if session else None
+
+    def _load_session(self, hypergryph_token: str) -> bool:
+        session = self._read_session(hypergryph_token)
+        if not session:
+            return False
+        if session.get("expires_at", 0) <= time.time():
+            logging.info("Cached session expired.")
+            return False
+        if not all(session.get(key) for key in ("cred", "token", "uid")):
+            return False
+
+        self.cred, self.token, self.uid = session["cred"], session["token"], session["uid"]
         return True
 
+    def _save_session(self, hypergryph_token: str):
+        ttl_hours = self.config.getfloat("APP", "SESSION_CACHE_TTL_HOURS", fallback=12)
+        session = {
+            "token_fingerprint": self._token_fingerprint(hypergryph_token),
+            "cred": self.cred, "token": self.token, "uid": self.uid,
+            "expires_at": time.time() + ttl_hours * 3600,
+        }
+        try:
+            os.makedirs(SESSION_DIR, exist_ok=True)
+            fd = os.open(self._session_path(hypergryph_token), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(session, f)
+        except OSError as e:
+            logging.warning(f"Could not write session cache: {e}")
+
+    def _invalidate_session(self):
+        try:
+            os.remove(self._session_path(self._hypergryph_token))
+        except FileNotFoundError:
+            pass
+
+    def _reauthenticate(self) -> bool:
+        if not self._hypergryph_token:
+            return False
+        logging.info("Signed request was rejected, re-authenticating...")
+        self._invalidate_session()
+        return self.authenticate(self._hypergryph_token, use_cache=False)
+
     def _get_oauth_code(self, token: str) -> Optional[str]:
         payload = {"token": token, "appCode": self.config.get("APP", "APP_CODE"), "type": 0}
         try:
-            response = self.session.post(self.config.get("API", "GRANT_URL"), json=payload, timeout=10)
+            response = self.transport.post(self.config.get("API", "GRANT_URL"), json=payload)
             response.raise_for_status()
             data = response.json()
             if data.get("status") == 0: return data.get("data", {}).get("code")
@@ -48,7 +137,7 @@ class SklandClient:
     def _get_cred_and_token(self, code: str) -> Tuple[Optional[str], Optional[str]]:
         payload = {"kind": 1, "code": code}
         try:
-            response = self.session.post(self.config.get("API", "CRED_AUTH_URL"), json=payload, timeout=10)
+            response = self.transport.post(self.config.get("API", "CRED_AUTH_URL"), json=payload)
             response.raise_for_status()
             data = response.json()
             if data.get("code") == 0:
@@ -60,7 +149,7 @@ class SklandClient:
     def _get_game_uid(self) -> Optional[str]:
         headers = self._generate_signature_headers(self.config.get("API", "BINDING_URL"))
         try:
-            response = self.session.get(self.config.get("API", "BINDING_URL"), headers=headers, timeout=10)
+            response = self.transport.get(self.config.get("API", "BINDING_URL"), headers=headers)
             response.raise_for_status()
             data = response.json()
             if data.get("code") == 0:
@@ -94,16 +183,48 @@ class SklandClient:
 
         return {"cred": self.cred, "sign": sign, **headers_for_sign}
 
-    def get_rogue_info(self) -> Optional[Dict[str, Any]]:
+    def deadline(self, seconds: Optional[float] = None):
+        return self.transport.deadline(seconds)
+
+    def _signed_get(self, url: str,
+                    parse: Optional[Callable[[Any], Dict[str, Any]]] = None) -> Optional[Dict[str, Any]]:
+        """GET a signed endpoint; `parse` receives the raw body stream instead of the whole body being decoded."""
+        for attempt in range(2):
+            headers = self._generate_signature_headers(url)
+            with metrics.span("fetch.http", path=urlparse(url).path) as span:
+                response = self.transport.get(url, headers=headers, stream=parse is not None)
+                span.set(status=response.status_code,
+                         bytes=len(response.content) if parse is None else response.headers.get("Content-Length"))
+            data = None
+            with response:  # releases the streamed connection before a retry, whatever the status
+                if response.status_code != 401:
+                    response.raise_for_status()
+                    with metrics.span("fetch.decode", streamed=parse is not None):
+                        if parse is None:
+                            data = response.json()
+                        else:
+                            response.raw.decode_content = True
+                            data = parse(response.raw)
+                    if data.get("code") not in AUTH_ERROR_CODES:
+                        return data
+            if attempt == 0 and self._reauthenticate():
+                continue
+            logging.error(f"Request to {urlparse(url).path} rejected with an auth error: "
+                          f"{data.get('message') if data else response.status_code}")
+            return data
+        return None
+
+    def get_rogue_info(self, record_keys: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+        """Rogue data reduced to profile, topic names and `record_keys` of each record (None keeps them whole)."""
         if not self.uid: return None
         url = f"{self.config.get('API', 'ROGUE_INFO_URL')}?uid={self.uid}"
-        headers = self._generate_signature_headers(url)
         try:
-            response = self.session.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            if data.get("code") == 0:
-                return data.get("data")
-        except requests.RequestException as e:
+            if self.stream_parse:
+                data = self._signed_get(url, parse=lambda fp: rogue_parser.parse_rogue_stream(fp, record_keys))
+            else:
+                data = self._signed_get(url)
+            if data and data.get("code") == 0:
+                return data["data"] if self.stream_parse else rogue_parser.select_rogue_fields(data, record_keys)["data"]
+        except (requests.RequestException, ValueError) as e:
             logging.error(f"Error fetching rogue info: {e}")
-        return None
\ No newline at end of file
+        return None
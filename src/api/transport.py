@@ -0,0 +1,120 @@
+import random
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from typing import Optional, Dict, Any
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .rate_limiter import HostRateLimiter
+
+
+# Methods a server may see twice without side effects; only these are re-sent after a 5xx.
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+class DeadlineExceeded(requests.Timeout):
+    pass
+
+
+class HttpTransport:
+    """Pooled requests session with jittered exponential backoff, a per-refresh deadline and request counters."""
+
+    def __init__(self, config, rate_limiter: Optional[HostRateLimiter] = None):
+        self.rate_limiter = rate_limiter
+        self.connect_timeout = config.getfloat("HTTP", "CONNECT_TIMEOUT", fallback=5)
+        self.read_timeout = config.getfloat("HTTP", "READ_TIMEOUT", fallback=10)
+        self.max_retries = config.getint("HTTP", "MAX_RETRIES", fallback=3)
+        self.backoff_base = config.getfloat("HTTP", "BACKOFF_BASE_SECONDS", fallback=0.5)
+        self.backoff_max = config.getfloat("HTTP", "BACKOFF_MAX_SECONDS", fallback=8)
+        self.default_deadline = config.getfloat("HTTP", "REFRESH_DEADLINE_SECONDS", fallback=30)
+
+        self.session = requests.Session()
+        self.session.headers.update({"User-Agent": config.get("APP", "USER_AGENT")})
+        adapter = HTTPAdapter(
+            pool_connections=config.getint("HTTP", "POOL_CONNECTIONS", fallback=4),
+            pool_maxsize=config.getint("HTTP", "POOL_MAXSIZE", fallback=8),
+            max_retries=0,
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._deadline_at: Optional[float] = None
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "retries": 0, "failures": 0, "latency_total": 0.0, "latency_max": 0.0}
+
+    @contextmanager
+    def deadline(self, seconds: Optional[float] = None):
+        """Bound the total time of every request (retries and backoff included) made inside the block."""
+        previous = self._deadline_at
+        self._deadline_at = time.monotonic() + (seconds if seconds is not None else self.default_deadline)
+        try:
+            yield
+        finally:
+            self._deadline_at = previous
+
+    def _remaining(self) -> Optional[float]:
+        if self._deadline_at is None:
+            return None
+        remaining = self._deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded("Refresh deadline exceeded")
+        return remaining
+
+    def _record(self, latency: float, retried: bool, failed: bool):
+        with self._stats_lock:
+            self._stats["requests"] += 1
+            self._stats["retries"] += retried
+            self._stats["failures"] += failed
+            self._stats["latency_total"] += latency
+            self._stats["latency_max"] = max(self._stats["latency_max"], latency)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["latency_avg"] = stats["latency_total"] / stats["requests"] if stats["requests"] else 0.0
+        return stats
+
+    def request(self, method: str, url: str, idempotent: Optional[bool] = None, **kwargs) -> requests.Response:
+        """Send with retries; 5xx answers are re-sent only if `idempotent` (default: by method, so a POST must opt in)."""
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        for attempt in range(self.max_retries + 1):
+            remaining = self._remaining()
+            if self.rate_limiter:
+                self.rate_limiter.acquire(url)
+            read_timeout = min(self.read_timeout, remaining) if remaining is not None else self.read_timeout
+            connect_timeout = min(self.connect_timeout, read_timeout)
+
+            started = time.perf_counter()
+            response, error = None, None
+            try:
+                response = self.session.request(method, url, timeout=(connect_timeout, read_timeout), **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            retryable = error is not None or (idempotent and response.status_code >= 500)
+            is_last = attempt == self.max_retries
+            self._record(time.perf_counter() - started, attempt > 0, retryable and is_last)
+
+            if not retryable:
+                return response
+            if is_last:
+                if error is not None:
+                    raise error
+                return response
+
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+            remaining = self._remaining()
+            if remaining is not None and delay >= remaining:
+                raise DeadlineExceeded("Refresh deadline exceeded while backing off")
+            logging.warning(f"{method} {url.split('?')[0]} failed "
+                            f"({error or response.status_code}), retrying in {delay:.2f}s...")
+            time.sleep(delay)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
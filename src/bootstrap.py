@@ -1,12 +1,29 @@
 import os
 import sys
-import tkinter as tk
-from tkinter import messagebox
+from typing import Optional
 from dotenv import load_dotenv
 
 from .utils import get_persistent_path
 
 
+def _show_message(kind: str, title: str, message: str):
+    # tkinter is imported lazily so the headless CLI can share this module without a display.
+    import tkinter as tk
+    from tkinter import messagebox
+
+    root = tk.Tk()
+    root.withdraw()
+    getattr(messagebox, kind)(title, message)
+
+
+def read_env_token() -> Optional[str]:
+    """HYPERGRYPH_TOKEN from the environment or .env, without any prompts."""
+    dotenv_path = get_persistent_path(".env")
+    if os.path.exists(dotenv_path):
+        load_dotenv(dotenv_path=dotenv_path)
+    return os.getenv("HYPERGRYPH_TOKEN") or None
+
+
 def ensure_token_configured() -> str:
     dotenv_path = get_persistent_path(".env")
     env_template = "HYPERGRYPH_TOKEN=\"\"\n"
@@ -16,28 +33,28 @@ def ensure_token_configured() -> str:
             with open(dotenv_path, "w", encoding="utf-8") as f:
                 f.write(env_template)
 
-            root = tk.Tk()
-            root.withdraw()
-            messagebox.showinfo(
-                "首次配置向导",
+            _show_message(
+                "showinfo", "首次配置向导",
                 "请在程序目录下的 .env 文件中填入您的 HYPERGRYPH_TOKEN 后，再重新启动程序。"
             )
         except Exception as e:
-            root = tk.Tk()
-            root.withdraw()
-            messagebox.showerror("文件创建失败", f"尝试创建 .env 文件时出错: {e}")
+            _show_message("showerror", "文件创建失败", f"尝试创建 .env 文件时出错: {e}")
         sys.exit(0)
 
-    load_dotenv(dotenv_path=dotenv_path)
-    token = os.getenv("HYPERGRYPH_TOKEN")
+    token = read_env_token()
 
     if not token:
-        root = tk.Tk()
-        root.withdraw()
-        messagebox.showwarning(
-            "凭证未填写",
+        _show_message(
+            "showwarning", "凭证未填写",
             "请在 .env 文件中填入您的 HYPERGRYPH_TOKEN 后，再重新启动程序。"
         )
         sys.exit(1)
 
     return token
+
+
+def load_account_tokens(primary_token: Optional[str]) -> list[str]:
+    """HYPERGRYPH_TOKENS (comma or newline separated) for multi-account mode, else just the primary token."""
+    extra = os.getenv("HYPERGRYPH_TOKENS", "")
+    tokens = [t.strip() for t in extra.replace("\n", ",").split(",") if t.strip()]
+    return list(dict.fromkeys(t for t in [primary_token, *tokens] if t))
@@ -0,0 +1,137 @@
+"""Stage timings for the refresh pipeline.
+
+Spans nest under the current thread's trace; each finished trace is written as one JSON line to a
+rotating metrics file. While disabled, `span()` hands back a shared no-op object, so instrumented code
+pays only for a flag check.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, List, Optional
+
+from .utils import get_persistent_path
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **fields):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("_metrics", "name", "fields", "started", "ms")
+
+    def __init__(self, metrics: "Metrics", name: str, fields: Dict[str, Any]):
+        self._metrics = metrics
+        self.name = name
+        self.fields = fields
+        self.ms = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.ms = (time.perf_counter() - self.started) * 1000
+        if exc_type is not None:
+            self.fields["error"] = exc_type.__name__
+        self._metrics._finish(self.name, self.ms, self.fields)
+        return False
+
+    def set(self, **fields):
+        """Attach payload sizes, row counts and similar facts discovered while the span runs."""
+        self.fields.update(fields)
+
+
+class Trace:
+    def __init__(self, name: str):
+        self.name = name
+        self.spans: List[Dict[str, Any]] = []
+        self.started = time.perf_counter()
+        self.ms = 0.0
+
+    def add(self, name: str, ms: float, fields: Dict[str, Any]):
+        self.spans.append({"name": name, "ms": round(ms, 3), **fields})
+
+    def total(self, prefix: str) -> float:
+        return sum(span["ms"] for span in self.spans if span["name"].startswith(prefix))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"ts": datetime.now().isoformat(timespec="milliseconds"), "trace": self.name,
+                "ms": round(self.ms, 3), "spans": self.spans}
+
+
+class Metrics:
+    def __init__(self):
+        self.enabled = False
+        self.show_in_status = False
+        self._local = threading.local()
+        self._logger = logging.getLogger("metrics")
+        self._logger.propagate = False
+
+    def configure(self, config, path: Optional[str] = None):
+        self.enabled = config.getboolean("METRICS", "ENABLED", fallback=False)
+        self.show_in_status = self.enabled and config.getboolean("METRICS", "SHOW_IN_STATUS", fallback=False)
+        if not self.enabled or self._logger.handlers:
+            return
+        path = path or get_persistent_path(config.get("METRICS", "FILE", fallback="logs/metrics.jsonl"))
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        handler = RotatingFileHandler(
+            path, maxBytes=config.getint("METRICS", "MAX_BYTES", fallback=1024 * 1024),
+            backupCount=config.getint("METRICS", "BACKUP_COUNT", fallback=3), encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self._logger.addHandler(handler)
+        self._logger.setLevel(logging.INFO)
+
+    def span(self, name: str, **fields):
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, fields)
+
+    def record(self, name: str, ms: float, **fields):
+        """Record a duration that was measured elsewhere."""
+        if self.enabled:
+            self._finish(name, ms, fields)
+
+    @contextmanager
+    def trace(self, name: str):
+        """Group every span finished on this thread inside the block into one metrics line."""
+        if not self.enabled:
+            yield None
+            return
+        outer = getattr(self._local, "trace", None)
+        current = self._local.trace = Trace(name)
+        try:
+            yield current
+        finally:
+            current.ms = (time.perf_counter() - current.started) * 1000
+            self._local.trace = outer
+            self._write(current.to_dict())
+
+    def _finish(self, name: str, ms: float, fields: Dict[str, Any]):
+        current = getattr(self._local, "trace", None)
+        if current is not None:
+            current.add(name, ms, fields)
+        else:
+            self._write({"ts": datetime.now().isoformat(timespec="milliseconds"), "name": name,
+                         "ms": round(ms, 3), **fields})
+
+    def _write(self, entry: Dict[str, Any]):
+        self._logger.info(json.dumps(entry, ensure_ascii=False))
+
+
+metrics = Metrics()
@@ -0,0 +1,215 @@
+import json
+import logging
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse, parse_qs, urlencode
+
+from ..metrics import metrics
+from ..services.data_manager import BREAKDOWN_DIMENSIONS
+from ..services.response_cache import ResponseCache
+
+MAX_PAGE_SIZE = 200
+
+
+class RequestError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class AnalysisServer:
+    """Read-only JSON endpoints over RogueService for local dashboards.
+
+    Responses are cached per (uid, theme, query) and invalidated by DataManager writes. With a refresh
+    interval and an authenticated client, one background fetch keeps every dashboard current.
+    """
+
+    def __init__(self, rogue_service, config, default_uid: Optional[str] = None,
+                 host: Optional[str] = None, port: Optional[int] = None):
+        self.service = rogue_service
+        self.default_uid = default_uid
+        self.default_theme = config.get("APP", "DEFAULT_THEME", fallback=next(iter(rogue_service.theme_rules), ""))
+        self.refresh_interval = config.getfloat("SERVER", "REFRESH_INTERVAL_SECONDS", fallback=0)
+        self.cache = ResponseCache(config.getfloat("SERVER", "CACHE_TTL_SECONDS", fallback=30))
+        self.service.db_manager.write_listeners.append(self.cache.invalidate)
+
+        # DataManager gives each request thread its own reader and serializes writes on one connection, so
+        # requests compute in parallel with each other and with the background refresh.
+        self._stopped = threading.Event()
+
+        self.httpd = ThreadingHTTPServer(
+            (host or config.get("SERVER", "HOST", fallback="127.0.0.1"),
+             port if port is not None else config.getint("SERVER", "PORT", fallback=8765)),
+            self._make_handler()
+        )
+        self.httpd.daemon_threads = True
+        self.routes = {
+            "/health": self._health,
+            "/player": self._player,
+            "/stats": self._stats,
+            "/breakdown": self._breakdown,
+            "/runs": self._runs,
+            "/search": self._search,
+        }
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self.httpd.server_address[:2]
+
+    def start(self) -> "AnalysisServer":
+        """Serve on a daemon thread, for embedding in another process."""
+        threading.Thread(target=self.serve_forever, daemon=True, name="analysis-server").start()
+        return self
+
+    def serve_forever(self):
+        if self.refresh_interval > 0 and self.service.client is not None:
+            threading.Thread(target=self._refresh_loop, daemon=True, name="analysis-refresh").start()
+        logging.info(f"Analysis server listening on http://{self.address[0]}:{self.address[1]}")
+        self.httpd.serve_forever()
+
+    def shutdown(self):
+        self._stopped.set()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _refresh_loop(self):
+        while not self._stopped.wait(self.refresh_interval):
+            try:
+                with metrics.trace("refresh"), self.service.client.deadline():
+                    self.service.analyze_all_themes()
+            except Exception as e:
+                logging.error(f"Background refresh failed: {e}")
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                try:
+                    status, payload = 200, server.handle(url.path, params)
+                except RequestError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except Exception as e:
+                    logging.error(f"Request {self.path} failed: {e}")
+                    status, payload = 500, {"error": "internal error"}
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logging.debug(f"{self.address_string()} {format % args}")
+
+        return Handler
+
+    def handle(self, path: str, params: Dict[str, str]) -> Any:
+        route = self.routes.get(path.rstrip("/") or "/")
+        if route is None:
+            raise RequestError(404, f"unknown endpoint {path}")
+        return route(params)
+
+    def _cached(self, uid: str, theme: Optional[str], endpoint: str, params: Dict[str, str], compute):
+        query = endpoint + "?" + urlencode(sorted((k, v) for k, v in params.items() if k not in ("uid", "theme")))
+        return self.cache.get_or_compute((uid, theme, query), compute)
+
+    def _uid(self, params: Dict[str, str]) -> str:
+        uid = params.get("uid") or self.default_uid
+        if not uid:
+            raise RequestError(400, "missing uid")
+        return uid
+
+    def _theme(self, params: Dict[str, str]) -> str:
+        theme = params.get("theme") or self.default_theme
+        if theme not in self.service.theme_rules:
+            raise RequestError(404, f"unknown theme {theme}")
+        return theme
+
+    @staticmethod
+    def _int(params: Dict[str, str], name: str, default: Optional[int] = None) -> Optional[int]:
+        value = params.get(name)
+        if value is None or value == "":
+            return default
+        try:
+            return int(value)
+        except ValueError:
+            raise RequestError(400, f"{name} must be an integer")
+
+    def _page(self, params: Dict[str, str]) -> Tuple[int, int]:
+        return max(0, self._int(params, "offset", 0)), min(MAX_PAGE_SIZE, max(1, self._int(params, "limit", 20)))
+
+    def _health(self, params):
+        return {"status": "ok", "cache": self.cache.stats(), "run_cache": self.service.cache.stats(),
+                "db": self.service.db_manager.pool.stats()}
+
+    def _player(self, params):
+        uid = self._uid(params)
+        profile = self._cached(uid, None, "player", params, lambda: self.service.db_manager.get_profile(uid))
+        if not profile:
+            raise RequestError(404, f"no data for uid {uid}")
+        return {"uid": uid, "player_info": profile.get("gameUserInfo", {}), "career_summary": profile.get("career", {})}
+
+    def _stats(self, params):
+        uid, theme = self._uid(params), self._theme(params)
+        windows = None
+        if params.get("windows"):
+            try:
+                windows = self.service.parse_windows([params["windows"]])
+            except ValueError as e:
+                raise RequestError(400, str(e))
+
+        def compute():
+            analysis = self.service.get_cached_analysis(uid, theme, windows)
+            if not analysis or "error" in analysis:
+                return None
+            return {"uid": uid, "theme": theme, "run_count": analysis["theme_summary"]["run_count"],
+                    **analysis["stats"]}
+
+        stats = self._cached(uid, theme, "stats", params, compute)
+        if stats is None:
+            raise RequestError(404, f"no {theme} data for uid {uid}")
+        return stats
+
+    def _breakdown(self, params):
+        uid, theme = self._uid(params), self._theme(params)
+        dimension = params.get("by") or "squad"
+        try:
+            window = next(iter(self.service.parse_windows([params.get("window") or ""])), None)
+        except ValueError as e:
+            raise RequestError(400, str(e))
+        if dimension not in BREAKDOWN_DIMENSIONS:
+            raise RequestError(400, f"by must be one of {', '.join(BREAKDOWN_DIMENSIONS)}")
+        groups = self._cached(uid, theme, "breakdown", params,
+                              lambda: self.service.get_breakdown(uid, theme, dimension, window))
+        return {"uid": uid, "theme": theme, "by": dimension, "window": window.key if window else "all",
+                "groups": groups}
+
+    def _runs(self, params):
+        uid, theme = self._uid(params), self._theme(params)
+        offset, limit = self._page(params)
+        runs = self._cached(uid, theme, "runs", params,
+                            lambda: self.service.get_runs_page(uid, theme, offset, limit))
+        return {"uid": uid, "theme": theme, "offset": offset, "runs": runs}
+
+    def _search(self, params):
+        uid, theme = self._uid(params), self._theme(params)
+        offset, limit = self._page(params)
+        success = params.get("success")
+        if success not in (None, "", "0", "1"):
+            raise RequestError(400, "success must be 0 or 1")
+        filters = {
+            "success": None if success in (None, "") else success == "1",
+            "min_score": self._int(params, "min_score"),
+            "difficulty": self._int(params, "difficulty"),
+            "band_id": params.get("band") or None,
+            "relic_id": params.get("relic") or None,
+            "since_ts": self._int(params, "since"),
+            "until_ts": self._int(params, "until"),
+        }
+        runs = self._cached(uid, theme, "search", params,
+                            lambda: self.service.search_runs(uid, theme, limit=limit, offset=offset, **filters))
+        return {"uid": uid, "theme": theme, "offset": offset, "runs": runs}
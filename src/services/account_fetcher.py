@@ -0,0 +1,67 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional, NamedTuple
+
+from ..api.skland_client import SklandClient
+from ..api.rate_limiter import HostRateLimiter
+from .data_manager import MergeResult
+from ..metrics import metrics
+
+
+class AccountResult(NamedTuple):
+    index: int
+    uid: Optional[str]
+    error: Optional[str]
+    merge_results: Dict[str, MergeResult]
+    elapsed: float
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class MultiAccountFetcher:
+    """Fetches accounts on a bounded thread pool; merges run on the calling thread as each one completes."""
+
+    def __init__(self, config, rogue_service, tokens: List[str]):
+        self.config = config
+        self.service = rogue_service
+        self.tokens = tokens
+        self.max_workers = config.getint("ACCOUNTS", "MAX_WORKERS", fallback=4)
+        self.rate_limiter = HostRateLimiter(
+            config.getfloat("API", "RATE_LIMIT_PER_SECOND", fallback=5),
+            config.getint("API", "RATE_LIMIT_BURST", fallback=5)
+        )
+
+    def _fetch_account(self, token: str) -> tuple[Optional[str], Optional[Dict[str, Any]]]:
+        client = SklandClient(self.config, rate_limiter=self.rate_limiter)
+        with metrics.trace("account_fetch"), client.deadline():
+            if not client.authenticate(token):
+                raise RuntimeError("认证失败")
+            raw_data = client.get_rogue_info(self.service.record_keys)
+        if not raw_data:
+            raise RuntimeError("获取集成战略数据失败")
+        return client.uid, raw_data
+
+    def fetch_all(self) -> List[AccountResult]:
+        started = time.perf_counter()
+        results: List[AccountResult] = []
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="account") as executor:
+            futures = {executor.submit(self._fetch_account, token): i for i, token in enumerate(self.tokens)}
+            for future in as_completed(futures):
+                index = futures[future]
+                elapsed = time.perf_counter() - started
+                try:
+                    uid, raw_data = future.result()
+                    merge_results = self.service.ingest(uid, raw_data)
+                    results.append(AccountResult(index, uid, None, merge_results, elapsed))
+                    logging.info(f"Account #{index + 1} (UID {uid}) fetched and merged in {elapsed:.2f}s.")
+                except Exception as e:
+                    results.append(AccountResult(index, None, str(e), {}, elapsed))
+                    logging.error(f"Account #{index + 1} failed: {e}")
+
+        results.sort(key=lambda r: r.index)
+        logging.info(f"Refreshed {sum(r.ok for r in results)}/{len(results)} accounts "
+                     f"in {time.perf_counter() - started:.2f}s.")
+        return results
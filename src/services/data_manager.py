@@ -1,59 +1,864 @@
 import os
+import time
 import sqlite3
 import json
+import hashlib
 import logging
-from typing import List, Dict, Any
+import functools
+from typing import List, Dict, Any, Optional, Tuple, NamedTuple, Iterable, Callable
 
 from src.utils import get_persistent_path
+from src.metrics import metrics
+from .db_pool import ConnectionPool
+from .record_codec import RecordCodec
+from .stats_engine import Timeline
+from .theme_rules import CompiledThemeRules
 
 DB_PATH = get_persistent_path("data/rogue_data.db")
 
+SCHEMA_VERSION = 5
+
+# Runs sampled to train a record dictionary when none exists or the storage is recoded. Past a few hundred
+# runs the dictionary stops improving but training keeps getting slower.
+DICTIONARY_SAMPLE_SIZE = 500
+
+# Typed columns pulled out of each API record at insert time, in _extract_columns order.
+RUN_COLUMNS = (
+    ("success", "INTEGER"), ("score", "INTEGER"), ("mode_grade", "INTEGER"),
+    ("band_id", "TEXT"), ("end_ts", "INTEGER"), ("last_stage", "TEXT")
+)
+
+
+class MergeResult(NamedTuple):
+    inserted: int
+    updated: int
+    skipped: int
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.inserted or self.updated)
+
+
+AGGREGATE_FIELDS = (
+    "rules_hash", "total_runs", "valid_runs", "wins", "fifth_wins",
+    "current_streak", "max_streak", "current_fifth_streak", "max_fifth_streak", "last_start_ts"
+)
+
+# Dimensions of rogue_breakdowns; squads are stored by band id and relabelled on read.
+BREAKDOWN_DIMENSIONS = ("squad", "difficulty", "ending")
+
+
+def _reads(method):
+    """Run the method on a pooled reader, or on the writer when the calling thread is inside a write."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.pool.read():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _writes(method):
+    """Run the method holding the writer connection; writes from all threads are serialized."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.pool.write():
+            return method(self, *args, **kwargs)
+    return wrapper
+
 
 class DataManager:
-    def __init__(self):
+    def __init__(self, config=None):
         db_dir = os.path.dirname(DB_PATH)
         os.makedirs(db_dir, exist_ok=True)
-        self.conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        self.pool = ConnectionPool.from_config(DB_PATH, config)
+        # Called with (uid, theme) after runs are written, or (uid, None) after a profile is saved.
+        self.write_listeners: List[Callable[[str, Optional[str]], None]] = []
+        self._versions: Dict[Tuple[str, Optional[str]], int] = {}
+        self.codec = RecordCodec.from_config(config)
+        self.codec.dictionary_loader = self._fetch_dictionary
         self._create_table()
+        self._migrate()
+        self._create_indexes()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """The connection bound to this thread by the @_reads/@_writes method being run."""
+        conn = self.pool.current()
+        if conn is None:
+            raise RuntimeError("DataManager connection used outside a read or write")
+        return conn
 
+    @_writes
     def _create_table(self):
-        with self.conn:
-            self.conn.execute("""
-                CREATE TABLE IF NOT EXISTS rogue_runs (
-                    id TEXT PRIMARY KEY,
-                    uid TEXT NOT NULL,
-                    theme TEXT NOT NULL,
-                    start_ts INTEGER,
-                    record_data TEXT
-                )
-            """)
-
-    def merge_and_save_runs(self, uid: str, theme: str, new_runs: List[Dict[str, Any]]):
-        if not new_runs: return
-
-        runs_to_insert = []
-        for run in new_runs:
-            run_id = run.get("id")
-            if not run_id: continue
-            runs_to_insert.append((
-                run_id, uid, theme, run.get("startTs"), json.dumps(run)
-            ))
-
-        with self.conn:
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS rogue_runs (
+                id TEXT PRIMARY KEY,
+                uid TEXT NOT NULL,
+                theme TEXT NOT NULL,
+                start_ts INTEGER,
+                record_data TEXT,
+                content_hash TEXT,
+                relic_mask INTEGER,
+                success INTEGER,
+                score INTEGER,
+                mode_grade INTEGER,
+                band_id TEXT,
+                end_ts INTEGER,
+                last_stage TEXT
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS rogue_run_relics (
+                run_id TEXT NOT NULL,
+                relic_id TEXT NOT NULL,
+                PRIMARY KEY (run_id, relic_id)
+            ) WITHOUT ROWID
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS rogue_run_totems (
+                run_id TEXT NOT NULL,
+                totem_id TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (run_id, totem_id)
+            ) WITHOUT ROWID
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS rogue_aggregates (
+                uid TEXT NOT NULL,
+                theme TEXT NOT NULL,
+                rules_hash TEXT NOT NULL,
+                total_runs INTEGER NOT NULL DEFAULT 0,
+                valid_runs INTEGER NOT NULL DEFAULT 0,
+                wins INTEGER NOT NULL DEFAULT 0,
+                fifth_wins INTEGER NOT NULL DEFAULT 0,
+                current_streak INTEGER NOT NULL DEFAULT 0,
+                max_streak INTEGER NOT NULL DEFAULT 0,
+                current_fifth_streak INTEGER NOT NULL DEFAULT 0,
+                max_fifth_streak INTEGER NOT NULL DEFAULT 0,
+                last_start_ts INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (uid, theme)
+            )
+        """)
+        self.conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS rogue_breakdowns (
+                uid TEXT NOT NULL,
+                theme TEXT NOT NULL,
+                dimension TEXT NOT NULL,
+                group_key NOT NULL,
+                {', '.join(f"{field} {'TEXT' if field == 'rules_hash' else 'INTEGER'} NOT NULL"
+                           for field in AGGREGATE_FIELDS)},
+                PRIMARY KEY (uid, theme, dimension, group_key)
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS rogue_profiles (
+                uid TEXT PRIMARY KEY,
+                profile_data TEXT NOT NULL,
+                updated_at INTEGER NOT NULL
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS rogue_snapshot_imports (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                uid TEXT NOT NULL,
+                runs INTEGER NOT NULL,
+                imported_at INTEGER NOT NULL
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS rogue_codec_dicts (
+                id INTEGER PRIMARY KEY,
+                data BLOB NOT NULL,
+                created_at INTEGER NOT NULL
+            )
+        """)
+        self._load_dictionaries()
+
+    @_writes
+    def _create_indexes(self):
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_uid_theme_start ON rogue_runs (uid, theme, start_ts)")
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_runs_uid_theme_grade ON rogue_runs (uid, theme, mode_grade, start_ts)")
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_runs_uid_theme_band ON rogue_runs (uid, theme, band_id, start_ts)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_relics_relic ON rogue_run_relics (relic_id, run_id)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_totems_totem ON rogue_run_totems (totem_id, run_id)")
+
+    def _migrate(self):
+        """Step the schema up to SCHEMA_VERSION, each step committing together with the version it reaches."""
+        with self.pool.read():
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+
+        if version < 1:
+            with self.pool.write():
+                columns = {row[1] for row in self.conn.execute("PRAGMA table_info(rogue_runs)")}
+                for name, sql_type in RUN_COLUMNS:
+                    if name not in columns:
+                        self.conn.execute(f"ALTER TABLE rogue_runs ADD COLUMN {name} {sql_type}")
+
+                backfilled = 0
+                for runs in self._iter_run_batches():
+                    self.conn.executemany(
+                        f"UPDATE rogue_runs SET {', '.join(name + ' = ?' for name, _ in RUN_COLUMNS)} WHERE id = ?",
+                        [(*self._extract_columns(run), run_id) for run_id, run in runs]
+                    )
+                    self._write_child_rows(runs)
+                    backfilled += len(runs)
+                self.conn.execute("PRAGMA user_version = 1")
+            logging.info(f"Migrated rogue_runs to schema v1, backfilled {backfilled} runs.")
+
+        if version < 2:
+            with self.pool.write():
+                columns = {row[1] for row in self.conn.execute("PRAGMA table_info(rogue_runs)")}
+                if "content_hash" not in columns:
+                    self.conn.execute("ALTER TABLE rogue_runs ADD COLUMN content_hash TEXT")
+                for runs in self._iter_run_batches():
+                    self.conn.executemany(
+                        "UPDATE rogue_runs SET content_hash = ? WHERE id = ?",
+                        [(self._content_hash(json.dumps(run, sort_keys=True)), run_id) for run_id, run in runs]
+                    )
+                self.conn.execute("PRAGMA user_version = 2")
+            logging.info("Migrated rogue_runs to schema v2, backfilled content hashes.")
+
+        if version < 3:
+            with self.pool.write():
+                columns = {row[1] for row in self.conn.execute("PRAGMA table_info(rogue_runs)")}
+                if "relic_mask" not in columns:
+                    self.conn.execute("ALTER TABLE rogue_runs ADD COLUMN relic_mask INTEGER")
+                # Relic masks are filled in by the next aggregate rebuild, which needs the theme rules.
+                self.conn.execute("DELETE FROM rogue_aggregates")
+                self.conn.execute("PRAGMA user_version = 3")
+            logging.info("Migrated rogue_runs to schema v3, aggregates will be rebuilt with relic masks.")
+
+        if version < 4:
+            self.recode_runs()
+            with self.pool.write():
+                self.conn.execute("PRAGMA user_version = 4")
+            logging.info("Migrated rogue_runs to schema v4, record_data uses the binary record codec.")
+
+        if version < 5:
+            with self.pool.write():
+                # Breakdowns are filled in alongside the aggregates, so rebuilding those fills both.
+                self.conn.execute("DELETE FROM rogue_aggregates")
+                self.conn.execute("PRAGMA user_version = 5")
+            logging.info("Migrated to schema v5, aggregates will be rebuilt with per-group breakdowns.")
+
+    def _iter_stored_batches(self, batch_size: int = 1000):
+        last_rowid = 0
+        while rows := self.conn.execute(
+                "SELECT rowid, id, record_data FROM rogue_runs WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                (last_rowid, batch_size)
+        ).fetchall():
+            last_rowid = rows[-1][0]
+            yield [(run_id, record_data) for _, run_id, record_data in rows]
+
+    def _iter_run_batches(self, batch_size: int = 1000):
+        for rows in self._iter_stored_batches(batch_size):
+            yield [(run_id, self.codec.decode(record_data)) for run_id, record_data in rows]
+
+    def _load_dictionaries(self):
+        for dictionary_id, data in self.conn.execute("SELECT id, data FROM rogue_codec_dicts ORDER BY id"):
+            self.codec.add_dictionary(dictionary_id, data)
+
+    def _fetch_dictionary(self, dictionary_id: int) -> Optional[bytes]:
+        """A dictionary trained by another process after this one loaded its dictionaries.
+
+        Uses its own short-lived connection, as the caller may be decoding on any thread or connection.
+        """
+        conn = sqlite3.connect(self.pool.path, timeout=self.pool.busy_timeout)
+        try:
+            row = conn.execute("SELECT data FROM rogue_codec_dicts WHERE id = ?", (dictionary_id,)).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else None
+
+    def _train_dictionary(self, runs: Iterable[Dict[str, Any]], extra_strings: Iterable[str] = ()) -> int:
+        """Store a dictionary built from `runs`; it becomes the active one once the current write commits.
+
+        Until then only values encoded with the returned id use it.
+        """
+        data = self.codec.build_dictionary(runs, extra_strings)
+        dictionary_id = self.conn.execute("INSERT INTO rogue_codec_dicts (data, created_at) VALUES (?, ?)",
+                                          (data, int(time.time()))).lastrowid
+        self.codec.add_dictionary(dictionary_id, data, active=False)
+        self.pool.on_commit(lambda: self.codec.add_dictionary(dictionary_id, data),
+                            lambda: self.codec.remove_dictionary(dictionary_id))
+        logging.info(f"Trained record dictionary {dictionary_id} ({len(data)} bytes).")
+        return dictionary_id
+
+    @_reads
+    def storage_size(self) -> int:
+        return self.conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(CAST(record_data AS BLOB))), 0) FROM rogue_runs").fetchone()[0]
+
+    def recode_runs(self, retrain: bool = True) -> int:
+        """Re-encode every run not already in the current codec format, then reclaim the freed pages.
+
+        With `retrain` a new dictionary is trained on a sample of the stored runs first, which helps after
+        a season adds relics and squads the current dictionary has never seen.
+        """
+        before = self.storage_size()
+        recoded = 0
+        with self.pool.write():
+            dictionary_id = None
+            if retrain and self.codec.uses_dictionary:
+                sample = [self.codec.decode(row[0]) for row in self.conn.execute(
+                    "SELECT record_data FROM rogue_runs ORDER BY RANDOM() LIMIT ?", (DICTIONARY_SAMPLE_SIZE,))]
+                if sample:
+                    dictionary_id = self._train_dictionary(sample)
+            for rows in self._iter_stored_batches():
+                updates = [(self.codec.encode(self.codec.decode(record_data), dictionary_id), run_id)
+                           for run_id, record_data in rows if not self.codec.is_current(record_data, dictionary_id)]
+                self.conn.executemany("UPDATE rogue_runs SET record_data = ? WHERE id = ?", updates)
+                recoded += len(updates)
+        if recoded:
+            self.pool.vacuum()
+        logging.info(f"Recoded {recoded} runs as {self.codec.describe}: "
+                     f"{before / 2 ** 20:.1f} MiB -> {self.storage_size() / 2 ** 20:.1f} MiB.")
+        return recoded
+
+    @staticmethod
+    def _extract_columns(run: Dict[str, Any]) -> tuple:
+        return (
+            run.get("success"), run.get("score"), run.get("modeGrade"),
+            (run.get("band") or {}).get("id"), run.get("endTs"), run.get("lastStage")
+        )
+
+    def _write_child_rows(self, runs: List[Tuple[str, Dict[str, Any]]]):
+        run_ids = [(run_id,) for run_id, _ in runs]
+        self.conn.executemany("DELETE FROM rogue_run_relics WHERE run_id = ?", run_ids)
+        self.conn.executemany("DELETE FROM rogue_run_totems WHERE run_id = ?", run_ids)
+        # Inserting in primary key order keeps the b-tree writes of a large batch on neighbouring pages.
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO rogue_run_relics (run_id, relic_id) VALUES (?, ?)",
+            sorted((run_id, relic) for run_id, run in runs for relic in run.get("gainRelicList") or [])
+        )
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO rogue_run_totems (run_id, totem_id, count) VALUES (?, ?, ?)",
+            sorted(((run_id, totem.get("id"), totem.get("count", 0))
+                    for run_id, run in runs for totem in run.get("totemList") or [] if totem.get("id")),
+                   key=lambda row: row[:2])
+        )
+
+    @_writes
+    def merge_and_save_runs(self, uid: str, theme: str, new_runs: List[Dict[str, Any]],
+                            rules: Optional[CompiledThemeRules] = None, defer_aggregate: bool = False) -> MergeResult:
+        """Insert new runs and update changed ones in one transaction.
+
+        Fetched runs may carry only some fields ([API] RECORD_KEYS); a stored run keeps its other fields and
+        only counts as updated when one of the fetched values differs.
+        `defer_aggregate` drops the aggregate instead of folding the runs into it, for bulk loads that call
+        rebuild_aggregate once at the end.
+        """
+        with metrics.span("db.merge", theme=theme, rows=len(new_runs)) as span:
+            if not new_runs: return MergeResult(0, 0, 0)
+
+            incoming = {}
+            for run in new_runs:
+                run_id = run.get("id")
+                if not run_id: continue
+                # Change detection hashes canonical JSON, so it is independent of the storage codec.
+                incoming[run_id] = (run, self._content_hash(json.dumps(run, sort_keys=True)))
+
+            existing_hashes = self._get_existing_hashes(list(incoming))
+            inserted = [run_id for run_id in incoming if run_id not in existing_hashes]
+            differing = [run_id for run_id in incoming
+                         if run_id in existing_hashes and existing_hashes[run_id] != incoming[run_id][1]]
+            # The hash covers the fetched fields only, so a different field selection than the stored run was
+            # hashed with also lands here; compare the values themselves before rewriting anything.
+            updated, rehashed = [], []
+            stored_runs = self._get_stored_runs(differing)
+            for run_id in differing:
+                run, content_hash = incoming[run_id]
+                merged = {**stored_runs[run_id], **run}
+                if merged == stored_runs[run_id]:
+                    rehashed.append((content_hash, run_id))
+                else:
+                    incoming[run_id] = (merged, content_hash)
+                    updated.append(run_id)
+            if rehashed:
+                self.conn.executemany("UPDATE rogue_runs SET content_hash = ? WHERE id = ?", rehashed)
+            result = MergeResult(len(inserted), len(updated), len(incoming) - len(inserted) - len(updated))
+            span.set(inserted=result.inserted, updated=result.updated)
+            if not result.changed:
+                logging.info(f"No changes in {result.skipped} fetched runs, no runs rewritten.")
+                return result
+
+            dictionary_id = None
+            if self.codec.uses_dictionary and not self.codec.dictionary_id:
+                # Another process may have trained one since this one started.
+                self._load_dictionaries()
+                if not self.codec.dictionary_id:
+                    sample = (inserted + updated)[:DICTIONARY_SAMPLE_SIZE]
+                    dictionary_id = self._train_dictionary((incoming[run_id][0] for run_id in sample),
+                                                           rules.relic_bits if rules else ())
+
+            def row_values(run_id: str) -> tuple:
+                run, content_hash = incoming[run_id]
+                relic_mask = rules.record_mask(run) if rules else None
+                return (run.get("startTs"), self.codec.encode(run, dictionary_id), content_hash, relic_mask,
+                        *self._extract_columns(run))
+
             self.conn.executemany(
-                "INSERT OR REPLACE INTO rogue_runs (id, uid, theme, start_ts, record_data) VALUES (?, ?, ?, ?, ?)",
-                runs_to_insert
+                f"INSERT INTO rogue_runs (id, uid, theme, start_ts, record_data, content_hash, relic_mask, "
+                f"{', '.join(name for name, _ in RUN_COLUMNS)}) VALUES ({', '.join('?' * (7 + len(RUN_COLUMNS)))})",
+                [(run_id, uid, theme, *row_values(run_id)) for run_id in inserted]
             )
-        logging.info(f"Merged and saved {len(runs_to_insert)} runs to the database.")
+            self.conn.executemany(
+                f"UPDATE rogue_runs SET start_ts = ?, record_data = ?, content_hash = ?, relic_mask = ?, "
+                f"{', '.join(name + ' = ?' for name, _ in RUN_COLUMNS)} WHERE id = ?",
+                [(*row_values(run_id), run_id) for run_id in updated]
+            )
+            self._write_child_rows([(run_id, incoming[run_id][0]) for run_id in inserted + updated])
+            if not rules or defer_aggregate:
+                # Without the theme rules the aggregate can't be folded forward; drop it so it is rebuilt on read.
+                self.conn.execute("DELETE FROM rogue_aggregates WHERE uid = ? AND theme = ?", (uid, theme))
+                self.conn.execute("DELETE FROM rogue_breakdowns WHERE uid = ? AND theme = ?", (uid, theme))
+            elif updated:
+                # A changed payload can flip an already-counted outcome, so recount from scratch.
+                self.rebuild_aggregate(uid, theme, rules)
+            elif inserted:
+                self._apply_runs_to_aggregate(uid, theme, [incoming[run_id][0] for run_id in inserted], rules)
+            logging.info(f"Merged runs into the database: {result.inserted} inserted, "
+                         f"{result.updated} updated, {result.skipped} unchanged.")
+            self.pool.on_commit(lambda: self._notify_write(uid, theme))
+            return result
+
+    def data_version(self, uid: str, theme: Optional[str] = None) -> Tuple[int, int]:
+        """Changes after each committed write to (uid, theme) in this process; theme None is the profile.
+
+        Also changes after any commit by another process, which may have written to any uid.
+        """
+        return self.pool.external_version(), self._versions.get((uid, theme), 0)
+
+    def _notify_write(self, uid: str, theme: Optional[str]):
+        self._versions[(uid, theme)] = self._versions.get((uid, theme), 0) + 1
+        for listener in self.write_listeners:
+            try:
+                listener(uid, theme)
+            except Exception as e:
+                logging.error(f"Write listener failed: {e}")
+
+    @staticmethod
+    def _content_hash(record_data: str) -> str:
+        return hashlib.sha1(record_data.encode('utf-8')).hexdigest()
 
+    def _get_existing_hashes(self, run_ids: List[str]) -> Dict[str, Optional[str]]:
+        existing = {}
+        for i in range(0, len(run_ids), 500):
+            chunk = run_ids[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            cursor = self.conn.execute(f"SELECT id, content_hash FROM rogue_runs WHERE id IN ({placeholders})", chunk)
+            existing.update(cursor.fetchall())
+        return existing
+
+    def _get_stored_runs(self, run_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        stored = {}
+        for i in range(0, len(run_ids), 500):
+            chunk = run_ids[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            cursor = self.conn.execute(f"SELECT id, record_data FROM rogue_runs WHERE id IN ({placeholders})", chunk)
+            stored.update((run_id, self.codec.decode(record_data)) for run_id, record_data in cursor)
+        return stored
+
+    @_reads
     def get_all_runs(self, uid: str, theme: str) -> List[Dict[str, Any]]:
-        with self.conn:
+        with metrics.span("db.load", theme=theme) as span:
             cursor = self.conn.execute(
                 "SELECT record_data FROM rogue_runs WHERE uid = ? AND theme = ? ORDER BY start_ts DESC",
                 (uid, theme)
             )
-            return [json.loads(row[0]) for row in cursor.fetchall()]
+            runs = [self.codec.decode(row[0]) for row in cursor.fetchall()]
+            span.set(rows=len(runs))
+            return runs
 
-    def close(self):
-        self.conn.close()
+    def iter_runs(self, uids: Optional[List[str]] = None, themes: Optional[List[str]] = None,
+                  batch_size: int = 1000) -> Iterable[List[Tuple[str, str, Dict[str, Any]]]]:
+        """(uid, theme, run) batches in storage order, decoding one batch at a time; None means every uid/theme.
+
+        Holds one reader until exhausted or closed and only sees committed runs.
+        """
+        where, params = "", []
+        for column, values in (("uid", uids), ("theme", themes)):
+            if values is not None:
+                where += f" AND {column} IN ({', '.join('?' * len(values))})"
+                params += values
+        last_rowid = 0
+        with self.pool.reader() as conn:
+            while rows := conn.execute(
+                    f"SELECT rowid, uid, theme, record_data FROM rogue_runs WHERE rowid > ?{where} ORDER BY rowid LIMIT ?",
+                    (last_rowid, *params, batch_size)
+            ).fetchall():
+                last_rowid = rows[-1][0]
+                yield [(uid, theme, self.codec.decode(record_data)) for _, uid, theme, record_data in rows]
+
+    @_reads
+    def get_recent_runs(self, uid: str, theme: str, limit: int, offset: int = 0) -> List[Dict[str, Any]]:
+        with metrics.span("db.load", theme=theme, offset=offset) as span:
+            cursor = self.conn.execute(
+                "SELECT record_data FROM rogue_runs WHERE uid = ? AND theme = ? "
+                "ORDER BY start_ts DESC, id LIMIT ? OFFSET ?",
+                (uid, theme, limit, offset)
+            )
+            runs = [self.codec.decode(row[0]) for row in cursor.fetchall()]
+            span.set(rows=len(runs))
+            return runs
+
+    @_reads
+    def count_runs(self, uid: str, theme: str) -> int:
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM rogue_runs WHERE uid = ? AND theme = ?", (uid, theme)
+        ).fetchone()[0]
+
+    @_reads
+    def search_runs(self, uid: str, theme: str, success: Optional[bool] = None, min_score: Optional[int] = None,
+                    difficulty: Optional[int] = None, band_id: Optional[str] = None, relic_id: Optional[str] = None,
+                    since_ts: Optional[int] = None, until_ts: Optional[int] = None,
+                    limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        """Runs matching every given filter, newest first; filters use the typed columns and relic table."""
+        query = "SELECT record_data FROM rogue_runs WHERE uid = ? AND theme = ?"
+        params: List[Any] = [uid, theme]
+        filters = [
+            ("success = ?", None if success is None else int(success)), ("score >= ?", min_score),
+            ("mode_grade = ?", difficulty), ("band_id = ?", band_id),
+            ("id IN (SELECT run_id FROM rogue_run_relics WHERE relic_id = ?)", relic_id),
+            ("start_ts >= ?", since_ts), ("start_ts < ?", until_ts),
+        ]
+        for clause, value in filters:
+            if value is not None:
+                query += f" AND {clause}"
+                params.append(value)
+        query += " ORDER BY start_ts DESC, id LIMIT ? OFFSET ?"
+        params += [limit, offset]
+        return [self.codec.decode(row[0]) for row in self.conn.execute(query, params).fetchall()]
+
+    @_reads
+    def get_run_timeline(self, uid: str, theme: str, rules: CompiledThemeRules,
+                         since_ts: Optional[float] = None) -> Timeline:
+        """Start time and outcome of each valid run from `since_ts` on, oldest first, without decoding record_data.
+
+        Relies on relic_mask being current for `rules`, which holds whenever get_aggregate() returns a row.
+        """
+        query = """
+            SELECT start_ts, success = 1, success = 1 AND (relic_mask & ?) != 0
+            FROM rogue_runs
+            WHERE uid = ? AND theme = ? AND score > ?
+        """
+        params = [rules.fifth_mask, uid, theme, rules.min_score]
+        if since_ts is not None:
+            query += " AND start_ts >= ?"
+            params.append(since_ts)
+        query += " ORDER BY start_ts"
+        with metrics.span("db.timeline", theme=theme) as span:
+            rows = self.conn.execute(query, params).fetchall()
+            span.set(rows=len(rows))
+        return Timeline([start_ts or 0 for start_ts, _, _ in rows], [bool(is_win) for _, is_win, _ in rows],
+                        [bool(is_fifth) for _, _, is_fifth in rows])
+
+    @_reads
+    def get_nth_recent_start(self, uid: str, theme: str, rules: CompiledThemeRules, n: int) -> Optional[int]:
+        """start_ts of the n-th most recent valid run, or None if there are fewer than n."""
+        row = self.conn.execute(
+            "SELECT start_ts FROM rogue_runs WHERE uid = ? AND theme = ? AND score > ? "
+            "ORDER BY start_ts DESC LIMIT 1 OFFSET ?",
+            (uid, theme, rules.min_score, n - 1)
+        ).fetchone()
+        return row[0] if row else None
 
+    @_reads
+    def get_last_run_end(self, uid: str, theme: str) -> Optional[int]:
+        row = self.conn.execute(
+            "SELECT end_ts FROM rogue_runs WHERE uid = ? AND theme = ? ORDER BY start_ts DESC LIMIT 1", (uid, theme)
+        ).fetchone()
+        return int(row[0]) if row and row[0] else None
+
+    @_reads
+    def get_band_names(self, theme: str) -> Dict[str, str]:
+        """band_id -> squad name, read from one stored run per band."""
+        names = {}
+        for band_id, record_data in self.conn.execute(
+                "SELECT band_id, record_data FROM rogue_runs WHERE rowid IN "
+                "(SELECT MIN(rowid) FROM rogue_runs WHERE theme = ? AND band_id IS NOT NULL GROUP BY band_id)",
+                (theme,)
+        ):
+            names[band_id] = (self.codec.decode(record_data).get("band") or {}).get("name") or band_id
+        return names
+
+    @staticmethod
+    def _group_expression(dimension: str, rules: CompiledThemeRules,
+                          band_labels: Optional[Dict[str, str]]) -> Tuple[str, List[Any]]:
+        if dimension == "difficulty":
+            return "mode_grade", []
+        if dimension == "squad":
+            if not band_labels:
+                return "band_id", []
+            return (f"CASE band_id {' '.join('WHEN ? THEN ?' for _ in band_labels)} ELSE band_id END",
+                    [value for pair in band_labels.items() for value in pair])
+        if dimension == "ending":
+            # The deepest ending a win reached; failures group under NULL.
+            cases = [(mask, name) for name, mask in reversed(rules.other_ending_masks)]
+            if rules.ending_2_mask:
+                cases.append((rules.ending_2_mask, "2"))
+            return (f"CASE WHEN COALESCE(success, 0) != 1 THEN NULL "
+                    f"{' '.join('WHEN (relic_mask & ?) != 0 THEN ?' for _ in cases)} ELSE ? END",
+                    [value for case in cases for value in case] + [rules.default_win_ending])
+        raise ValueError(f"Unknown breakdown dimension '{dimension}'")
+
+    @_reads
+    def get_breakdown(self, uid: str, theme: str, rules: CompiledThemeRules, dimension: str,
+                      since_ts: Optional[float] = None, until_ts: Optional[float] = None,
+                      band_labels: Optional[Dict[str, str]] = None) -> List[Tuple[Any, int, int, int, int, int]]:
+        """(group, runs, wins, fifth_wins, max_streak, max_fifth_streak) per group of valid runs.
+
+        The whole history is read from rogue_breakdowns, kept current with the aggregates. Bounded windows
+        group in SQL, with streaks as gaps-and-islands over window functions: within a group, consecutive
+        equal outcomes share the difference of the two row numbers. `band_labels` maps band ids to the squad
+        label to group by. Relies on relic_mask being current for `rules`, like get_run_timeline.
+        """
+        if since_ts is None and until_ts is None and (
+                not band_labels or len(set(band_labels.values())) == len(band_labels)):
+            rows = self._stored_breakdown(uid, theme, rules, dimension, band_labels)
+            if rows:
+                return rows
+
+        group_sql, group_params = self._group_expression(dimension, rules, band_labels)
+        where, params = "uid = ? AND theme = ? AND score > ?", [uid, theme, rules.min_score]
+        if since_ts is not None:
+            where += " AND start_ts >= ?"
+            params.append(since_ts)
+        if until_ts is not None:
+            where += " AND start_ts < ?"
+            params.append(until_ts)
+        query = f"""
+            WITH runs AS (
+                SELECT {group_sql} AS g, id, start_ts, success = 1 AS win, success = 1 AND (relic_mask & ?) != 0 AS fifth
+                FROM rogue_runs WHERE {where}
+            ), islands AS MATERIALIZED (
+                SELECT g, win, fifth,
+                       ROW_NUMBER() OVER (PARTITION BY g ORDER BY start_ts, id)
+                       - ROW_NUMBER() OVER (PARTITION BY g, win ORDER BY start_ts, id) AS win_island,
+                       ROW_NUMBER() OVER (PARTITION BY g ORDER BY start_ts, id)
+                       - ROW_NUMBER() OVER (PARTITION BY g, fifth ORDER BY start_ts, id) AS fifth_island
+                FROM runs
+            )
+            SELECT t.g, t.runs, t.wins, t.fifths, COALESCE(w.streak, 0), COALESCE(f.streak, 0)
+            FROM (SELECT g, COUNT(*) AS runs, SUM(win) AS wins, SUM(fifth) AS fifths FROM islands GROUP BY g) t
+            LEFT JOIN (
+                SELECT g, MAX(n) AS streak FROM (SELECT g, COUNT(*) AS n FROM islands WHERE win GROUP BY g, win_island)
+                GROUP BY g
+            ) w ON w.g IS t.g
+            LEFT JOIN (
+                SELECT g, MAX(n) AS streak FROM (SELECT g, COUNT(*) AS n FROM islands WHERE fifth GROUP BY g, fifth_island)
+                GROUP BY g
+            ) f ON f.g IS t.g
+        """
+        with metrics.span("db.breakdown", theme=theme, dimension=dimension) as span:
+            rows = self.conn.execute(query, [*group_params, rules.fifth_mask, *params]).fetchall()
+            span.set(groups=len(rows))
+        return rows
+
+    def _stored_breakdown(self, uid: str, theme: str, rules: CompiledThemeRules, dimension: str,
+                          band_labels: Optional[Dict[str, str]]) -> List[tuple]:
+        cursor = self.conn.execute(
+            "SELECT group_key, valid_runs, wins, fifth_wins, max_streak, max_fifth_streak FROM rogue_breakdowns "
+            "WHERE uid = ? AND theme = ? AND dimension = ? AND rules_hash = ? AND valid_runs > 0",
+            (uid, theme, dimension, rules.rules_hash)
+        )
+        rows = []
+        for key, *values in cursor:
+            key = None if key == "" else key
+            if dimension == "squad" and band_labels:
+                key = band_labels.get(key, key)
+            rows.append((key, *values))
+        return rows
+
+    @_writes
+    def save_profile(self, uid: str, profile: Dict[str, Any]):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO rogue_profiles (uid, profile_data, updated_at) VALUES (?, ?, ?)",
+            (uid, json.dumps(profile), int(time.time()))
+        )
+        self.pool.on_commit(lambda: self._notify_write(uid, None))
+
+    @_reads
+    def get_profile(self, uid: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute("SELECT profile_data FROM rogue_profiles WHERE uid = ?", (uid,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    @_reads
+    def get_imported_snapshots(self) -> Dict[str, Tuple[int, int]]:
+        """path -> (size, mtime_ns) of every snapshot file already imported."""
+        return {path: (size, mtime_ns) for path, size, mtime_ns in
+                self.conn.execute("SELECT path, size, mtime_ns FROM rogue_snapshot_imports")}
+
+    @_writes
+    def mark_snapshots_imported(self, snapshots: List[Tuple[str, int, int, str, int]]):
+        """Record (path, size, mtime_ns, uid, runs) of snapshot files whose runs have all been merged."""
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO rogue_snapshot_imports (path, size, mtime_ns, uid, runs, imported_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(*snapshot, int(time.time())) for snapshot in snapshots]
+        )
+
+    @_reads
+    def get_uids(self, theme: str) -> List[str]:
+        cursor = self.conn.execute("SELECT DISTINCT uid FROM rogue_runs WHERE theme = ?", (theme,))
+        return [row[0] for row in cursor.fetchall()]
+
+    @_reads
+    def get_aggregate(self, uid: str, theme: str, rules_hash: str) -> Optional[Dict[str, Any]]:
+        cursor = self.conn.execute(
+            f"SELECT {', '.join(AGGREGATE_FIELDS)} FROM rogue_aggregates WHERE uid = ? AND theme = ?",
+            (uid, theme)
+        )
+        row = cursor.fetchone()
+        if not row or row[0] != rules_hash:
+            return None
+        return dict(zip(AGGREGATE_FIELDS, row))
+
+    @_writes
+    def rebuild_aggregate(self, uid: str, theme: str, rules: CompiledThemeRules) -> Dict[str, Any]:
+        self._refresh_relic_masks(uid, theme, rules)
+        rows = self.conn.execute(
+            "SELECT start_ts, score, success, relic_mask, band_id, mode_grade FROM rogue_runs "
+            "WHERE uid = ? AND theme = ? ORDER BY start_ts ASC, id",
+            (uid, theme)
+        ).fetchall()
+        outcomes = [(start_ts or 0, *rules.classify(score, success, relic_mask))
+                    for start_ts, score, success, relic_mask, _, _ in rows]
+        aggregate = self._new_aggregate(rules)
+        self._fold_runs(aggregate, outcomes)
+        self._save_aggregate(uid, theme, aggregate)
+
+        # Partition the same outcomes by each breakdown group, then fold every group once.
+        group_outcomes: Dict[tuple, list] = {}
+        for (_, _, _, relic_mask, band_id, mode_grade), outcome in zip(rows, outcomes):
+            for key in self._group_keys(rules, band_id, mode_grade, relic_mask, outcome[2]):
+                group_outcomes.setdefault(key, []).append(outcome)
+        groups = {}
+        for key, group in group_outcomes.items():
+            groups[key] = self._new_aggregate(rules)
+            self._fold_runs(groups[key], group)
+        self.conn.execute("DELETE FROM rogue_breakdowns WHERE uid = ? AND theme = ?", (uid, theme))
+        self._save_breakdowns(uid, theme, groups)
+        logging.info(f"Rebuilt aggregate for {uid}/{theme}: {aggregate['total_runs']} runs.")
+        return aggregate
+
+    def _refresh_relic_masks(self, uid: str, theme: str, rules: CompiledThemeRules):
+        relic_ids = list(rules.relic_bits)
+        masks: Dict[str, int] = {}
+        if relic_ids:
+            cursor = self.conn.execute(
+                f"""
+                SELECT rr.run_id, rr.relic_id FROM rogue_run_relics rr
+                JOIN rogue_runs r ON r.id = rr.run_id
+                WHERE rr.relic_id IN ({', '.join('?' * len(relic_ids))}) AND r.uid = ? AND r.theme = ?
+                """,
+                (*relic_ids, uid, theme)
+            )
+            for run_id, relic_id in cursor:
+                masks[run_id] = masks.get(run_id, 0) | rules.relic_bits[relic_id]
+        self.conn.execute("UPDATE rogue_runs SET relic_mask = 0 WHERE uid = ? AND theme = ?", (uid, theme))
+        self.conn.executemany("UPDATE rogue_runs SET relic_mask = ? WHERE id = ?",
+                              [(mask, run_id) for run_id, mask in masks.items()])
+
+    def _apply_runs_to_aggregate(self, uid: str, theme: str, runs: List[Dict[str, Any]],
+                                 rules: CompiledThemeRules) -> Dict[str, Any]:
+        aggregate = self.get_aggregate(uid, theme, rules.rules_hash)
+        runs = sorted(runs, key=lambda r: int(r.get("startTs") or 0))
+        if aggregate is None or int(runs[0].get("startTs") or 0) < aggregate["last_start_ts"]:
+            # Streak state only extends forward in time; a missing/stale row or older runs need a full recount.
+            return self.rebuild_aggregate(uid, theme, rules)
+
+        outcomes = [(int(run.get("startTs") or 0), *rules.classify_record(run)) for run in runs]
+        self._fold_runs(aggregate, outcomes)
+        self._save_aggregate(uid, theme, aggregate)
+
+        groups = self._load_breakdowns(uid, theme)
+        changed = {}
+        for run, outcome in zip(runs, outcomes):
+            _, _, mode_grade, band_id, *_ = self._extract_columns(run)
+            for key in self._group_keys(rules, band_id, mode_grade, rules.record_mask(run), outcome[2]):
+                group = changed[key] = groups.get(key) or groups.setdefault(key, self._new_aggregate(rules))
+                self._fold_runs(group, (outcome,))
+        self._save_breakdowns(uid, theme, changed)
+        return aggregate
+
+    @staticmethod
+    def _new_aggregate(rules: CompiledThemeRules) -> Dict[str, Any]:
+        aggregate = dict.fromkeys(AGGREGATE_FIELDS, 0)
+        aggregate["rules_hash"] = rules.rules_hash
+        return aggregate
+
+    @staticmethod
+    def _group_keys(rules: CompiledThemeRules, band_id: Optional[str], mode_grade: Optional[int],
+                    relic_mask: int, is_win: bool) -> Tuple[tuple, ...]:
+        # Primary key columns can't hold a usable NULL, so missing values are stored as "".
+        return (
+            ("squad", "" if band_id is None else band_id),
+            ("difficulty", "" if mode_grade is None else mode_grade),
+            ("ending", rules.deepest_ending(relic_mask, is_win) or ""),
+        )
+
+    def _load_breakdowns(self, uid: str, theme: str) -> Dict[tuple, Dict[str, Any]]:
+        cursor = self.conn.execute(
+            f"SELECT dimension, group_key, {', '.join(AGGREGATE_FIELDS)} FROM rogue_breakdowns "
+            f"WHERE uid = ? AND theme = ?",
+            (uid, theme)
+        )
+        return {(dimension, key): dict(zip(AGGREGATE_FIELDS, values)) for dimension, key, *values in cursor}
+
+    def _save_breakdowns(self, uid: str, theme: str, groups: Dict[tuple, Dict[str, Any]]):
+        self.conn.executemany(
+            f"INSERT OR REPLACE INTO rogue_breakdowns (uid, theme, dimension, group_key, {', '.join(AGGREGATE_FIELDS)}) "
+            f"VALUES (?, ?, ?, ?, {', '.join('?' * len(AGGREGATE_FIELDS))})",
+            [(uid, theme, dimension, key, *(group[field] for field in AGGREGATE_FIELDS))
+             for (dimension, key), group in groups.items()]
+        )
+
+    @staticmethod
+    def _fold_runs(aggregate: Dict[str, Any], outcomes: Iterable[Tuple[int, bool, bool, bool]]):
+        """Fold (start_ts, is_valid, is_win, is_fifth_win) tuples, oldest first, into the aggregate."""
+        # Locals instead of dict updates per run: rebuilds fold every run into the aggregate and its groups.
+        total, valid, wins, fifths = (aggregate[k] for k in ("total_runs", "valid_runs", "wins", "fifth_wins"))
+        streak, max_streak = aggregate["current_streak"], aggregate["max_streak"]
+        fifth_streak, max_fifth_streak = aggregate["current_fifth_streak"], aggregate["max_fifth_streak"]
+        last_start_ts = aggregate["last_start_ts"]
+        for start_ts, is_valid, is_win, is_fifth in outcomes:
+            total += 1
+            if start_ts > last_start_ts:
+                last_start_ts = start_ts
+            if not is_valid:
+                continue
+            valid += 1
+            if is_win:
+                wins += 1
+                streak += 1
+                if streak > max_streak:
+                    max_streak = streak
+            else:
+                streak = 0
+            if is_fifth:
+                fifths += 1
+                fifth_streak += 1
+                if fifth_streak > max_fifth_streak:
+                    max_fifth_streak = fifth_streak
+            else:
+                fifth_streak = 0
+        aggregate.update(total_runs=total, valid_runs=valid, wins=wins, fifth_wins=fifths,
+                         current_streak=streak, max_streak=max_streak, current_fifth_streak=fifth_streak,
+                         max_fifth_streak=max_fifth_streak, last_start_ts=last_start_ts)
+
+    def _save_aggregate(self, uid: str, theme: str, aggregate: Dict[str, Any]):
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO rogue_aggregates (uid, theme, {', '.join(AGGREGATE_FIELDS)}) "
+            f"VALUES (?, ?, {', '.join('?' * len(AGGREGATE_FIELDS))})",
+            (uid, theme, *(aggregate[field] for field in AGGREGATE_FIELDS))
+        )
+
+    def close(self):
+        self.pool.close()
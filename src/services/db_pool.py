@@ -0,0 +1,211 @@
+"""SQLite connections for DataManager: one writer and a small pool of readers over a WAL database.
+
+In WAL mode readers see the last committed state and never wait for the writer, and the writer never
+waits for readers. Writes still have to be serialized, so every write goes through the single writer
+connection behind a lock; reads check out one of at most `readers` connections for their duration. A
+thread that holds the writer reads through it too, so it sees its own uncommitted rows.
+
+The outermost write() owns the transaction: it begins it, and commits or rolls back everything done in the
+block, including nested write() blocks. Code running under it must not commit on its own.
+
+Commits by other processes are counted in `external_epoch`, from PRAGMA data_version on a dedicated
+watcher connection, so caches keyed on it notice runs another instance (CLI, importer, server) has written.
+"""
+import logging
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+JOURNAL_MODES = ("wal", "delete", "truncate")
+SYNCHRONOUS_LEVELS = ("off", "normal", "full")
+
+
+class ConnectionPool:
+    def __init__(self, path: str, readers: int = 4, journal_mode: str = "wal", synchronous: str = "normal",
+                 cache_size_mb: float = 32, mmap_size_mb: float = 256, busy_timeout: float = 10):
+        self.path = path
+        self.max_readers = max(1, readers)
+        self.journal_mode = journal_mode.lower() if journal_mode.lower() in JOURNAL_MODES else "wal"
+        self.synchronous = synchronous.lower() if synchronous.lower() in SYNCHRONOUS_LEVELS else "normal"
+        self.cache_size_kib = int(cache_size_mb * 1024)
+        self.mmap_size = int(mmap_size_mb * 2 ** 20)
+        self.busy_timeout = busy_timeout
+
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._readers_lock = threading.Lock()
+        self._readers = []
+        self._stats = {"writes": 0, "reads": 0, "reader_waits": 0}
+        self._after_commit = []
+        self._after_rollback = []
+
+        self.writer = self._connect()
+        mode = self.writer.execute(f"PRAGMA journal_mode = {self.journal_mode}").fetchone()[0]
+        if mode != self.journal_mode:
+            # In-memory databases and some network filesystems can't use WAL; readers then wait for writes.
+            logging.warning(f"SQLite journal mode is {mode}, {self.journal_mode} was requested.")
+        self.writer.execute(f"PRAGMA synchronous = {self.synchronous}")
+
+        # data_version of a connection changes when any other connection commits. The watcher also sees this
+        # process's own commits, which write() marks as seen; the writer's only changes on other connections'.
+        self._watch_lock = threading.Lock()
+        self._watcher = self._connect(read_only=True)
+        self._watched_version = self._data_version(self._watcher)
+        self._writer_version = self._data_version(self.writer)
+        self.external_epoch = 0
+
+    @classmethod
+    def from_config(cls, path: str, config, section: str = "DATABASE") -> "ConnectionPool":
+        if config is None or not config.has_section(section):
+            return cls(path)
+        return cls(path, config.getint(section, "READERS", fallback=4),
+                   config.get(section, "JOURNAL_MODE", fallback="wal"),
+                   config.get(section, "SYNCHRONOUS", fallback="normal"),
+                   config.getfloat(section, "CACHE_SIZE_MB", fallback=32),
+                   config.getfloat(section, "MMAP_SIZE_MB", fallback=256),
+                   config.getfloat(section, "BUSY_TIMEOUT_SECONDS", fallback=10))
+
+    def _connect(self, read_only: bool = False) -> sqlite3.Connection:
+        # Pooled connections move between threads, but only ever serve one at a time.
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, check_same_thread=False)
+        conn.execute(f"PRAGMA cache_size = -{self.cache_size_kib}")
+        conn.execute(f"PRAGMA mmap_size = {self.mmap_size}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        if read_only:
+            conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def current(self) -> Optional[sqlite3.Connection]:
+        """The connection bound to this thread by write() or read(), if any."""
+        return getattr(self._local, "conn", None)
+
+    @contextmanager
+    def write(self) -> Iterator[sqlite3.Connection]:
+        """Hold the writer for the block, all of it in one transaction that is committed on the way out.
+
+        If the block raises, the transaction is rolled back. Nested calls join the outer transaction.
+        """
+        with self._write_lock:
+            outer = getattr(self._local, "conn", None)
+            if outer is self.writer:
+                yield self.writer
+                return
+            self._local.conn = self.writer
+            self._after_commit, self._after_rollback = [], []
+            self._stats["writes"] += 1
+            committed = False
+            try:
+                self.writer.execute("BEGIN IMMEDIATE")
+                self._check_writer_version()
+                yield self.writer
+                self.writer.commit()
+                committed = True
+                with self._watch_lock:
+                    self._watched_version = self._data_version(self._watcher)
+                # Anything committed elsewhere between our commit and the watcher read shows up here.
+                self._check_writer_version()
+            finally:
+                if not committed and self.writer.in_transaction:
+                    self.writer.rollback()
+                self._local.conn = outer
+                callbacks = self._after_commit if committed else self._after_rollback
+                self._after_commit, self._after_rollback = [], []
+                for callback in callbacks:
+                    callback()
+
+    @staticmethod
+    def _data_version(conn: sqlite3.Connection) -> int:
+        return conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _check_writer_version(self):
+        version = self._data_version(self.writer)
+        if version != self._writer_version:
+            self._writer_version = version
+            with self._watch_lock:
+                self.external_epoch += 1
+
+    def external_version(self) -> int:
+        """`external_epoch`, first bumped if another process has committed since it was last checked."""
+        with self._watch_lock:
+            version = self._data_version(self._watcher)
+            if version != self._watched_version:
+                self._watched_version = version
+                self.external_epoch += 1
+            return self.external_epoch
+
+    def on_commit(self, callback: Callable[[], None], on_rollback: Optional[Callable[[], None]] = None):
+        """Call `callback` once the current write() has committed, or `on_rollback` if it rolls back instead."""
+        if getattr(self._local, "conn", None) is not self.writer:
+            raise RuntimeError("on_commit() called outside a write")
+        self._after_commit.append(callback)
+        if on_rollback is not None:
+            self._after_rollback.append(on_rollback)
+
+    def vacuum(self):
+        """VACUUM can't run inside a transaction, so this takes the writer on its own, outside any write()."""
+        with self._write_lock:
+            if getattr(self._local, "conn", None) is self.writer:
+                raise RuntimeError("vacuum() called inside a write")
+            self.writer.execute("VACUUM")
+
+    @contextmanager
+    def read(self) -> Iterator[sqlite3.Connection]:
+        """Bind a reader to this thread for the block (or keep the connection already bound)."""
+        bound = getattr(self._local, "conn", None)
+        if bound is not None:
+            yield bound
+            return
+        with self.reader() as conn:
+            self._local.conn = conn
+            try:
+                yield conn
+            finally:
+                self._local.conn = None
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """Check out a reader without binding it, for generators that may be resumed on other threads."""
+        conn = self._checkout()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def _checkout(self) -> sqlite3.Connection:
+        with self._readers_lock:
+            self._stats["reads"] += 1
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            if len(self._readers) < self.max_readers:
+                conn = self._connect(read_only=True)
+                self._readers.append(conn)
+                return conn
+            self._stats["reader_waits"] += 1
+        return self._idle.get()
+
+    def stats(self) -> Dict[str, int]:
+        return {**self._stats, "readers": len(self._readers), "idle_readers": self._idle.qsize(),
+                "external_changes": self.external_epoch}
+
+    def close(self):
+        with self._readers_lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers.clear()
+        with self._watch_lock:
+            self._watcher.close()
+        with self._write_lock:
+            if self.journal_mode == "wal":
+                try:
+                    # Fold the log back into the database so the -wal file doesn't linger at full size.
+                    self.writer.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                except sqlite3.Error as e:
+                    logging.warning(f"WAL checkpoint on close failed: {e}")
+            self.writer.close()
@@ -0,0 +1,214 @@
+"""Versioned binary encoding for rogue_runs.record_data.
+
+Each value is a 4-byte header (format version, serializer/compression flags, dictionary id) followed by
+the payload: msgpack when installed, otherwise compact JSON, compressed with zstd when installed, otherwise
+raw deflate. Both compressors are primed with a shared preset dictionary of the strings that repeat across
+runs (relic, char, totem and band ids, squad names, record keys), so a repeat costs a short back-reference
+instead of its full text. Dictionaries are stored by id next to the runs and never change once written;
+one this codec hasn't seen, such as one trained by another process, is fetched with `dictionary_loader`.
+Rows written before the codec existed are JSON text and still decode.
+"""
+import json
+import logging
+import struct
+import threading
+import zlib
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, Optional, Union
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+FORMAT_VERSION = 1
+SERIALIZERS = ("json", "msgpack")
+COMPRESSIONS = ("none", "zlib", "zstd")
+# zlib only looks back 32 KiB, so a longer preset dictionary would be ignored.
+MAX_DICTIONARY_BYTES = 32 * 1024
+
+_HEADER = struct.Struct(">BBH")
+_DEFLATE_WBITS = -15  # raw deflate: no zlib header/checksum, sqlite already guards the bytes
+
+
+class CodecError(ValueError):
+    pass
+
+
+def _available(name: str) -> bool:
+    return {"msgpack": msgpack is not None, "zstd": zstandard is not None}.get(name, True)
+
+
+def _choose(requested: str, choices: tuple, preferred: str, fallback: str, kind: str) -> str:
+    requested = (requested or "auto").strip().lower()
+    if requested == "auto":
+        return preferred if _available(preferred) else fallback
+    if requested not in choices:
+        raise ValueError(f"Unknown storage {kind} '{requested}', expected one of {', '.join(choices)} or auto")
+    if not _available(requested):
+        logging.warning(f"Storage {kind} '{requested}' is not installed, falling back to {fallback}.")
+        return fallback
+    return requested
+
+
+def _zstd_dictionary(data):
+    return zstandard.ZstdCompressionDict(data, dict_type=zstandard.DICT_TYPE_RAWCONTENT) if data else None
+
+
+class RecordCodec:
+    def __init__(self, serializer: str = "auto", compression: str = "auto", level: int = 6):
+        self.serializer = _choose(serializer, SERIALIZERS, "msgpack", "json", "serializer")
+        self.compression = _choose(compression, COMPRESSIONS, "zstd", "zlib", "compression")
+        self.level = level
+        self._flags = SERIALIZERS.index(self.serializer) | COMPRESSIONS.index(self.compression) << 2
+        self.dictionaries: Dict[int, bytes] = {}
+        self.dictionary_id = 0  # dictionary new values are compressed with, 0 for none
+        # Looks up a dictionary id this codec doesn't know yet; returns its data, or None if there is none.
+        self.dictionary_loader: Optional[Callable[[int], Optional[bytes]]] = None
+        # Primed (de)compressors per thread: zstd objects must not be shared between threads.
+        self._local = threading.local()
+
+    @classmethod
+    def from_config(cls, config) -> "RecordCodec":
+        if config is None:
+            return cls()
+        return cls(config.get("STORAGE", "SERIALIZER", fallback="auto"),
+                   config.get("STORAGE", "COMPRESSION", fallback="auto"),
+                   config.getint("STORAGE", "COMPRESSION_LEVEL", fallback=6))
+
+    @property
+    def describe(self) -> str:
+        return f"v{FORMAT_VERSION} {self.serializer}+{self.compression} dict={self.dictionary_id}"
+
+    @property
+    def uses_dictionary(self) -> bool:
+        return self.compression != "none"
+
+    def add_dictionary(self, dictionary_id: int, data: bytes, active: bool = True):
+        self.dictionaries[dictionary_id] = bytes(data)
+        if active:
+            self.dictionary_id = dictionary_id
+
+    def remove_dictionary(self, dictionary_id: int):
+        """Forget a dictionary whose row was never committed, so its id can't decode someone else's values."""
+        self.dictionaries.pop(dictionary_id, None)
+        if self.dictionary_id == dictionary_id:
+            self.dictionary_id = 0
+        self._local = threading.local()
+
+    def is_current(self, data: Union[bytes, str, None], dictionary_id: Optional[int] = None) -> bool:
+        """Whether a stored value already uses this codec's settings and dictionary (default the active one)."""
+        if not isinstance(data, bytes) or len(data) < _HEADER.size:
+            return False
+        version, flags, stored_id = _HEADER.unpack_from(data)
+        expected = self.dictionary_id if dictionary_id is None else dictionary_id
+        return version == FORMAT_VERSION and flags == self._flags and stored_id == expected
+
+    def _dumps(self, value: Any) -> bytes:
+        if self.serializer == "msgpack":
+            return msgpack.packb(value, use_bin_type=True)
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def _compress(self, payload: bytes, dictionary_id: int) -> bytes:
+        compressors = self._local.__dict__.setdefault("compressors", {})
+        compressor = compressors.get(dictionary_id)
+        if compressor is None:
+            dictionary = self.dictionaries.get(dictionary_id)
+            if self.compression == "zstd":
+                compressor = zstandard.ZstdCompressor(level=self.level, write_checksum=False,
+                                                      dict_data=_zstd_dictionary(dictionary))
+            else:
+                compressor = (zlib.compressobj(self.level, zlib.DEFLATED, _DEFLATE_WBITS, zdict=dictionary)
+                              if dictionary else zlib.compressobj(self.level, zlib.DEFLATED, _DEFLATE_WBITS))
+            compressors[dictionary_id] = compressor
+        if self.compression == "zstd":
+            return compressor.compress(payload)
+        # The primed compressor is copied per value instead of loading the dictionary every time.
+        compressor = compressor.copy()
+        return compressor.compress(payload) + compressor.flush()
+
+    def encode(self, record: Dict[str, Any], dictionary_id: Optional[int] = None) -> bytes:
+        """Encode with the active dictionary, or with `dictionary_id` if given (e.g. one not yet committed)."""
+        dictionary_id = (self.dictionary_id if dictionary_id is None else dictionary_id) if self.uses_dictionary else 0
+        payload = self._dumps(record)
+        if self.compression != "none":
+            payload = self._compress(payload, dictionary_id)
+        return _HEADER.pack(FORMAT_VERSION, self._flags, dictionary_id) + payload
+
+    def decode(self, data: Union[bytes, str]) -> Dict[str, Any]:
+        if isinstance(data, str) or data[:1] in (b"{", b"["):
+            return json.loads(data)  # rows stored before the codec existed
+        version, flags, dictionary_id = _HEADER.unpack_from(data)
+        if version != FORMAT_VERSION:
+            raise CodecError(f"Unsupported record format version {version}")
+        serializer, compression = SERIALIZERS[flags & 3], COMPRESSIONS[flags >> 2 & 3]
+        payload = memoryview(data)[_HEADER.size:]
+        if compression != "none":
+            payload = self._decompress(compression, dictionary_id, payload)
+        if serializer == "msgpack":
+            if msgpack is None:
+                raise CodecError("Stored runs are msgpack encoded but msgpack is not installed")
+            return msgpack.unpackb(payload, raw=False)
+        return json.loads(bytes(payload))
+
+    def _decompress(self, compression: str, dictionary_id: int, payload) -> bytes:
+        dictionary = None
+        if dictionary_id:
+            dictionary = self.dictionaries.get(dictionary_id)
+            if dictionary is None and self.dictionary_loader is not None:
+                dictionary = self.dictionary_loader(dictionary_id)
+                if dictionary is not None:
+                    self.add_dictionary(dictionary_id, dictionary, active=False)
+                    dictionary = self.dictionaries[dictionary_id]
+            if dictionary is None:
+                raise CodecError(f"Unknown record dictionary {dictionary_id}")
+        if compression == "zlib":
+            decompressor = (zlib.decompressobj(_DEFLATE_WBITS, zdict=dictionary) if dictionary
+                            else zlib.decompressobj(_DEFLATE_WBITS))
+            return decompressor.decompress(payload) + decompressor.flush()
+        if zstandard is None:
+            raise CodecError("Stored runs are zstd compressed but zstandard is not installed")
+        decompressors = self._local.__dict__.setdefault("decompressors", {})
+        decompressor = decompressors.get(dictionary_id)
+        if decompressor is None:
+            decompressor = decompressors[dictionary_id] = zstandard.ZstdDecompressor(
+                dict_data=_zstd_dictionary(dictionary))
+        return decompressor.decompress(payload)
+
+    def build_dictionary(self, records: Iterable[Dict[str, Any]], extra_strings: Iterable[str] = ()) -> bytes:
+        """A preset dictionary from the keys and string values that repeat across `records`.
+
+        Tokens are serialized the way payloads are, most valuable last since nearer matches are cheaper,
+        followed by one whole sample record for the surrounding structure.
+        """
+        counts: Counter = Counter()
+        sample = None
+        # Iterative walk: records nest a few levels deep but hold thousands of values between them.
+        stack = []
+        for record in records:
+            sample = sample or record
+            stack.append(record)
+            while stack:
+                value = stack.pop()
+                if isinstance(value, dict):
+                    counts.update(value.keys())
+                    stack.extend(value.values())
+                elif isinstance(value, list):
+                    stack.extend(value)
+                elif isinstance(value, str) and value:
+                    counts[value] += 1
+        for string in extra_strings:
+            counts[string] += 2
+
+        tokens = sorted((token for token, count in counts.items() if count > 1),
+                        key=lambda token: counts[token] * len(token.encode("utf-8")))
+        data = b"".join(self._dumps(token) for token in tokens)
+        if sample is not None:
+            data += self._dumps(sample)
+        return data[-MAX_DICTIONARY_BYTES:]
+
@@ -0,0 +1,130 @@
+"""Single-flight background refreshes and the adaptive auto-refresh interval.
+
+RefreshWorker runs every refresh on one long-lived thread. A request made while a refresh is queued or
+running joins it instead of starting another fetch; cancel() makes the running refresh stop at its next
+checkpoint and drops its result, so a superseded refresh never reaches the UI. A request made after
+cancel() queues a fresh refresh to run once the cancelled one has stopped.
+
+AdaptiveInterval decides how long to wait before the next automatic refresh: back at the minimum while
+the player is active (the last refresh found new runs, or the newest run ended recently, so the next one
+is probably under way) and multiplied by the backoff after every refresh that found nothing, up to the
+maximum.
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+class RefreshWorker:
+    def __init__(self, task: Callable[[Callable[[], bool]], Any],
+                 deliver: Callable[[int, Any, Optional[BaseException]], None], name: str = "refresh"):
+        """`task(cancelled)` does one refresh, polling `cancelled()` between stages; `deliver(generation,
+        result, error)` is called on the worker thread with each result that was not cancelled."""
+        self._task = task
+        self._deliver = deliver
+        self._name = name
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._pending = False
+        self._running = False
+        self._running_generation = 0
+        self._closed = False
+        self._generation = 0
+        self._stats = {"requested": 0, "coalesced": 0, "completed": 0, "cancelled": 0}
+
+    @property
+    def busy(self) -> bool:
+        with self._cond:
+            return self._pending or self._running
+
+    def request(self) -> bool:
+        """Queue a refresh; False when it was coalesced into one already queued or running."""
+        with self._cond:
+            if self._closed:
+                return False
+            self._stats["requested"] += 1
+            if self._pending or (self._running and self._running_generation == self._generation):
+                self._stats["coalesced"] += 1
+                return False
+            self._pending = True
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, daemon=True, name=self._name)
+                self._thread.start()
+            self._cond.notify()
+            return True
+
+    def cancel(self):
+        """Drop the queued refresh and discard the result of the running one."""
+        with self._cond:
+            self._generation += 1
+            self._pending = False
+
+    def is_current(self, generation: int) -> bool:
+        with self._cond:
+            return generation == self._generation and not self._closed
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._generation += 1
+            self._pending = False
+            self._cond.notify()
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return dict(self._stats)
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                self._pending = False
+                self._running = True
+                generation = self._running_generation = self._generation
+
+            def cancelled() -> bool:
+                return not self.is_current(generation)
+
+            result, error = None, None
+            try:
+                result = self._task(cancelled)
+            except Exception as e:
+                error = e
+            with self._cond:
+                self._running = False
+                current = generation == self._generation and not self._closed
+                self._stats["completed" if current else "cancelled"] += 1
+            if current:
+                try:
+                    self._deliver(generation, result, error)
+                except Exception as e:
+                    logging.error(f"Delivering refresh result failed: {e}")
+
+
+class AdaptiveInterval:
+    def __init__(self, minimum: float, maximum: float, backoff: float = 2.0, active_window: float = 3600):
+        self.minimum = max(1.0, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.backoff = max(1.0, backoff)
+        self.active_window = active_window
+        self.current = self.minimum
+
+    @classmethod
+    def from_config(cls, config, section: str = "REFRESH") -> "AdaptiveInterval":
+        return cls(config.getfloat(section, "MIN_INTERVAL_SECONDS", fallback=60),
+                   config.getfloat(section, "MAX_INTERVAL_SECONDS", fallback=1800),
+                   config.getfloat(section, "BACKOFF", fallback=2.0),
+                   config.getfloat(section, "ACTIVE_WINDOW_MINUTES", fallback=60) * 60)
+
+    def update(self, changed: bool, last_run_end: Optional[float] = None, now: Optional[float] = None) -> float:
+        """Seconds until the next refresh after one that did (not) find new runs."""
+        now = time.time() if now is None else now
+        if changed or (last_run_end is not None and now - last_run_end < self.active_window):
+            self.current = self.minimum
+        else:
+            self.current = min(self.maximum, self.current * self.backoff)
+        return self.current
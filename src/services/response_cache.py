@@ -0,0 +1,84 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class _Flight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class ResponseCache:
+    """TTL cache keyed by (uid, theme, query).
+
+    Concurrent misses on one key are collapsed into a single computation. invalidate() is wired to
+    DataManager writes; a computation that overlaps an invalidation is returned but not stored.
+    """
+
+    MAX_ENTRIES = 1024
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl = ttl_seconds
+        self._entries: Dict[Tuple, Tuple[float, Any]] = {}
+        self._inflight: Dict[Tuple, _Flight] = {}
+        self._generations: Dict[Tuple[str, Optional[str]], int] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "collapsed": 0, "invalidations": 0}
+
+    def get_or_compute(self, key: Tuple, compute: Callable[[], Any]) -> Any:
+        uid, theme = key[0], key[1]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._stats["hits"] += 1
+                return entry[1]
+            flight = self._inflight.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = self._inflight[key] = _Flight()
+                generation = self._generations.get((uid, theme), 0)
+                self._stats["misses"] += 1
+            else:
+                self._stats["collapsed"] += 1
+
+        if not is_leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+        except BaseException as e:
+            flight.error = e
+            raise
+        else:
+            with self._lock:
+                if self._generations.get((uid, theme), 0) == generation:
+                    self._store(key, flight.value)
+            return flight.value
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.event.set()
+
+    def _store(self, key: Tuple, value: Any):
+        now = time.monotonic()
+        if len(self._entries) >= self.MAX_ENTRIES:
+            self._entries = {k: entry for k, entry in self._entries.items() if entry[0] > now}
+            if len(self._entries) >= self.MAX_ENTRIES:
+                self._entries.pop(next(iter(self._entries)))
+        self._entries[key] = (now + self.ttl, value)
+
+    def invalidate(self, uid: str, theme: Optional[str] = None):
+        """Drop entries for one (uid, theme); theme None covers theme-independent entries such as the profile."""
+        with self._lock:
+            self._generations[(uid, theme)] = self._generations.get((uid, theme), 0) + 1
+            self._entries = {key: entry for key, entry in self._entries.items() if key[:2] != (uid, theme)}
+            self._stats["invalidations"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries)}
@@ -1,20 +1,38 @@
 import logging
 import json
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Callable
 from collections import Counter
-from datetime import datetime, timedelta
+import time
+from datetime import datetime
 
-from .data_manager import DataManager
+from .data_manager import DataManager, MergeResult, BREAKDOWN_DIMENSIONS
+from .run_cache import RunCache
 from .alias_service import AliasService
+from .stats_engine import Timeline, create_stats_engine, format_stats
+from .windows import Window, DEFAULT_WINDOWS, load_seasons, parse_windows, time_bucket, timeline_lower_bound, locate
+from .theme_rules import CompiledThemeRules
 from ..utils import get_resource_path
+from ..metrics import metrics
 
 
 class RogueService:
-    def __init__(self, skland_client):
+    def __init__(self, skland_client, config=None):
         self.client = skland_client
-        self.db_manager = DataManager()
+        self.config = config if config is not None else getattr(skland_client, "config", None)
+        self.recent_runs_count = self.config.getint("APP", "ROGUE_RECENT_RUNS_COUNT") if self.config else 15
+        self.db_manager = DataManager(self.config)
         self.alias_service = AliasService()
+        # Analyses and decoded run pages per (uid, theme) data version, dropped as soon as that data changes.
+        self.cache = RunCache.from_config(self.db_manager.data_version, self.config)
+        self.db_manager.write_listeners.append(self.cache.invalidate)
+        self._raw_data: Optional[Dict[str, Any]] = None
+        self.last_merge_results: Dict[str, MergeResult] = {}
+        self.stats_engine = create_stats_engine(
+            self.config.get("ANALYSIS", "STATS_BACKEND", fallback="python") if self.config else "python"
+        )
+        self.seasons = load_seasons(self.config)
+        self.windows = self._configured_windows()
         self._load_theme_config()
 
     def _load_theme_config(self):
@@ -26,165 +44,322 @@ class RogueService:
         except (FileNotFoundError, json.JSONDecodeError) as e:
             logging.error(f"Failed to load or parse rogue_theme_config.json: {e}")
             self.theme_config = {}
+        self.theme_rules = {name: CompiledThemeRules(name, config) for name, config in self.theme_config.items()}
+        self.record_keys = self._record_keys()
 
-    def get_analysis_for_theme(self, theme_name: str) -> Optional[Dict[str, Any]]:
-        raw_data = self.client.get_rogue_info()
+    def _configured_windows(self) -> List[Window]:
+        specs = self.config.get("ANALYSIS", "WINDOWS", fallback=DEFAULT_WINDOWS) if self.config else DEFAULT_WINDOWS
+        try:
+            return parse_windows([specs], self.seasons)
+        except ValueError as e:
+            logging.error(f"Invalid [ANALYSIS] WINDOWS ({e}), using {DEFAULT_WINDOWS}.")
+            return parse_windows([DEFAULT_WINDOWS])
+
+    def parse_windows(self, specs: List[str]) -> List[Window]:
+        """Window specs from the CLI or HTTP API; raises ValueError on an invalid spec."""
+        return parse_windows(specs, self.seasons)
+
+    def _record_keys(self) -> Optional[List[str]]:
+        """Record fields to keep from the API: [API] RECORD_KEYS plus every key a theme config reads."""
+        configured = self.config.get("API", "RECORD_KEYS", fallback="*") if self.config else "*"
+        if configured.strip() == "*":
+            return None
+        keys = {key.strip() for key in configured.split(",") if key.strip()}
+        for rules in self.theme_rules.values():
+            for key in rules.keys.values():
+                keys.add(key[0] if isinstance(key, list) else key)
+        return sorted(keys)
+
+    def fetch_rogue_info(self) -> Optional[Dict[str, Any]]:
+        raw_data = self.client.get_rogue_info(self.record_keys)
+        if raw_data:
+            self._raw_data = raw_data
+        return raw_data
+
+    def _get_raw_data(self, use_cache: bool) -> Optional[Dict[str, Any]]:
+        if use_cache and self._raw_data is not None:
+            return self._raw_data
+        return self.fetch_rogue_info()
+
+    def route_records(self, raw_data: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+        """Split history.records by configured theme, using the theme_id prefix of band/relic ids."""
+        prefixes = [(f"{rules.config.get('theme_id')}_", name)
+                    for name, rules in self.theme_rules.items() if rules.config.get("theme_id")]
+        selected_topic = next((t.get("name") for t in raw_data.get("topics", []) if t.get("isSelected")), None)
+        fallback_theme = selected_topic if selected_topic in self.theme_rules else None
+
+        routed: Dict[str, List[Dict[str, Any]]] = {}
+        for record in raw_data.get("history", {}).get("records") or []:
+            ids = [(record.get("band") or {}).get("id") or "", *(record.get("gainRelicList") or [])[:1]]
+            theme_name = next((name for prefix, name in prefixes if any(i.startswith(prefix) for i in ids)),
+                              fallback_theme)
+            if theme_name:
+                routed.setdefault(theme_name, []).append(record)
+            else:
+                logging.debug(f"Could not match run {record.get('id')} to a configured theme, skipping.")
+        return routed
+
+    @staticmethod
+    def profile_from(raw_data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "gameUserInfo": raw_data.get("gameUserInfo", {}),
+            "career": raw_data.get("career", {}),
+            "topics": [{"name": t.get("name")} for t in raw_data.get("topics", [])],
+        }
+
+    def ingest(self, uid: str, raw_data: Dict[str, Any]) -> Dict[str, MergeResult]:
+        self.db_manager.save_profile(uid, self.profile_from(raw_data))
+        return {
+            theme_name: self.db_manager.merge_and_save_runs(uid, theme_name, records, rules=self.theme_rules[theme_name])
+            for theme_name, records in self.route_records(raw_data).items()
+        }
+
+    def analyze_all_themes(self, use_cache: bool = False,
+                           cancelled: Optional[Callable[[], bool]] = None) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Fetch (unless `use_cache`), store and analyse every theme; `cancelled()` is checked between stages."""
+        raw_data = self._get_raw_data(use_cache)
+        if not raw_data or (cancelled and cancelled()):
+            return {}
+
+        merge_results = {} if use_cache else self.ingest(self.client.uid, raw_data)
+        self.last_merge_results = merge_results
+        if cancelled and cancelled():
+            return {}
+        return {
+            theme_name: self._analyze_theme(raw_data, theme_name)
+            for theme_name in self.theme_rules
+        }
+
+    def last_run_end(self, uid: str) -> Optional[int]:
+        """End time of the most recent stored run in any theme."""
+        ends = [self.db_manager.get_last_run_end(uid, theme_name) for theme_name in self.theme_rules]
+        return max((end for end in ends if end), default=None)
+
+    def get_analysis_for_theme(self, theme_name: str, use_cache: bool = False) -> Optional[Dict[str, Any]]:
+        raw_data = self._get_raw_data(use_cache)
         if not raw_data:
             return None
 
+        if not use_cache:
+            self.ingest(self.client.uid, raw_data)
+        return self._analyze_theme(raw_data, theme_name)
+
+    def get_cached_analysis(self, uid: str, theme_name: str,
+                            windows: Optional[List[Window]] = None) -> Optional[Dict[str, Any]]:
+        """Analysis built purely from the local database and the last stored profile, no network access.
+
+        `windows` replaces the configured statistics windows for this call only.
+        """
+        profile = self.db_manager.get_profile(uid)
+        if not profile:
+            return None
+        analysis = self._analyze_theme(profile, theme_name, uid=uid)
+        if windows is None or windows == self.windows or not analysis or "error" in analysis:
+            return analysis
+        return {**analysis, "stats": {**analysis["stats"], "windows": self.get_window_stats(uid, theme_name, windows)}}
+
+    def _ensure_relic_masks(self, uid: str, theme_name: str, rules: CompiledThemeRules):
+        if self.db_manager.get_aggregate(uid, theme_name, rules.rules_hash) is None:
+            self.db_manager.rebuild_aggregate(uid, theme_name, rules)  # brings relic masks up to date
+
+    def get_window_stats(self, uid: str, theme_name: str, windows: List[Window]) -> Dict[str, Dict[str, Any]]:
+        """Stats for each window from a single indexed range query over the valid-run timeline."""
+        rules = self.theme_rules[theme_name]
+        self._ensure_relic_masks(uid, theme_name, rules)
+        now = time.time()
+        last_run_starts = {
+            window.last_runs: self.db_manager.get_nth_recent_start(uid, theme_name, rules, window.last_runs)
+            for window in windows if window.last_runs
+        }
+        timeline = self.db_manager.get_run_timeline(uid, theme_name, rules,
+                                                    since_ts=timeline_lower_bound(windows, now, last_run_starts))
+        return self._window_stats(timeline, windows, now)
+
+    def get_breakdown(self, uid: str, theme_name: str, dimension: str,
+                      window: Optional[Window] = None) -> List[Dict[str, Any]]:
+        """Counts, win rates and streaks per squad (by alias), difficulty or deepest ending, over `window`."""
+        if dimension not in BREAKDOWN_DIMENSIONS:
+            raise ValueError(f"Unknown breakdown '{dimension}', expected one of {', '.join(BREAKDOWN_DIMENSIONS)}")
+        rules = self.theme_rules[theme_name]
+        self._ensure_relic_masks(uid, theme_name, rules)
+
+        since_ts = until_ts = None
+        if window is not None and window.last_runs:
+            since_ts = self.db_manager.get_nth_recent_start(uid, theme_name, rules, window.last_runs)
+        elif window is not None:
+            since_ts, until_ts = window.bounds(time.time())
+        band_labels = None
+        if dimension == "squad":
+            band_labels = {band_id: self.alias_service.get_squad_alias(name)
+                           for band_id, name in self.db_manager.get_band_names(theme_name).items()}
+
+        groups = [
+            {"key": key, "label": self._group_label(dimension, key), "runs": runs, "wins": wins,
+             "fifth_wins": fifth_wins, **format_stats(runs, wins, max_streak, fifth_wins, max_fifth_streak)}
+            for key, runs, wins, fifth_wins, max_streak, max_fifth_streak in self.db_manager.get_breakdown(
+                uid, theme_name, rules, dimension, since_ts, until_ts, band_labels)
+        ]
+        if dimension == "squad":
+            groups.sort(key=lambda group: (-group["runs"], group["label"]))
+        else:
+            groups.sort(key=lambda group: (group["key"] is None, group["key"]))
+        return groups
+
+    @staticmethod
+    def _group_label(dimension: str, key: Any) -> str:
+        if dimension == "difficulty":
+            return f"难度{key}" if key is not None else "未知难度"
+        if dimension == "ending":
+            return f"结局{key}" if key is not None else "未通关"
+        return key or "未知分队"
+
+    def _window_stats(self, timeline: Timeline, windows: List[Window], now: float) -> Dict[str, Dict[str, Any]]:
+        ranges = locate(windows, timeline.start_ts, now)
+        return {
+            window.key: {"label": window.label, "runs": hi - lo, "stats": stats}
+            for window, (lo, hi), stats in zip(windows, ranges, self.stats_engine.window_stats(timeline, ranges))
+        }
+
+    def _analyze_theme(self, raw_data: Dict[str, Any], theme_name: str,
+                       uid: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        uid = uid or self.client.uid
         target_topic = next((t for t in raw_data.get("topics", []) if t.get("name") == theme_name), None)
         if not target_topic:
             logging.warning(f"Theme '{theme_name}' not found in API response.")
             return None
 
-        theme_config = self.theme_config.get(theme_name)
-        if not theme_config:
+        rules = self.theme_rules.get(theme_name)
+        if not rules:
             logging.error(f"No configuration found for theme: {theme_name}")
             return {"error": f"缺少对主题 {theme_name} 的配置"}
 
-        if new_records := raw_data.get("history", {}).get("records"):
-            self.db_manager.merge_and_save_runs(self.client.uid, theme_name, new_records)
-
-        all_records = self.db_manager.get_all_runs(self.client.uid, theme_name)
-        if not all_records:
+        def compute():
+            aggregate = self.db_manager.get_aggregate(uid, theme_name, rules.rules_hash)
+            if aggregate is None:
+                aggregate = self.db_manager.rebuild_aggregate(uid, theme_name, rules)
+            if not aggregate["total_runs"]:
+                return None
+            window_stats = self.get_window_stats(uid, theme_name, self.windows)
+            recent_records = self.db_manager.get_recent_runs(uid, theme_name, self.recent_runs_count)
+            with metrics.span("analysis", theme=theme_name, valid_runs=aggregate["valid_runs"]):
+                analysis = self._analyze_records(raw_data, recent_records, theme_name, rules, aggregate, window_stats)
+            analysis["uid"] = uid
+            return analysis
+
+        analysis = self.cache.get_or_compute(uid, theme_name, ("analysis", rules.rules_hash, time_bucket(self.windows)),
+                                             compute)
+        if analysis is None:
             return None
+        # The cached analysis is shared; player info comes from this call's data, which may be newer.
+        return {**analysis, "player_info": raw_data.get("gameUserInfo", {}),
+                "career_summary": raw_data.get("career", {})}
+
+    def rebuild_aggregates(self, theme_name: Optional[str] = None, uids: Optional[List[str]] = None):
+        theme_names = [theme_name] if theme_name else list(self.theme_rules)
+        for name in theme_names:
+            rules = self.theme_rules.get(name)
+            if not rules:
+                logging.error(f"No configuration found for theme: {name}")
+                continue
+            for uid in self.db_manager.get_uids(name) if uids is None else uids:
+                self.db_manager.rebuild_aggregate(uid, name, rules)
+
+    def _determine_ending(self, record: Dict[str, Any], rules: CompiledThemeRules) -> tuple[str, bool]:
+        keys = rules.keys
+        return rules.determine_ending(
+            rules.record_mask(record), record.get(keys["success_status"]) == 1, record.get(keys["last_stage"], "事件")
+        )
+
+    def _stats_from_aggregate(self, aggregate: Dict[str, Any]) -> Dict:
+        return format_stats(aggregate["valid_runs"], aggregate["wins"], aggregate["max_streak"],
+                            aggregate["fifth_wins"], aggregate["max_fifth_streak"])
+
+    def _timeline_from_records(self, records: List[Dict], rules: CompiledThemeRules) -> Timeline:
+        keys = rules.keys
+        valid = sorted(
+            ((int(r.get(keys["start_timestamp"], 0)), r) for r in records if r.get(keys["score"], 0) > rules.min_score),
+            key=lambda item: item[0]
+        )
+        wins = [r.get(keys["success_status"]) == 1 for _, r in valid]
+        return Timeline(
+            start_ts=[start_ts for start_ts, _ in valid], wins=wins,
+            fifths=[is_win and bool(rules.record_mask(r) & rules.fifth_mask) for is_win, (_, r) in zip(wins, valid)],
+        )
+
+    def _describe_run(self, record: Dict[str, Any], rules: CompiledThemeRules) -> Dict[str, Any]:
+        keys = rules.keys
+        ending_str, is_rolling = self._determine_ending(record, rules)
+
+        squad_name_full = record.get(keys["squad"][0], {}).get(keys["squad"][1], "N/A")
+        squad_alias = self.alias_service.get_squad_alias(squad_name_full)
+
+        start_ts = int(record.get(keys["start_timestamp"], 0))
+        end_ts = int(record.get(keys["end_timestamp"], 0))
+
+        primary_totem_id = rules.config["analysis_rules"]["primary_totem_id"]
+        totem_count = sum(
+            item.get('count', 0) for item in record.get(keys["totem_list"], [])
+            if item.get('id') == primary_totem_id
+        )
 
-        return self._analyze_records(raw_data, all_records, theme_name, theme_config)
-
-    def _determine_ending(self, record: Dict[str, Any], theme_config: Dict[str, Any]) -> tuple[str, bool]:
-        keys = theme_config["keys"]
-        rules = theme_config["ending_rules"]
-
-        relics = set(record.get(keys["relic_list"], []))
-        is_rolling = rules["is_rolling_relic"] in relics
-        is_success = record.get(keys["success_status"]) == 1
-
-        if not is_success:
-            last_stage = record.get(keys["last_stage"], "事件")
-            template = rules["text_templates"]["failure_rolling" if is_rolling else "failure"]
-            return template.format(last_stage=last_stage), is_rolling
-
-        ending_2_rule = next((ending for ending in rules["endings"] if ending["name"] == "2"), None)
+        return {
+            "difficulty": record.get(keys["difficulty"], "N/A"),
+            "squad": squad_alias,
+            "score": record.get(keys["score"], "N/A"),
+            "is_success": record.get(keys["success_status"]) == 1,
+            "ending": ending_str,
+            "is_rolling": is_rolling,
+            "start_date": datetime.fromtimestamp(start_ts).strftime('%m-%d'),
+            "duration_hours": f"{(end_ts - start_ts) / 3600:.1f}h" if start_ts and end_ts else "N/A",
+            "totem_count": totem_count,
+        }
 
-        final_endings = []
-        if ending_2_rule and ending_2_rule["relic"] in relics:
-            final_endings.append("2")
+    def get_runs_page(self, uid: str, theme_name: str, offset: int, limit: int) -> List[Dict[str, Any]]:
+        """Describe one page of a player's full run history, newest first, for the virtualized runs list."""
+        rules = self.theme_rules.get(theme_name)
+        if not rules:
+            return []
+        records = self.cache.get_or_compute(uid, theme_name, ("page", offset, limit),
+                                            lambda: self.db_manager.get_recent_runs(uid, theme_name, limit, offset=offset))
+        return [self._describe_run(record, rules) for record in records]
+
+    def search_runs(self, uid: str, theme_name: str, **filters) -> List[Dict[str, Any]]:
+        rules = self.theme_rules.get(theme_name)
+        if not rules:
+            return []
+        records = self.cache.get_or_compute(uid, theme_name, ("search", *sorted(filters.items())),
+                                            lambda: self.db_manager.search_runs(uid, theme_name, **filters))
+        return [self._describe_run(record, rules) for record in records]
+
+    def _analyze_records(self, raw_data: Dict, all_records: List[Dict], theme_name: str, rules: CompiledThemeRules,
+                         aggregate: Optional[Dict[str, Any]] = None,
+                         window_stats: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict:
+        """Without an aggregate or precomputed window stats, both come from `all_records` alone."""
+        if aggregate is None or window_stats is None:
+            timeline = self._timeline_from_records(all_records, rules)
+            if window_stats is None:
+                window_stats = self._window_stats(timeline, self.windows, time.time())
+
+        if aggregate:
+            total_runs, total_stats = aggregate["valid_runs"], self._stats_from_aggregate(aggregate)
         else:
-            final_endings.append(rules["default_win_ending"])
-
-        other_ending_rules = [ending for ending in rules["endings"] if ending["name"] != "2"]
-        achieved_other_endings = sorted([
-            ending["name"] for ending in other_ending_rules if ending["relic"] in relics
-        ])
-        final_endings.extend(achieved_other_endings)
-
-        ending_str = "".join(final_endings)
-
-        if "5" in final_endings:
-            for companion in rules.get("ending_5_companions", []):
-                if companion["relic"] in relics:
-                    ending_str += f" {companion['name']}"
-                    break
-
-        template_key = "success_rolling" if is_rolling else "success"
-        template = rules["text_templates"][template_key]
-        return template.format(endings=ending_str), is_rolling
-
-    def _calculate_max_streak(self, records_bool_list: List[bool]) -> int:
-        max_streak, current_streak = 0, 0
-        for is_win in records_bool_list:
-            if is_win:
-                current_streak += 1
-            else:
-                max_streak = max(max_streak, current_streak)
-                current_streak = 0
-        return max(max_streak, current_streak)
-
-    def _analyze_records(self, raw_data: Dict, all_records: List[Dict], theme_name: str, theme_config: Dict) -> Dict:
-        keys = theme_config["keys"]
-        analysis_rules = theme_config["analysis_rules"]
-        stats_def = theme_config["stats_definitions"]["fifth_ending"]
-
-        valid_records = [r for r in all_records if r.get(keys["score"], 0) > analysis_rules["min_score_for_valid"]]
-        seven_days_ago = datetime.now() - timedelta(days=7)
-        seven_day_records = [
-            r for r in valid_records
-            if datetime.fromtimestamp(int(r.get(keys["start_timestamp"], 0))) > seven_days_ago
-        ]
-
-        def get_stats(records: List[Dict]) -> Dict:
-            total = len(records)
-            if not total:
-                return {"win_rate": "0.00%", "max_streak": 0, "fifth_rate": "0.00%", "max_fifth_streak": 0}
-
-            win_bools = [r.get(keys["success_status"]) == 1 for r in records]
-            win_rate = (sum(win_bools) / total) * 100
-            max_streak = self._calculate_max_streak(win_bools)
-
-            fifth_win_bools = []
-            if stats_def["rule"]["type"] == "is_win_and_has_ending":
-                ending_name_to_check = stats_def["rule"]["ending_name"]
-                ending_rule = next(
-                    (e for e in theme_config["ending_rules"]["endings"] if e["name"] == ending_name_to_check), None)
-
-                if ending_rule:
-                    relic_to_check = ending_rule["relic"]
-                    fifth_win_bools = [
-                        r.get(keys["success_status"]) == 1 and relic_to_check in r.get(keys["relic_list"], [])
-                        for r in records
-                    ]
-
-            fifth_rate = (sum(fifth_win_bools) / total) * 100 if total > 0 else 0
-            max_fifth_streak = self._calculate_max_streak(fifth_win_bools)
-
-            return {
-                "win_rate": f"{win_rate:.2f}%", "max_streak": max_streak,
-                "fifth_rate": f"{fifth_rate:.2f}%", "max_fifth_streak": max_fifth_streak
-            }
+            total_runs, total_stats = len(timeline.wins), self.stats_engine.compute_stats(timeline.wins, timeline.fifths)
 
-        total_stats = get_stats(valid_records)
-        seven_day_stats = get_stats(seven_day_records)
-
-        detailed_recent_runs = []
-        count = self.client.config.getint("APP", "ROGUE_RECENT_RUNS_COUNT")
-        for record in all_records[:count]:
-            ending_str, is_rolling = self._determine_ending(record, theme_config)
-
-            squad_name_full = record.get(keys["squad"][0], {}).get(keys["squad"][1], "N/A")
-            squad_alias = self.alias_service.get_squad_alias(squad_name_full)
-
-            start_ts = int(record.get(keys["start_timestamp"], 0))
-            end_ts = int(record.get(keys["end_timestamp"], 0))
-
-            totem_list = record.get(keys["totem_list"], [])
-            totem_count = sum(
-                item.get('count', 0) for item in totem_list
-                if item.get('id') == analysis_rules["primary_totem_id"]
-            )
-
-            detailed_recent_runs.append({
-                "difficulty": record.get(keys["difficulty"], "N/A"),
-                "squad": squad_alias,
-                "score": record.get(keys["score"], "N/A"),
-                "is_success": record.get(keys["success_status"]) == 1,
-                "ending": ending_str,
-                "is_rolling": is_rolling,
-                "start_date": datetime.fromtimestamp(start_ts).strftime('%m-%d'),
-                "duration_hours": f"{(end_ts - start_ts) / 3600:.1f}h" if start_ts and end_ts else "N/A",
-                "totem_count": totem_count,
-            })
+        detailed_recent_runs = [
+            self._describe_run(record, rules) for record in all_records[:self.recent_runs_count]
+        ]
 
         return {
             "player_info": raw_data.get("gameUserInfo", {}),
             "career_summary": raw_data.get("career", {}),
             "stats": {
-                "total_runs": len(valid_records),
+                "total_runs": total_runs,
                 "total_stats": total_stats,
-                "seven_day_runs": len(seven_day_records),
-                "seven_day_stats": seven_day_stats
+                "windows": window_stats
             },
             "theme_summary": {
                 "name": theme_name,
+                "run_count": aggregate["total_runs"] if aggregate else len(all_records),
                 "detailed_recent_runs": detailed_recent_runs
             }
         }
@@ -0,0 +1,107 @@
+"""In-process LRU cache of decoded runs and finished analyses.
+
+Entries are keyed by (uid, theme, data version, name). DataManager bumps a (uid, theme)'s data version
+after every write to it and calls invalidate(), so nothing is served once the runs under it have changed,
+and the stale entries are dropped at once instead of waiting to age out. A commit by another process
+changes every data version; the entries it made stale are left for eviction. Values that also depend on
+the clock, such as stats over the last 7 days, carry a time bucket in their name. A value computed while
+a write landed is returned but not stored. Least recently used entries are evicted once either the entry
+count or the estimated memory of all entries goes over its limit.
+"""
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_MAX_MEMORY_MB = 64
+
+# Containers longer than this are sized from a sample of their items.
+_SIZE_SAMPLE = 16
+
+
+def estimate_size(value: Any) -> int:
+    """Approximate deep size in bytes; long lists and dicts are extrapolated from their first items.
+
+    Dict keys, small ints, booleans and None are shared between records and not counted.
+    """
+    if value is None or isinstance(value, bool) or (isinstance(value, int) and -5 <= value <= 256):
+        return 0
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        sample = [estimate_size(v) for _, v in zip(range(_SIZE_SAMPLE), value.values())]
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        sample = [estimate_size(item) for _, item in zip(range(_SIZE_SAMPLE), value)]
+    else:
+        return size
+    return size + (sum(sample) * len(value) // len(sample) if sample else 0)
+
+
+class RunCache:
+    def __init__(self, version_of: Callable[[str, Optional[str]], Hashable], max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_memory_mb: float = DEFAULT_MAX_MEMORY_MB):
+        """`version_of(uid, theme)` is the current data version, normally DataManager.data_version."""
+        self.version_of = version_of
+        self.max_entries = max(0, max_entries)
+        self.max_bytes = int(max(0.0, max_memory_mb) * 2 ** 20)
+        self._entries: "OrderedDict[Tuple, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    @classmethod
+    def from_config(cls, version_of: Callable[[str, Optional[str]], Hashable], config) -> "RunCache":
+        if config is None:
+            return cls(version_of)
+        return cls(version_of, config.getint("CACHE", "MAX_ENTRIES", fallback=DEFAULT_MAX_ENTRIES),
+                   config.getfloat("CACHE", "MAX_MEMORY_MB", fallback=DEFAULT_MAX_MEMORY_MB))
+
+    def get_or_compute(self, uid: str, theme: Optional[str], name: Hashable, compute: Callable[[], Any]) -> Any:
+        """The cached value of `name` for the current data of (uid, theme), computing it on a miss.
+
+        Cached values are shared between callers and must not be modified.
+        """
+        version = self.version_of(uid, theme)
+        key = (uid, theme, version, name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[0]
+            self._stats["misses"] += 1
+
+        value = compute()
+        size = estimate_size(value)
+        with self._lock:
+            if self.version_of(uid, theme) != version or size > self.max_bytes or not self.max_entries:
+                return value
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._stats["evictions"] += 1
+        return value
+
+    def invalidate(self, uid: str, theme: Optional[str] = None):
+        """Drop every entry of (uid, theme); wired to DataManager writes."""
+        with self._lock:
+            stale = [key for key in self._entries if key[:2] == (uid, theme)]
+            for key in stale:
+                self._bytes -= self._entries.pop(key)[1]
+            self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {**self._stats, "entries": len(self._entries), "memory_mb": round(self._bytes / 2 ** 20, 2),
+                    "hit_rate": round(self._stats["hits"] / lookups, 3) if lookups else None}
@@ -0,0 +1,255 @@
+"""Streaming export of stored runs to Parquet, Arrow IPC, CSV or NDJSON.
+
+Runs are read from DataManager.iter_runs one chunk at a time and flattened into columns: scalar fields
+as they are, object fields such as `band` into `band_id`/`band_name`, lists of ids such as
+`gainRelicList` as string lists and lists of objects (totems, chars) as the list of their ids. Every field
+a stored run has is exported, including ones [API] RECORD_KEYS no longer keeps. A first pass over the runs
+settles the columns and their types, then each chunk is written out (one Parquet row group / Arrow record
+batch) before the next is decoded, so memory stays bounded by the chunk size whatever the history size. Parquet and Arrow need pyarrow; without it the
+export falls back to CSV. CSV joins list cells with `|`.
+"""
+import csv
+import json
+import logging
+import os
+import sys
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from src.metrics import metrics
+
+# pyarrow (and the NumPy it pulls in) is imported on first use, so importing this module stays cheap.
+pyarrow = None
+
+EXPORT_FORMATS = ("parquet", "arrow", "csv", "ndjson")
+DEFAULT_CHUNK_SIZE = 5000
+
+_EXTENSIONS = {".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow", ".ipc": "arrow",
+               ".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+_LEADING_COLUMNS = ("uid", "theme", "id")
+_LIST_SEPARATOR = "|"
+
+
+def _load_pyarrow() -> bool:
+    global pyarrow
+    if pyarrow is None:
+        try:
+            import pyarrow.ipc
+            import pyarrow.parquet
+        except ImportError:
+            return False
+        pyarrow = sys.modules["pyarrow"]
+    return True
+
+
+def resolve_format(path: str, requested: str = "auto") -> Tuple[str, str]:
+    """(format, path) to write: `auto` goes by the file extension; Parquet/Arrow fall back to CSV without pyarrow."""
+    requested = (requested or "auto").strip().lower()
+    if requested == "auto":
+        requested = _EXTENSIONS.get(os.path.splitext(path)[1].lower(), "ndjson")
+    if requested not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{requested}', expected one of {', '.join(EXPORT_FORMATS)} or auto")
+    if requested in ("parquet", "arrow") and not _load_pyarrow():
+        fallback = os.path.splitext(path)[0] + ".csv"
+        logging.warning(f"pyarrow is not installed, exporting CSV to {fallback} instead of {requested}.")
+        return "csv", fallback
+    return requested, path
+
+
+def flatten_run(run: Dict[str, Any], keys: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """One flat row per run with every field of `run`; the fields in `keys` come first, in that order."""
+    row = {}
+    for key in dict.fromkeys([*keys, *run]) if keys is not None else run:
+        if key not in run:
+            continue
+        value = run[key]
+        if isinstance(value, dict):
+            for sub_key, sub_value in value.items():
+                if not isinstance(sub_value, (dict, list)):
+                    row[f"{key}_{sub_key}"] = sub_value
+        elif isinstance(value, list):
+            row[key] = [item.get("id") for item in value] if value and isinstance(value[0], dict) else value
+        else:
+            row[key] = value
+    return row
+
+
+class _Writer:
+    def __init__(self, path: str, columns: List[str], kinds: Dict[str, str]):
+        self.path, self.columns, self.kinds = path, columns, kinds
+
+    def write(self, rows: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class _ArrowWriter(_Writer):
+    _TYPES = {"int": "int64", "float": "float64", "bool": "bool_", "str": "string"}
+
+    def __init__(self, path: str, columns: List[str], kinds: Dict[str, str], output_format: str):
+        super().__init__(path, columns, kinds)
+        _load_pyarrow()
+        self.schema = pyarrow.schema([
+            (column, pyarrow.list_(pyarrow.string()) if kinds[column] == "list"
+             else getattr(pyarrow, self._TYPES[kinds[column]])())
+            for column in columns
+        ])
+        if output_format == "parquet":
+            self._writer = pyarrow.parquet.ParquetWriter(path, self.schema, compression="zstd")
+            self._write = lambda batch: self._writer.write_table(pyarrow.Table.from_batches([batch]))
+        else:
+            self._writer = pyarrow.ipc.new_file(path, self.schema)
+            self._write = self._writer.write_batch
+
+    def write(self, rows: List[Dict[str, Any]]):
+        arrays = []
+        for field in self.schema:
+            values = [row.get(field.name) for row in rows]
+            try:
+                arrays.append(pyarrow.array(values, field.type))
+            except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+                # Only columns whose values disagree with the first chunk's type pay for conversion.
+                coerce = _coercer(self.kinds[field.name])
+                arrays.append(pyarrow.array([coerce(value) for value in values], field.type))
+        self._write(pyarrow.RecordBatch.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self._writer.close()
+
+
+class _CsvWriter(_Writer):
+    def __init__(self, path: str, columns: List[str], kinds: Dict[str, str]):
+        super().__init__(path, columns, kinds)
+        self._file = open(path, "w", encoding="utf-8", newline="")
+        self._writer = csv.DictWriter(self._file, columns, extrasaction="ignore")
+        self._writer.writeheader()
+        self._lists = [column for column in columns if kinds[column] == "list"]
+
+    def write(self, rows: List[Dict[str, Any]]):
+        for row in rows:
+            for column in self._lists:
+                if row.get(column) is not None:
+                    row[column] = _LIST_SEPARATOR.join(str(item) for item in row[column] if item is not None)
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+class _NdjsonWriter(_Writer):
+    def __init__(self, path: str, columns: List[str], kinds: Dict[str, str]):
+        super().__init__(path, columns, kinds)
+        self._file = open(path, "w", encoding="utf-8")
+
+    def write(self, rows: List[Dict[str, Any]]):
+        self._file.writelines(
+            json.dumps({column: row.get(column) for column in self.columns}, ensure_ascii=False) + "\n"
+            for row in rows
+        )
+
+    def close(self):
+        self._file.close()
+
+
+def _observe_kinds(seen: Dict[str, set], rows: List[Dict[str, Any]]):
+    """Add the value types of each column in `rows` to `seen`."""
+    for row in rows:
+        for column, value in row.items():
+            kinds = seen.get(column)
+            if kinds is None:
+                kinds = seen[column] = set()
+            if value is not None:
+                kinds.add("list" if isinstance(value, list) else type(value).__name__)
+
+
+def _column_kinds(seen: Dict[str, set]) -> Dict[str, str]:
+    """One type per observed column; a column that is only ever null is exported as text."""
+    result = {}
+    for column, kinds in seen.items():
+        if "list" in kinds:
+            result[column] = "list"
+        elif kinds - {"int", "float", "bool"}:
+            result[column] = "str"
+        elif "float" in kinds:
+            result[column] = "float"
+        elif "int" in kinds:
+            result[column] = "int"
+        else:
+            result[column] = "bool" if kinds else "str"
+    return result
+
+
+def _coercer(kind: str) -> Callable[[Any], Any]:
+    if kind == "list":
+        return lambda value: [None if item is None else str(item) for item in value] \
+            if isinstance(value, list) else None
+    if kind == "str":
+        return lambda value: value if value is None or isinstance(value, str) else str(value)
+    if kind == "float":
+        return lambda value: None if value is None else float(value)
+    if kind == "int":
+        return lambda value: None if value is None else int(value)
+    return lambda value: None if value is None else bool(value)
+
+
+class RunExporter:
+    def __init__(self, data_manager, record_keys: Optional[List[str]] = None, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.data_manager = data_manager
+        self.record_keys = record_keys
+        self.chunk_size = max(1, chunk_size)
+
+    @classmethod
+    def from_config(cls, data_manager, config, record_keys: Optional[List[str]] = None) -> "RunExporter":
+        chunk_size = config.getint("EXPORT", "CHUNK_SIZE", fallback=DEFAULT_CHUNK_SIZE) if config else DEFAULT_CHUNK_SIZE
+        return cls(data_manager, record_keys, chunk_size)
+
+    def export(self, path: str, output_format: str = "auto", uids: Optional[List[str]] = None,
+               themes: Optional[List[str]] = None) -> Tuple[str, int]:
+        """Write the selected runs to `path`; returns (path written, runs exported).
+
+        The file is written next to `path` and moved into place once complete. Runs stored after the first
+        pass has read them are written with the columns it found.
+        """
+        output_format, path = resolve_format(path, output_format)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        partial = path + ".partial"
+        writer, exported = None, 0
+        with metrics.span("export", format=output_format) as span:
+            try:
+                seen: Dict[str, set] = {}
+                for rows in self._chunks(uids, themes):
+                    _observe_kinds(seen, rows)
+                writer = self._open(partial, output_format, _column_kinds(seen))
+                for rows in self._chunks(uids, themes):
+                    writer.write(rows)
+                    exported += len(rows)
+                writer.close()
+                os.replace(partial, path)
+            except BaseException:
+                if writer is not None:
+                    try:
+                        writer.close()
+                    except Exception:
+                        pass
+                if os.path.exists(partial):
+                    os.remove(partial)
+                raise
+            span.set(rows=exported, bytes=os.path.getsize(path))
+        logging.info(f"Exported {exported} runs as {output_format} to {path}.")
+        return path, exported
+
+    def _chunks(self, uids: Optional[List[str]], themes: Optional[List[str]]) -> Iterable[List[Dict[str, Any]]]:
+        for batch in self.data_manager.iter_runs(uids, themes, self.chunk_size):
+            yield [{"uid": uid, "theme": theme, "id": run.get("id"), **flatten_run(run, self.record_keys)}
+                   for uid, theme, run in batch]
+
+    def _open(self, path: str, output_format: str, kinds: Dict[str, str]) -> _Writer:
+        for column in _LEADING_COLUMNS:
+            kinds.setdefault(column, "str")
+        columns = list(_LEADING_COLUMNS) + [column for column in kinds if column not in _LEADING_COLUMNS]
+        if output_format in ("parquet", "arrow"):
+            return _ArrowWriter(path, columns, kinds, output_format)
+        if output_format == "csv":
+            return _CsvWriter(path, columns, kinds)
+        return _NdjsonWriter(path, columns, kinds)
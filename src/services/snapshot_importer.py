@@ -0,0 +1,200 @@
+"""Bulk import of archived rogue API responses (see docs/api/rogue_api_structure.md).
+
+Snapshot files (`*.json`, optionally gzipped) are parsed and trimmed to the stored record keys on a
+process pool, a bounded number at a time and in file order. The main process routes each run to its
+theme, keeps only the newest copy of each run id across files and merges runs into the database in
+large batches, one transaction per (uid, theme) per batch, with aggregates rebuilt once at the end.
+Files whose runs have been committed are recorded in rogue_snapshot_imports, so an interrupted import
+picks up where it stopped; a file that changed since (size or mtime) is imported again.
+
+Responses carry no UID: it is taken from the `uid` argument, or else from the top-level directory the
+file is in when that name is all digits (`snapshots/12345678/2024/01-01.json`).
+"""
+import gzip
+import json
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from src.api.rogue_parser import select_rogue_fields
+from src.metrics import metrics
+
+SNAPSHOT_SUFFIXES = (".json", ".json.gz")
+DEFAULT_BATCH_SIZE = 20000
+
+
+class ImportProgress(NamedTuple):
+    files_done: int
+    files_total: int
+    runs_read: int
+    runs_merged: int
+    failed: int
+    elapsed: float
+
+
+class ImportResult(NamedTuple):
+    files: int
+    skipped_files: int
+    failed_files: int
+    runs_read: int
+    unique_runs: int
+    inserted: int
+    updated: int
+
+
+def parse_snapshot(path: str, record_keys: Optional[List[str]]) -> Tuple[Optional[float], Optional[Dict[str, Any]],
+                                                                         Optional[str]]:
+    """(snapshot time, trimmed data object, error) for one file; runs in the worker processes."""
+    try:
+        with (gzip.open if path.endswith(".gz") else open)(path, "rb") as fp:
+            body = json.load(fp)
+        if not isinstance(body, dict):
+            return None, None, "not a JSON object"
+        if "data" not in body and "history" in body:
+            body = {"code": 0, "data": body}  # the data object saved on its own
+        if body.get("code") != 0 or not isinstance(body.get("data"), dict):
+            return None, None, f"response code {body.get('code')}: {body.get('message')}"
+        timestamp = float(body.get("timestamp") or os.path.getmtime(path))
+        return timestamp, select_rogue_fields(body, record_keys)["data"], None
+    except (OSError, ValueError, EOFError) as e:
+        return None, None, str(e)
+
+
+def find_snapshots(root: str) -> List[str]:
+    if os.path.isfile(root):
+        return [os.path.abspath(root)]
+    paths = []
+    for directory, _, files in os.walk(root):
+        paths += [os.path.join(directory, name) for name in files if name.lower().endswith(SNAPSHOT_SUFFIXES)]
+    return sorted(os.path.abspath(path) for path in paths)
+
+
+def _uid_from_path(path: str, root: str) -> Optional[str]:
+    parts = os.path.relpath(path, root).split(os.sep)
+    return parts[0] if len(parts) > 1 and parts[0].isdigit() else None
+
+
+class SnapshotImporter:
+    def __init__(self, rogue_service, workers: int = 0, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.service = rogue_service
+        self.db = rogue_service.db_manager
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.batch_size = max(1, batch_size)
+
+    @classmethod
+    def from_config(cls, rogue_service, config) -> "SnapshotImporter":
+        if config is None:
+            return cls(rogue_service)
+        return cls(rogue_service, config.getint("IMPORT", "WORKERS", fallback=0),
+                   config.getint("IMPORT", "BATCH_SIZE", fallback=DEFAULT_BATCH_SIZE))
+
+    def _parse_all(self, paths: List[str]):
+        """Yield (path, parse_snapshot result) in file order, keeping at most a few files per worker in flight."""
+        record_keys = self.service.record_keys
+        if self.workers == 1:
+            for path in paths:
+                yield path, parse_snapshot(path, record_keys)
+            return
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque()
+            remaining = iter(paths)
+            for path in remaining:
+                pending.append((path, executor.submit(parse_snapshot, path, record_keys)))
+                if len(pending) >= self.workers * 4:
+                    break
+            while pending:
+                path, future = pending.popleft()
+                next_path = next(remaining, None)
+                if next_path is not None:
+                    pending.append((next_path, executor.submit(parse_snapshot, next_path, record_keys)))
+                yield path, future.result()
+
+    def run(self, root: str, uid: Optional[str] = None, restart: bool = False,
+            progress: Optional[Callable[[ImportProgress], None]] = None) -> ImportResult:
+        started = time.perf_counter()
+        root = os.path.abspath(root)
+        paths = find_snapshots(root)
+        done = {} if restart else self.db.get_imported_snapshots()
+        stats = {path: os.stat(path) for path in paths}
+        todo = [path for path in paths if done.get(path) != (stats[path].st_size, stats[path].st_mtime_ns)]
+        logging.info(f"Importing {len(todo)} of {len(paths)} snapshot files from {root} "
+                     f"with {self.workers} worker(s).")
+
+        newest: Dict[str, float] = {}  # run id -> time of the snapshot its buffered/merged copy came from
+        buffer: Dict[str, Tuple[str, str, Dict[str, Any]]] = {}  # run id -> (uid, theme, record)
+        pending_files: List[Tuple[str, int, int, str, int]] = []
+        profiles: Dict[str, Dict[str, Any]] = {}
+        touched: Dict[str, set] = {}
+        totals = {"files": 0, "failed": 0, "read": 0, "inserted": 0, "updated": 0}
+
+        def report():
+            if progress:
+                progress(ImportProgress(index, len(todo), totals["read"], totals["inserted"] + totals["updated"],
+                                        totals["failed"], time.perf_counter() - started))
+
+        def flush():
+            groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+            for run_uid, theme, record in buffer.values():
+                groups.setdefault((run_uid, theme), []).append(record)
+            for (run_uid, theme), runs in groups.items():
+                result = self.db.merge_and_save_runs(run_uid, theme, runs,
+                                                     rules=self.service.theme_rules[theme], defer_aggregate=True)
+                totals["inserted"] += result.inserted
+                totals["updated"] += result.updated
+                if result.changed:
+                    touched.setdefault(theme, set()).add(run_uid)
+            for profile_uid, profile in profiles.items():
+                self.db.save_profile(profile_uid, profile)
+            profiles.clear()
+            self.db.mark_snapshots_imported(pending_files)
+            buffer.clear()
+            pending_files.clear()
+
+        # Profiles that existed before the import come from a live fetch and are newer than any archive.
+        live_profiles = {path_uid for path_uid in {uid} | {_uid_from_path(path, root) for path in todo}
+                         if path_uid and self.db.get_profile(path_uid)}
+        profile_times: Dict[str, float] = {}
+
+        index = 0
+        with metrics.span("import", files=len(todo)) as span:
+            for index, (path, (timestamp, data, error)) in enumerate(self._parse_all(todo), 1):
+                path_uid = uid or _uid_from_path(path, root)
+                if error or not path_uid:
+                    totals["failed"] += 1
+                    logging.error(f"Skipping snapshot {path}: {error or 'no uid (pass one or use a numeric directory)'}")
+                else:
+                    totals["files"] += 1
+                    file_runs = 0
+                    for theme, records in self.service.route_records(data).items():
+                        for record in records:
+                            run_id = record.get("id")
+                            file_runs += 1
+                            if not run_id or newest.get(run_id, float("-inf")) >= timestamp:
+                                continue
+                            newest[run_id] = timestamp
+                            buffer[run_id] = (path_uid, theme, record)
+                    totals["read"] += file_runs
+                    if path_uid not in live_profiles and timestamp > profile_times.get(path_uid, float("-inf")):
+                        profile_times[path_uid] = timestamp
+                        profiles[path_uid] = self.service.profile_from(data)
+                    pending_files.append((path, stats[path].st_size, stats[path].st_mtime_ns, path_uid, file_runs))
+                if len(buffer) >= self.batch_size:
+                    flush()
+                if index < len(todo):
+                    report()
+            # The last file's progress is reported once its runs are merged.
+            flush()
+            report()
+            for theme, uids in touched.items():
+                self.service.rebuild_aggregates(theme, sorted(uids))
+            span.set(runs=totals["read"], unique=len(newest), inserted=totals["inserted"])
+
+        result = ImportResult(totals["files"], len(paths) - len(todo), totals["failed"], totals["read"],
+                              len(newest), totals["inserted"], totals["updated"])
+        logging.info(f"Imported {result.files} snapshot files in {time.perf_counter() - started:.1f}s: "
+                     f"{result.runs_read} runs read, {result.unique_runs} unique, {result.inserted} inserted, "
+                     f"{result.updated} updated, {result.failed_files} failed, {result.skipped_files} already imported.")
+        return result
@@ -0,0 +1,93 @@
+import logging
+from typing import Dict, Any, List, Sequence, NamedTuple, Tuple
+
+# NumPy is imported on first use so the default backend (and the headless CLI) never pays its import cost.
+np = None
+
+
+def _load_numpy() -> bool:
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            return False
+        np = numpy
+    return True
+
+
+class Timeline(NamedTuple):
+    """Outcome columns of valid runs, oldest first."""
+    start_ts: Sequence[int]
+    wins: Sequence[bool]
+    fifths: Sequence[bool]
+
+
+def format_stats(total: int, wins: int, max_streak: int, fifth_wins: int, max_fifth_streak: int) -> Dict[str, Any]:
+    if not total:
+        return {"win_rate": "0.00%", "max_streak": 0, "fifth_rate": "0.00%", "max_fifth_streak": 0}
+    return {
+        "win_rate": f"{(wins / total) * 100:.2f}%", "max_streak": max_streak,
+        "fifth_rate": f"{(fifth_wins / total) * 100:.2f}%", "max_fifth_streak": max_fifth_streak
+    }
+
+
+class PythonStatsEngine:
+    name = "python"
+
+    @staticmethod
+    def _calculate_max_streak(records_bool_list: Sequence[bool]) -> int:
+        max_streak, current_streak = 0, 0
+        for is_win in records_bool_list:
+            if is_win:
+                current_streak += 1
+            else:
+                max_streak = max(max_streak, current_streak)
+                current_streak = 0
+        return max(max_streak, current_streak)
+
+    def compute_stats(self, win_bools: Sequence[bool], fifth_win_bools: Sequence[bool]) -> Dict[str, Any]:
+        return format_stats(
+            len(win_bools), sum(win_bools), self._calculate_max_streak(win_bools),
+            sum(fifth_win_bools), self._calculate_max_streak(fifth_win_bools)
+        )
+
+    def window_stats(self, timeline: Timeline, ranges: Sequence[Tuple[int, int]]) -> List[Dict[str, Any]]:
+        """Stats of each [lo, hi) slice of the timeline."""
+        return [self.compute_stats(timeline.wins[lo:hi], timeline.fifths[lo:hi]) for lo, hi in ranges]
+
+
+class NumpyStatsEngine(PythonStatsEngine):
+    name = "numpy"
+
+    @staticmethod
+    def _calculate_max_streak(records_bool_list) -> int:
+        bools = np.asarray(records_bool_list, dtype=bool)
+        if not bools.any():
+            return 0
+        # Run-length encode: +1/-1 edges of the zero-padded sequence mark where each streak starts/ends.
+        edges = np.diff(np.concatenate(([0], bools.view(np.int8), [0])))
+        return int((np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)).max())
+
+    def compute_stats(self, win_bools, fifth_win_bools) -> Dict[str, Any]:
+        wins = np.asarray(win_bools, dtype=bool)
+        fifths = np.asarray(fifth_win_bools, dtype=bool)
+        return format_stats(
+            len(wins), int(wins.sum()), self._calculate_max_streak(wins),
+            int(fifths.sum()), self._calculate_max_streak(fifths)
+        )
+
+    def window_stats(self, timeline: Timeline, ranges: Sequence[Tuple[int, int]]) -> List[Dict[str, Any]]:
+        wins = np.asarray(timeline.wins, dtype=bool)
+        fifths = np.asarray(timeline.fifths, dtype=bool)
+        return [self.compute_stats(wins[lo:hi], fifths[lo:hi]) for lo, hi in ranges]
+
+
+def create_stats_engine(backend: str = "python") -> PythonStatsEngine:
+    if backend == "numpy":
+        if _load_numpy():
+            return NumpyStatsEngine()
+        logging.warning("STATS_BACKEND is 'numpy' but NumPy is not installed, falling back to the Python backend.")
+    elif backend != "python":
+        logging.warning(f"Unknown STATS_BACKEND '{backend}', falling back to the Python backend.")
+    return PythonStatsEngine()
@@ -0,0 +1,103 @@
+import json
+import hashlib
+from typing import Dict, Any, Iterable, Optional
+
+
+class CompiledThemeRules:
+    """A theme's entry in rogue_theme_config.json compiled into relic bit masks.
+
+    Every relic referenced by the ending rules is interned to one bit, so a run's relics collapse into a
+    single integer and ending / fifth-ending checks become bitwise tests.
+    """
+
+    def __init__(self, theme_name: str, theme_config: Dict[str, Any]):
+        self.theme_name = theme_name
+        self.config = theme_config
+        self.keys = theme_config["keys"]
+        self.rules_hash = hashlib.md5(json.dumps(theme_config, sort_keys=True).encode('utf-8')).hexdigest()
+
+        rules = theme_config["ending_rules"]
+        self.relic_bits: Dict[str, int] = {}
+        self.rolling_mask = self._intern(rules["is_rolling_relic"])
+
+        ending_2_rule = next((ending for ending in rules["endings"] if ending["name"] == "2"), None)
+        self.ending_2_mask = self._intern(ending_2_rule["relic"]) if ending_2_rule else 0
+        self.other_ending_masks = sorted(
+            (ending["name"], self._intern(ending["relic"])) for ending in rules["endings"] if ending["name"] != "2"
+        )
+        self.companion_masks = [
+            (companion["name"], self._intern(companion["relic"])) for companion in rules.get("ending_5_companions", [])
+        ]
+        self.default_win_ending = rules["default_win_ending"]
+        self.text_templates = rules["text_templates"]
+
+        self.min_score = theme_config["analysis_rules"]["min_score_for_valid"]
+        self.fifth_relic = self._find_fifth_relic(theme_config)
+        self.fifth_mask = self._intern(self.fifth_relic) if self.fifth_relic else 0
+
+        # Ending text only depends on the masked relic bits, so each combination is formatted once.
+        self._success_endings: Dict[int, tuple[str, bool]] = {}
+
+    def _intern(self, relic_id: str) -> int:
+        if relic_id not in self.relic_bits:
+            self.relic_bits[relic_id] = 1 << len(self.relic_bits)
+        return self.relic_bits[relic_id]
+
+    @staticmethod
+    def _find_fifth_relic(theme_config: Dict[str, Any]) -> Optional[str]:
+        rule = theme_config["stats_definitions"]["fifth_ending"]["rule"]
+        if rule["type"] != "is_win_and_has_ending":
+            return None
+        ending_rule = next((e for e in theme_config["ending_rules"]["endings"] if e["name"] == rule["ending_name"]), None)
+        return ending_rule["relic"] if ending_rule else None
+
+    def relic_mask(self, relics: Optional[Iterable[str]]) -> int:
+        relic_bits = self.relic_bits
+        mask = 0
+        for relic in relics or ():
+            mask |= relic_bits.get(relic, 0)
+        return mask
+
+    def record_mask(self, record: Dict[str, Any]) -> int:
+        return self.relic_mask(record.get(self.keys["relic_list"]))
+
+    def classify(self, score: Optional[int], success: Optional[int], relic_mask: int) -> tuple[bool, bool, bool]:
+        is_win = success == 1
+        return (score or 0) > self.min_score, is_win, is_win and bool(relic_mask & self.fifth_mask)
+
+    def classify_record(self, record: Dict[str, Any]) -> tuple[bool, bool, bool]:
+        return self.classify(
+            record.get(self.keys["score"], 0), record.get(self.keys["success_status"]), self.record_mask(record)
+        )
+
+    def deepest_ending(self, relic_mask: int, is_win: bool) -> Optional[str]:
+        """Name of the deepest ending a win reached, None for a failure."""
+        if not is_win:
+            return None
+        for name, mask in reversed(self.other_ending_masks):
+            if relic_mask & mask:
+                return name
+        return "2" if relic_mask & self.ending_2_mask else self.default_win_ending
+
+    def determine_ending(self, relic_mask: int, is_success: bool, last_stage: str) -> tuple[str, bool]:
+        is_rolling = bool(relic_mask & self.rolling_mask)
+        if not is_success:
+            template = self.text_templates["failure_rolling" if is_rolling else "failure"]
+            return template.format(last_stage=last_stage), is_rolling
+
+        if relic_mask not in self._success_endings:
+            self._success_endings[relic_mask] = (self._format_success(relic_mask, is_rolling), is_rolling)
+        return self._success_endings[relic_mask]
+
+    def _format_success(self, relic_mask: int, is_rolling: bool) -> str:
+        final_endings = ["2" if relic_mask & self.ending_2_mask else self.default_win_ending]
+        final_endings.extend(name for name, mask in self.other_ending_masks if relic_mask & mask)
+        ending_str = "".join(final_endings)
+
+        if "5" in final_endings:
+            companion = next((name for name, mask in self.companion_masks if relic_mask & mask), None)
+            if companion:
+                ending_str += f" {companion}"
+
+        template = self.text_templates["success_rolling" if is_rolling else "success"]
+        return template.format(endings=ending_str)
@@ -0,0 +1,135 @@
+"""Statistics windows over a player's run timeline.
+
+A window is the last N days (`7d`), the last N valid runs (`last50`), a date range
+(`2024-01-01..2024-03-31`, end date inclusive), a season from [SEASONS] (`season:NAME`, or `season` for the
+current one) or `all`. Windows are located on the oldest-first start_ts column with bisect, so any number of
+them costs one timeline query plus a stats pass over each slice.
+"""
+import re
+import time
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+DEFAULT_WINDOWS = "7d, 30d"
+# Stats of windows relative to now are reused for at most this long before their edges move forward.
+TIME_BUCKET_SECONDS = 60
+
+_DAYS = re.compile(r"^(\d+)d$")
+_LAST = re.compile(r"^last(\d+)$")
+_DATE_FORMAT = "%Y-%m-%d"
+
+
+class Window(NamedTuple):
+    key: str
+    label: str
+    days: Optional[int] = None
+    last_runs: Optional[int] = None
+    since_ts: Optional[float] = None
+    until_ts: Optional[float] = None
+
+    def bounds(self, now: float) -> Tuple[Optional[float], Optional[float]]:
+        """[since, until) in epoch seconds; None is unbounded. Last-N windows are bounded by count instead."""
+        if self.days is not None:
+            return now - self.days * 86400, None
+        return self.since_ts, self.until_ts
+
+
+def _parse_date_range(text: str) -> Tuple[float, float]:
+    start, _, end = (part.strip() for part in text.partition(".."))
+    try:
+        since = datetime.strptime(start, _DATE_FORMAT)
+        until = datetime.strptime(end, _DATE_FORMAT) + timedelta(days=1)
+    except ValueError:
+        raise ValueError(f"Invalid date range '{text}', expected YYYY-MM-DD..YYYY-MM-DD")
+    if until <= since:
+        raise ValueError(f"Date range '{text}' ends before it starts")
+    return since.timestamp(), until.timestamp()
+
+
+def load_seasons(config) -> Dict[str, Tuple[float, float]]:
+    """[SEASONS] entries `name = YYYY-MM-DD..YYYY-MM-DD`, in file order."""
+    if config is None or not config.has_section("SEASONS"):
+        return {}
+    return {name: _parse_date_range(value) for name, value in config.items("SEASONS")}
+
+
+def parse_window(spec: str, seasons: Optional[Dict[str, Tuple[float, float]]] = None,
+                 now: Optional[float] = None) -> Window:
+    spec = spec.strip()
+    seasons = seasons or {}
+    if spec == "all":
+        return Window(spec, "全部")
+    if match := _DAYS.match(spec):
+        days = int(match.group(1))
+        if days > 0:
+            return Window(spec, f"近{days}日", days=days)
+    elif match := _LAST.match(spec):
+        count = int(match.group(1))
+        if count > 0:
+            return Window(spec, f"近{count}场", last_runs=count)
+    elif ".." in spec:
+        since_ts, until_ts = _parse_date_range(spec)
+        start, _, end = (part.strip() for part in spec.partition(".."))
+        return Window(spec, f"{start}~{end}", since_ts=since_ts, until_ts=until_ts)
+    elif spec == "season" or spec.startswith("season:"):
+        name = spec.partition(":")[2].strip()
+        if not name:
+            now = time.time() if now is None else now
+            name = next((season for season, (since, _) in reversed(seasons.items()) if since <= now), "")
+            if not name:
+                raise ValueError("No season in [SEASONS] has started yet")
+        # configparser lower-cases option names.
+        name = name if name in seasons else name.lower()
+        if name not in seasons:
+            raise ValueError(f"Unknown season '{spec.partition(':')[2].strip()}'")
+        since_ts, until_ts = seasons[name]
+        return Window(f"season:{name}", name, since_ts=since_ts, until_ts=until_ts)
+    raise ValueError(f"Invalid window '{spec}', expected e.g. 7d, last50, 2024-01-01..2024-03-31, season:NAME or all")
+
+
+def parse_windows(specs: Iterable[str], seasons: Optional[Dict[str, Tuple[float, float]]] = None) -> List[Window]:
+    """Parse window specs (each may itself be comma separated), dropping duplicates."""
+    windows: Dict[str, Window] = {}
+    for spec in specs:
+        for part in spec.split(","):
+            if part.strip():
+                window = parse_window(part, seasons)
+                windows.setdefault(window.key, window)
+    return list(windows.values())
+
+
+def time_bucket(windows: Sequence[Window], now: Optional[float] = None) -> Optional[int]:
+    """Cache key part for stats of `windows`: `now` in TIME_BUCKET_SECONDS steps, or None if none is relative."""
+    if not any(window.days is not None for window in windows):
+        return None
+    return int((time.time() if now is None else now) // TIME_BUCKET_SECONDS)
+
+
+def timeline_lower_bound(windows: Sequence[Window], now: float,
+                         last_run_starts: Dict[int, Optional[float]]) -> Optional[float]:
+    """Oldest start_ts any window needs, or None when one of them needs the whole history.
+
+    `last_run_starts` maps each last-N count to the start_ts of the N-th most recent valid run (None when
+    there are fewer than N).
+    """
+    bounds = []
+    for window in windows:
+        since = last_run_starts.get(window.last_runs) if window.last_runs else window.bounds(now)[0]
+        if since is None:
+            return None
+        bounds.append(since)
+    return min(bounds) if bounds else None
+
+
+def locate(windows: Sequence[Window], start_ts: Sequence[float], now: float) -> List[Tuple[int, int]]:
+    """[lo, hi) index ranges of each window in the oldest-first `start_ts` column."""
+    ranges = []
+    for window in windows:
+        if window.last_runs:
+            ranges.append((max(0, len(start_ts) - window.last_runs), len(start_ts)))
+            continue
+        since, until = window.bounds(now)
+        ranges.append((0 if since is None else bisect_left(start_ts, since),
+                       len(start_ts) if until is None else bisect_left(start_ts, until)))
+    return ranges
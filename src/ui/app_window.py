@@ -34,7 +34,7 @@ class AppWindow(tk.Tk):
         runs_area_frame.columnconfigure(0, weight=1)
         runs_area_frame.rowconfigure(1, weight=1)
 
-        self.runs_header_label = ttk.Label(runs_area_frame, text=f"最近{self.config.getint('APP', 'ROGUE_RECENT_RUNS_COUNT')}场对局详情", style="Header.TLabel")
+        self.runs_header_label = ttk.Label(runs_area_frame, text="对局详情", style="Header.TLabel")
         self.runs_header_label.grid(row=0, column=0, sticky="nw", pady=(0, 5))
 
         self.runs_list = RunsListFrame(runs_area_frame, self.style_manager)
@@ -42,6 +42,9 @@ class AppWindow(tk.Tk):
 
         footer_frame = ttk.Frame(main_frame, style="TFrame")
         footer_frame.grid(row=3, column=0, sticky="ew", pady=(10, 0))
+        self.theme_var = tk.StringVar()
+        self.theme_selector = ttk.Combobox(footer_frame, textvariable=self.theme_var, state="readonly",
+                                           font=self.style_manager.get_font("normal"))
         self.refresh_button = ttk.Button(footer_frame, text="刷新")
         self.refresh_button.pack(pady=10)
         self.status_label = ttk.Label(footer_frame, text="准备就绪", font=self.style_manager.get_font("small"), anchor="center")
@@ -50,13 +53,22 @@ class AppWindow(tk.Tk):
     def set_refresh_command(self, command):
         self.refresh_button.config(command=command)
 
+    def set_theme_options(self, themes, current, command):
+        self.theme_selector.config(values=themes)
+        self.theme_var.set(current)
+        self.theme_selector.bind("<<ComboboxSelected>>", lambda e: command(self.theme_var.get()))
+        if len(themes) > 1:
+            self.theme_selector.pack(fill=tk.X, before=self.refresh_button)
+
+    def set_runs_count(self, count):
+        self.runs_header_label.config(text=f"全部对局详情 ({count}场)")
+
     def show_status(self, message, is_loading=False):
         self.status_label.config(text=message)
         self.refresh_button.config(state=tk.DISABLED if is_loading else tk.NORMAL)
 
     def show_error(self, message):
-        for child in [self.header, self.stats, self.runs_list]:
-            for widget in child.winfo_children():
-                 widget.destroy()
-
-        ttk.Label(self.header, text=message, style="Fail.TLabel", font=self.style_manager.get_font("large_bold")).pack(pady=20)
+        self.header.show_error(message)
+        self.stats.clear()
+        self.runs_list.update_content([])
+        self.runs_header_label.config(text="对局详情")
@@ -1,11 +1,25 @@
+import math
 import tkinter as tk
+from collections import OrderedDict
 from tkinter import ttk
 
 
+def set_label(label, text, style=None):
+    """Reconfigure a label only when its text or style actually changed."""
+    changes = {}
+    if str(label.cget("text")) != text:
+        changes["text"] = text
+    if style is not None and str(label.cget("style")) != style:
+        changes["style"] = style
+    if changes:
+        label.config(**changes)
+
+
 class HeaderFrame(ttk.Frame):
     def __init__(self, parent, style_manager, **kwargs):
         super().__init__(parent, style="TFrame", **kwargs)
         self.style_manager = style_manager
+        self._showing_error = False
         self._create_widgets()
 
     def _create_widgets(self):
@@ -15,12 +29,27 @@ class HeaderFrame(ttk.Frame):
         self.theme_label.pack()
         self.career_label = ttk.Label(self, font=self.style_manager.get_font("small"))
         self.career_label.pack(pady=(5, 0))
+        self.error_label = ttk.Label(self, style="Fail.TLabel", font=self.style_manager.get_font("large_bold"))
 
     def update_content(self, player_info, theme_name, career_summary):
-        self.player_label.config(text=f"{player_info.get('name', 'N/A')} (Lv.{player_info.get('level', 'N/A')})")
-        self.theme_label.config(text=theme_name or "")
+        if self._showing_error:
+            self.error_label.pack_forget()
+            self.player_label.pack()
+            self.theme_label.pack()
+            self.career_label.pack(pady=(5, 0))
+            self._showing_error = False
+        set_label(self.player_label, f"{player_info.get('name', 'N/A')} (Lv.{player_info.get('level', 'N/A')})")
+        set_label(self.theme_label, theme_name or "")
         summary_text = f"总投资: {career_summary.get('invest', 'N/A')} | 总节点: {career_summary.get('node', 'N/A')} | 总步数: {career_summary.get('step', 'N/A')}"
-        self.career_label.config(text=summary_text)
+        set_label(self.career_label, summary_text)
+
+    def show_error(self, message):
+        set_label(self.error_label, message)
+        if not self._showing_error:
+            for label in (self.player_label, self.theme_label, self.career_label):
+                label.pack_forget()
+            self.error_label.pack(pady=20)
+            self._showing_error = True
 
 
 class StatsFrame(ttk.Frame):
@@ -49,6 +78,28 @@ class StatsFrame(ttk.Frame):
         self.content_frame.pack(fill=tk.X)
         self.content_frame.columnconfigure(1, weight=1)
 
+        self.name_labels, self.value_labels = {}, {}
+        self._row_keys = ()
+        self._sync_rows(["total", "total_fifth"])
+
+    def _sync_rows(self, keys):
+        """Create, drop and re-grid label rows so they match `keys`; a no-op while the windows are unchanged."""
+        keys = tuple(keys)
+        if keys == self._row_keys:
+            return
+        for key in set(self._row_keys) - set(keys):
+            self.name_labels.pop(key).destroy()
+            self.value_labels.pop(key).destroy()
+        for row, key in enumerate(keys, start=1):
+            if key not in self.name_labels:
+                self.name_labels[key] = ttk.Label(self.content_frame)
+                self.value_labels[key] = ttk.Label(self.content_frame)
+            # Each window's pair of rows is set off from the one above it.
+            pady = (5, 0) if row > 2 and row % 2 == 1 else 0
+            self.name_labels[key].grid(row=row, column=0, sticky="w", pady=pady)
+            self.value_labels[key].grid(row=row, column=1, sticky="w", padx=10, pady=pady)
+        self._row_keys = keys
+
     def _bind_events(self):
         for widget in [self.header_frame, self.title_label, self.toggle_button]:
             widget.bind("<Button-1>", self.toggle_visibility)
@@ -65,104 +116,199 @@ class StatsFrame(ttk.Frame):
             self.toggle_button.config(text="▶")
 
     def update_content(self, stats_data):
-        for widget in self.content_frame.winfo_children():
-            widget.destroy()
-
-        self.title_label.config(text=f"战绩统计 (基于 {stats_data.get('total_runs', 0)} 场有效对局)")
+        total_runs = stats_data.get("total_runs", 0)
+        set_label(self.title_label, f"战绩统计 (基于 {total_runs} 场有效对局)")
 
         total_stats = stats_data.get("total_stats", {})
-        seven_day_stats = stats_data.get("seven_day_stats", {})
-
-        ttk.Label(self.content_frame, text=f"总胜率({stats_data.get('total_runs', 0)}场):").grid(row=1, column=0,
-                                                                                                 sticky="w")
-        ttk.Label(self.content_frame,
-                  text=f"{total_stats.get('win_rate', 'N/A')} (最高{total_stats.get('max_streak', 0)}连胜)").grid(row=1,
-                                                                                                                  column=1,
-                                                                                                                  sticky="w",
-                                                                                                                  padx=10)
-
-        ttk.Label(self.content_frame, text="总五结局:").grid(row=2, column=0, sticky="w")
-        ttk.Label(self.content_frame,
-                  text=f"{total_stats.get('fifth_rate', 'N/A')} (最高{total_stats.get('max_fifth_streak', 0)}连胜)").grid(
-            row=2, column=1, sticky="w", padx=10)
-
-        ttk.Label(self.content_frame, text=f"近7日({stats_data.get('seven_day_runs', 0)}场):").grid(row=3, column=0,
-                                                                                                    sticky="w",
-                                                                                                    pady=(5, 0))
-        ttk.Label(self.content_frame,
-                  text=f"{seven_day_stats.get('win_rate', 'N/A')} (最高{seven_day_stats.get('max_streak', 0)}连胜)").grid(
-            row=3, column=1, sticky="w", padx=10, pady=(5, 0))
-
-        ttk.Label(self.content_frame, text="近7日五结局:").grid(row=4, column=0, sticky="w")
-        ttk.Label(self.content_frame,
-                  text=f"{seven_day_stats.get('fifth_rate', 'N/A')} (最高{seven_day_stats.get('max_fifth_streak', 0)}连胜)").grid(
-            row=4, column=1, sticky="w", padx=10)
+        rows = [
+            ("total", f"总胜率({total_runs}场):", total_stats, "win_rate", "max_streak"),
+            ("total_fifth", "总五结局:", total_stats, "fifth_rate", "max_fifth_streak"),
+        ]
+        for key, window in stats_data.get("windows", {}).items():
+            rows += [
+                (f"window:{key}", f"{window['label']}({window['runs']}场):", window["stats"], "win_rate", "max_streak"),
+                (f"window:{key}:fifth", f"{window['label']}五结局:", window["stats"], "fifth_rate", "max_fifth_streak"),
+            ]
+        self._sync_rows(row[0] for row in rows)
+        for key, name, stats, rate_key, streak_key in rows:
+            set_label(self.name_labels[key], name)
+            set_label(self.value_labels[key], f"{stats.get(rate_key, 'N/A')} (最高{stats.get(streak_key, 0)}连胜)")
+
+    def clear(self):
+        set_label(self.title_label, "战绩统计")
+        for label in [*self.name_labels.values(), *self.value_labels.values()]:
+            set_label(label, "")
+
+
+class RunRow(ttk.Frame):
+    """One recyclable row of RunsListFrame; `show` rebinds it to another run by updating its labels in place."""
+
+    def __init__(self, parent, style_manager, **kwargs):
+        super().__init__(parent, style="TFrame", **kwargs)
+        self.columnconfigure(3, weight=1)
+        self._run = None
+        self._suffix_shown = False
+
+        time_frame = ttk.Frame(self)
+        time_frame.grid(row=0, column=0, sticky="ns", padx=(0, 10))
+        self.date_label = ttk.Label(time_frame, font=style_manager.get_font("normal"))
+        self.date_label.pack(anchor="w")
+        self.duration_label = ttk.Label(time_frame, font=style_manager.get_font("small"))
+        self.duration_label.pack(anchor="w")
+
+        self.difficulty_label = ttk.Label(self, style="Header.TLabel")
+        self.difficulty_label.grid(row=0, column=1, sticky="w", padx=(0, 10))
+        self.squad_label = ttk.Label(self, font=style_manager.get_font("normal"))
+        self.squad_label.grid(row=0, column=2, sticky="w", padx=(0, 10))
+
+        result_frame = ttk.Frame(self, style="TFrame")
+        result_frame.grid(row=0, column=3, sticky="e")
+        self.score_label = ttk.Label(result_frame, style="Success.TLabel")
+        self.score_label.pack(anchor="e")
+        ending_frame = ttk.Frame(result_frame, style="TFrame")
+        ending_frame.pack(anchor="e")
+        self.ending_label = ttk.Label(ending_frame, style="Ending.TLabel")
+        self.ending_label.pack(side=tk.LEFT)
+        self.rolling_suffix_label = ttk.Label(ending_frame, text=" (滚动)", style="Rolling.TLabel")
+
+    def show(self, run):
+        if run is self._run:
+            return
+        self._run = run
+
+        set_label(self.date_label, run.get("start_date", "N/A"))
+        set_label(self.duration_label, run.get("duration_hours", "N/A"))
+        set_label(self.difficulty_label, f"N{run.get('difficulty', '')}")
+        set_label(self.squad_label, run.get("squad", ""))
+        set_label(self.score_label, f"{run.get('score', 'N/A')}({run.get('totem_count', 0)}构)",
+                  "Success.TLabel" if run.get("is_success") else "Fail.TLabel")
+
+        ending_text = run.get("ending", "N/A")
+        split_suffix = bool(run.get("is_rolling") and not run.get("is_success"))
+        if split_suffix:
+            set_label(self.ending_label, ending_text.split(" (滚动)")[0], "Ending.TLabel")
+        else:
+            set_label(self.ending_label, ending_text, "Rolling.TLabel" if "滚动" in ending_text else "Ending.TLabel")
+        if split_suffix != self._suffix_shown:
+            if split_suffix:
+                self.rolling_suffix_label.pack(side=tk.LEFT)
+            else:
+                self.rolling_suffix_label.pack_forget()
+            self._suffix_shown = split_suffix
 
 
 class RunsListFrame(ttk.Frame):
+    """Virtualized run list.
+
+    Only enough RunRow widgets to fill the viewport are ever created; scrolling rebinds them to other runs.
+    Runs come from a `fetch_page(offset, limit)` source and only a few pages are kept in memory at a time.
+    """
+
+    PAGE_SIZE = 50
+    MAX_CACHED_PAGES = 6
+    ROW_SPACING = 15
+
     def __init__(self, parent, style_manager, **kwargs):
         super().__init__(parent, style="TFrame", **kwargs)
         self.style_manager = style_manager
         self.columnconfigure(0, weight=1)
         self.rowconfigure(0, weight=1)
 
-        canvas = tk.Canvas(self, bg=self.style_manager.theme["colors"]["bg"], highlightthickness=0)
-        scrollbar = ttk.Scrollbar(self, orient="vertical", command=canvas.yview, style="Vertical.TScrollbar")
-        self.scrollable_frame = ttk.Frame(canvas, style="TFrame")
-
-        self.scrollable_frame.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
-        canvas_frame_id = canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
-
-        canvas.bind("<Configure>", lambda e: canvas.itemconfig(canvas_frame_id, width=e.width))
-        canvas.bind_all("<MouseWheel>", lambda e: canvas.yview_scroll(int(-1 * (e.delta / 120)), "units"))
-
-        canvas.grid(row=0, column=0, sticky="nsew")
-        scrollbar.grid(row=0, column=1, sticky="ns")
-        self.scrollable_frame.columnconfigure(0, weight=1)
+        self.viewport = ttk.Frame(self, style="TFrame")
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar,
+                                       style="Vertical.TScrollbar")
+        self.viewport.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+
+        self._rows = []
+        self._row_height = None
+        self._viewport_height = 0
+        self._first = 0
+        self._total = 0
+        self._fetch_page = None
+        self._pages = OrderedDict()
+
+        self.viewport.bind("<Configure>", self._on_resize)
+        self.bind_all("<MouseWheel>", lambda e: self.scroll(-1 if e.delta > 0 else 1))
+        self.bind_all("<Button-4>", lambda e: self.scroll(-1))
+        self.bind_all("<Button-5>", lambda e: self.scroll(1))
 
     def update_content(self, runs):
-        for widget in self.scrollable_frame.winfo_children():
-            widget.destroy()
-
-        if not runs: return
-
-        for i, run in enumerate(runs):
-            run_frame = ttk.Frame(self.scrollable_frame, style="TFrame")
-            run_frame.grid(row=i, column=0, sticky="ew", pady=(0, 15))
-
-            run_frame.columnconfigure(3, weight=1)
-
-            time_frame = ttk.Frame(run_frame)
-            time_frame.grid(row=0, column=0, sticky="ns", padx=(0, 10))
-            ttk.Label(time_frame, text=run.get("start_date", "N/A"), font=self.style_manager.get_font("normal")).pack(
-                anchor="w")
-            ttk.Label(time_frame, text=run.get("duration_hours", "N/A"),
-                      font=self.style_manager.get_font("small")).pack(anchor="w")
-
-            ttk.Label(run_frame, text=f"N{run.get('difficulty', '')}", style="Header.TLabel").grid(row=0, column=1,
-                                                                                                   sticky="w",
-                                                                                                   padx=(0, 10))
-            ttk.Label(run_frame, text=run.get("squad", ""), font=self.style_manager.get_font("normal")).grid(row=0,
-                                                                                                             column=2,
-                                                                                                             sticky="w",
-                                                                                                             padx=(
-                                                                                                                 0, 10))
-
-            result_frame = ttk.Frame(run_frame, style="TFrame")
-            result_frame.grid(row=0, column=3, sticky="e")
-            score_style = "Success.TLabel" if run.get("is_success") else "Fail.TLabel"
-            ttk.Label(result_frame, text=f"{run.get('score', 'N/A')}({run.get('totem_count', 0)}构)",
-                      style=score_style).pack(anchor="e")
-
-            ending_text = run.get("ending", "N/A")
-
-            if run.get("is_rolling") and not run.get("is_success"):
-                parts = ending_text.split(" (滚动)")
-                ending_label_frame = ttk.Frame(result_frame, style="TFrame")
-                ending_label_frame.pack(anchor="e")
-                ttk.Label(ending_label_frame, text=parts[0], style="Ending.TLabel").pack(side=tk.LEFT)
-                ttk.Label(ending_label_frame, text=" (滚动)", style="Rolling.TLabel").pack(side=tk.LEFT)
-            else:
-                ending_style = "Rolling.TLabel" if "滚动" in ending_text else "Ending.TLabel"
-                ttk.Label(result_frame, text=ending_text, style=ending_style).pack(anchor="e")
+        runs = runs or []
+        self.set_source(len(runs), lambda offset, limit: runs[offset:offset + limit])
+
+    def set_source(self, total, fetch_page):
+        """Show `total` runs; `fetch_page(offset, limit)` returns described runs, newest first."""
+        self._total = total
+        self._fetch_page = fetch_page
+        self._pages.clear()
+        self._first = min(self._first, self._max_first())
+        self._render()
+
+    def scroll(self, rows):
+        self._scroll_to(self._first + rows)
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self._scroll_to(round(float(amount) * self._total))
+        elif action == "scroll":
+            step = self._visible_rows() if unit == "pages" else 1
+            self._scroll_to(self._first + int(amount) * step)
+
+    def _scroll_to(self, first):
+        first = max(0, min(first, self._max_first()))
+        if first != self._first:
+            self._first = first
+            self._render()
+
+    def _visible_rows(self):
+        if not self._row_height:
+            return 1
+        return max(1, self._viewport_height // self._row_height)
+
+    def _max_first(self):
+        return max(0, self._total - self._visible_rows())
+
+    def _measure_row_height(self, row):
+        row.show({})
+        row.update_idletasks()
+        self._row_height = max(row.winfo_reqheight(), 1) + self.ROW_SPACING
+
+    def _on_resize(self, event):
+        self._viewport_height = event.height
+        if not self._rows:
+            self._rows.append(RunRow(self.viewport, self.style_manager))
+            self._measure_row_height(self._rows[0])
+        needed = math.ceil(event.height / self._row_height)
+        while len(self._rows) < needed:
+            self._rows.append(RunRow(self.viewport, self.style_manager))
+        self._first = min(self._first, self._max_first())
+        self._render()
+
+    def _get_run(self, index):
+        page_index = index // self.PAGE_SIZE
+        page = self._pages.get(page_index)
+        if page is None:
+            page = self._fetch_page(page_index * self.PAGE_SIZE, self.PAGE_SIZE)
+            self._pages[page_index] = page
+            if len(self._pages) > self.MAX_CACHED_PAGES:
+                self._pages.popitem(last=False)
+        else:
+            self._pages.move_to_end(page_index)
+        offset = index % self.PAGE_SIZE
+        return page[offset] if offset < len(page) else None
+
+    def _render(self):
+        for i, row in enumerate(self._rows):
+            index = self._first + i
+            run = self._get_run(index) if index < self._total else None
+            if run is None:
+                row.place_forget()
+                continue
+            row.show(run)
+            row.place(x=0, y=i * self._row_height, relwidth=1, height=self._row_height - self.ROW_SPACING)
+
+        if self._total:
+            self.scrollbar.set(self._first / self._total, min(1.0, (self._first + self._visible_rows()) / self._total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
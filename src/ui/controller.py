@@ -1,35 +1,250 @@
-import threading
 import logging
+import time
+from contextlib import contextmanager
 from datetime import datetime
+from tkinter import messagebox
+from typing import Any, Dict, NamedTuple, Optional
+
+from ..metrics import metrics
+from ..services.refresh_scheduler import RefreshWorker, AdaptiveInterval
+
+
+class RefreshResult(NamedTuple):
+    analyses: Dict[str, Any]
+    changed: bool = False
+    last_run_end: Optional[int] = None
+    metrics_summary: Optional[str] = None
+    auth_failed: bool = False
+
 
 class UIController:
-    def __init__(self, app_window, rogue_service, theme):
+    def __init__(self, app_window, rogue_service, theme, hypergryph_token=None):
         self.app = app_window
         self.service = rogue_service
         self.theme = theme
+        self.hypergryph_token = hypergryph_token
+        self._analyses = {}
+        # Bumped whenever a refresh replaces _analyses, so slower theme-switch results know they are stale.
+        self._analyses_version = 0
+        self._showing_cached = False
+        self._metrics_summary = None
+        self._refresher = RefreshWorker(self._refresh_task, self._deliver_refresh, name="ui-refresh")
+        self._refresh_automatic = False
+        self._switcher = RefreshWorker(self._switch_task, self._deliver_switch, name="ui-theme-switch")
+        self._switch_request = None
+        self._auth_failures = 0
+        config = self.service.config
+        self.auto_refresh = bool(config) and config.getboolean("REFRESH", "AUTO_REFRESH", fallback=False)
+        self._interval = AdaptiveInterval.from_config(config) if config else AdaptiveInterval(60, 1800)
+        self._auto_refresh_job = None
         self.app.set_refresh_command(self.refresh_data)
+        self.app.set_theme_options(list(self.service.theme_rules), theme, self.switch_theme)
 
     def initial_load(self):
+        self._show_cached_analysis()
         self.app.after(100, self.refresh_data)
 
-    def refresh_data(self):
-        self.app.show_status("正在获取数据...", is_loading=True)
-        threading.Thread(target=self._fetch_data_thread, daemon=True).start()
+    def _show_cached_analysis(self):
+        started = time.perf_counter()
+        client = self.service.client
+        uid = client.uid or (client.peek_cached_uid(self.hypergryph_token) if self.hypergryph_token else None)
+        if not uid:
+            return
+        try:
+            data = self.service.get_cached_analysis(uid, self.theme)
+        except Exception as e:
+            logging.warning(f"Could not load cached analysis: {e}")
+            return
+        if data and "error" not in data:
+            self.update_ui(data)
+            self.app.show_status("显示本地数据")
+            self._showing_cached = True
+            logging.info(f"Rendered cached analysis in {time.perf_counter() - started:.3f}s.")
+
+    def refresh_data(self, automatic=False):
+        """Queue a refresh; one already queued or running absorbs the request instead of fetching again.
+
+        A manual refresh supersedes an automatic one in flight, which may have fetched before the click.
+        """
+        if not automatic and self._refresh_automatic and self._refresher.busy:
+            self._refresher.cancel()
+        if not self._refresher.request():
+            return
+        self._refresh_automatic = automatic
+        if not automatic:
+            status = "显示本地数据，正在后台更新..." if self._showing_cached else "正在获取数据..."
+            self.app.show_status(status, is_loading=True)
+
+    def _schedule_auto_refresh(self, seconds):
+        if self._auto_refresh_job is not None:
+            self.app.after_cancel(self._auto_refresh_job)
+            self._auto_refresh_job = None
+        if self.auto_refresh:
+            self._auto_refresh_job = self.app.after(int(seconds * 1000), self._auto_refresh_tick)
+            logging.info(f"Next automatic refresh in {seconds:.0f}s.")
+
+    def _auto_refresh_tick(self):
+        self._auto_refresh_job = None
+        self.refresh_data(automatic=True)
+
+    def stop(self):
+        self.auto_refresh = False
+        self._schedule_auto_refresh(0)
+        self._refresher.close()
+        self._switcher.close()
+
+    def _ensure_authenticated(self):
+        if self.service.client.uid:
+            return True
+        return bool(self.hypergryph_token) and self.service.client.authenticate(self.hypergryph_token)
+
+    def _on_auth_failed(self, retry_in=None):
+        logging.critical("认证失败，请检查你的Token。")
+        self._auth_failures += 1
+        retry = f"，{datetime.fromtimestamp(time.time() + retry_in).strftime('%H:%M:%S')} 自动重试" if retry_in else ""
+        if self._showing_cached:
+            self.app.show_status(f"认证失败，当前显示本地数据{retry}")
+        else:
+            self.app.show_error("认证失败")
+            self.app.show_status(f"获取失败{retry}")
+        if self._auth_failures == 1:
+            # Automatic retries that fail again only update the status line.
+            messagebox.showerror("认证失败", "无法通过您的Token进行认证。\n\n请检查.env文件中的HYPERGRYPH_TOKEN是否正确、有效。")
 
-    def _fetch_data_thread(self):
+    def switch_theme(self, theme):
+        self.theme = theme
+        # Whatever an earlier switch is still loading is no longer going to be shown.
+        self._switcher.cancel()
+        if theme in self._analyses:
+            self.update_ui(self._analyses[theme])
+            return
+        self.app.show_status("正在切换主题...", is_loading=True)
+        self._switch_request = (theme, self._analyses_version)
+        self._switcher.request()
+
+    def _switch_task(self, cancelled):
+        """Runs on the theme-switch worker thread."""
+        theme, version = self._switch_request
         try:
-            analysis_data = self.service.get_analysis_for_theme(self.theme)
-            self.app.after(0, self.update_ui, analysis_data)
+            return theme, self.service.get_analysis_for_theme(theme, use_cache=True), version
         except Exception as e:
-            logging.error(f"Error in data fetch thread: {e}")
-            self.app.after(0, self.update_ui, {"error": f"发生意外错误: {e}"})
+            logging.error(f"Error in theme switch thread: {e}")
+            return theme, {"error": f"发生意外错误: {e}"}, version
+
+    def _deliver_switch(self, generation, result, error):
+        self.app.after(0, self._on_switch_result, generation, *result)
+
+    def _on_switch_result(self, generation, theme, data, version):
+        if not self._switcher.is_current(generation):
+            return
+        if version != self._analyses_version and theme in self._analyses:
+            data = self._analyses[theme]  # a refresh finished in the meantime; its analysis is newer
+        elif data and "error" not in data:
+            self._analyses[theme] = data
+        if theme == self.theme:
+            self.update_ui(data)
+
+    def _refresh_task(self, cancelled):
+        """Runs on the refresh worker thread."""
+        with metrics.trace("refresh") as trace, self.service.client.deadline():
+            if not self._ensure_authenticated():
+                return RefreshResult({}, auth_failed=True)
+            analyses = self.service.analyze_all_themes(cancelled=cancelled)
+        logging.info(f"HTTP stats: {self.service.client.transport.stats()}")
+        if cancelled():
+            return None
+        return RefreshResult(
+            analyses, any(result.changed for result in self.service.last_merge_results.values()),
+            self.service.last_run_end(self.service.client.uid),
+            self._summarize_trace(trace) if metrics.show_in_status else None
+        )
+
+    def _deliver_refresh(self, generation, result, error):
+        self.app.after(0, self._on_refresh_done, generation, result, error)
+
+    def _on_refresh_done(self, generation, result, error):
+        if result is None and error is None or not self._refresher.is_current(generation):
+            return
+        if error is not None:
+            logging.error(f"Error in data fetch thread: {error}")
+            self.update_ui({"error": f"发生意外错误: {error}"})
+            self._schedule_auto_refresh(self._interval.update(False))
+            return
+        if result.auth_failed:
+            # Keep retrying with backoff: the login service may be down rather than the token invalid.
+            retry_in = self._interval.update(False)
+            self._on_auth_failed(retry_in if self.auto_refresh else None)
+            self._schedule_auto_refresh(retry_in)
+            return
+        self._auth_failures = 0
+        unchanged = (not self._showing_cached and self.theme in self._analyses
+                     and result.analyses.get(self.theme) == self._analyses[self.theme])
+        self._analyses_version += 1
+        if unchanged:
+            # Same analysis as on screen: keep the rendered panels and only confirm the data is current.
+            self._analyses = {theme: data for theme, data in result.analyses.items() if data and "error" not in data}
+            self.app.show_status(f"数据于 {datetime.now().strftime('%H:%M:%S')} 确认为最新")
+        else:
+            self._on_analyses(result.analyses, True, result.metrics_summary)
+        self._schedule_auto_refresh(self._interval.update(result.changed, result.last_run_end))
+
+    @staticmethod
+    def _summarize_trace(trace):
+        stages = [("认证", "auth"), ("网络", "fetch.http"), ("解析", "fetch.decode"), ("入库", "db.merge"),
+                  ("读取", "db.load"), ("分析", "analysis")]
+        return " ".join(f"{label}{trace.total(prefix) / 1000:.2f}s" for label, prefix in stages)
+
+    def _on_analyses(self, analyses, replace=False, metrics_summary=None):
+        if metrics_summary:
+            self._metrics_summary = metrics_summary
+        if replace:
+            self._analyses.clear()
+        self._analyses.update({theme: data for theme, data in analyses.items() if data and "error" not in data})
+        data = analyses.get(self.theme)
+        if self._showing_cached and not (data and "error" not in data):
+            self.app.show_status("更新失败，当前显示本地数据")
+            return
+        self._showing_cached = False
+        self.update_ui(data)
+
+    @staticmethod
+    @contextmanager
+    def _timed(name, timings):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            timings[name] = (time.perf_counter() - started) * 1000
+            metrics.record(f"render.{name}", timings[name])
+
+    def _show_runs(self, data):
+        theme_summary = data["theme_summary"]
+        uid, theme_name = data.get("uid"), theme_summary["name"]
+        if uid:
+            self.app.runs_list.set_source(
+                theme_summary["run_count"],
+                lambda offset, limit: self.service.get_runs_page(uid, theme_name, offset, limit)
+            )
+        else:
+            self.app.runs_list.update_content(theme_summary["detailed_recent_runs"])
+        self.app.set_runs_count(theme_summary.get("run_count", len(theme_summary["detailed_recent_runs"])))
 
     def update_ui(self, data):
         if data and "error" not in data:
-            self.app.header.update_content(data["player_info"], data["theme_summary"]["name"], data["career_summary"])
-            self.app.stats.update_content(data["stats"])
-            self.app.runs_list.update_content(data["theme_summary"]["detailed_recent_runs"])
-            self.app.show_status(f"数据于 {datetime.now().strftime('%H:%M:%S')} 更新")
+            timings = {}
+            with metrics.trace("render"):
+                with self._timed("header", timings):
+                    self.app.header.update_content(data["player_info"], data["theme_summary"]["name"],
+                                                   data["career_summary"])
+                with self._timed("stats", timings):
+                    self.app.stats.update_content(data["stats"])
+                with self._timed("runs", timings):
+                    self._show_runs(data)
+            logging.info("Rendered panels: " + ", ".join(f"{name} {ms:.1f}ms" for name, ms in timings.items()))
+            status = f"数据于 {datetime.now().strftime('%H:%M:%S')} 更新"
+            if metrics.show_in_status and self._metrics_summary:
+                status += f"\n{self._metrics_summary} 渲染{sum(timings.values()) / 1000:.2f}s"
+            self.app.show_status(status)
         else:
             error_msg = data.get("error", "未知错误") if data else "未能获取数据"
             self.app.show_error(error_msg)
@@ -0,0 +1,104 @@
+import configparser
+import json
+import threading
+import time
+import types
+import unittest
+import urllib.request
+
+from src.server.analysis_server import AnalysisServer
+from src.services.response_cache import ResponseCache
+
+THEME = "萨卡兹的无终奇语"
+
+
+class FakeService:
+    """Just enough of RogueService for /stats: counts analyses and takes `delay` seconds per analysis."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+        self.run_count = 10
+        self.client = None
+        self.theme_rules = {THEME: None}
+        self.db_manager = types.SimpleNamespace(write_listeners=[])
+        self._lock = threading.Lock()
+
+    def get_cached_analysis(self, uid, theme, windows=None):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return {"theme_summary": {"run_count": self.run_count}, "stats": {"win_rate": "50.0%"}}
+
+    def write(self, uid, theme):
+        """What DataManager does after committing runs: notify its write listeners."""
+        self.run_count += 1
+        for listener in self.db_manager.write_listeners:
+            listener(uid, theme)
+
+
+class AnalysisServerTest(unittest.TestCase):
+    def start(self, service, ttl):
+        config = configparser.ConfigParser()
+        config.read_dict({"APP": {"DEFAULT_THEME": THEME},
+                          "SERVER": {"CACHE_TTL_SECONDS": str(ttl), "REFRESH_INTERVAL_SECONDS": "0"}})
+        server = AnalysisServer(service, config, default_uid="1", host="127.0.0.1", port=0).start()
+        self.addCleanup(server.shutdown)
+        return server
+
+    @staticmethod
+    def get(server, path):
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.address[1]}{path}", timeout=5) as response:
+            return json.load(response)
+
+    def test_concurrent_identical_requests_compute_once(self):
+        service = FakeService(delay=0.3)
+        server = self.start(service, ttl=30)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.get(server, "/stats"))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(service.calls, 1)
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(result == results[0] for result in results))
+        stats = server.cache.stats()
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hits"] + stats["collapsed"], 7)
+
+    def test_entries_expire_after_ttl(self):
+        service = FakeService()
+        server = self.start(service, ttl=0.2)
+        self.get(server, "/stats")
+        self.get(server, "/stats")
+        self.assertEqual(service.calls, 1)
+        time.sleep(0.3)
+        self.get(server, "/stats")
+        self.assertEqual(service.calls, 2)
+
+    def test_write_invalidates_only_that_uid_and_theme(self):
+        service = FakeService()
+        server = self.start(service, ttl=30)
+        self.assertEqual(self.get(server, "/stats")["run_count"], 10)
+        self.get(server, "/stats?uid=2")
+        service.write("1", THEME)
+        self.assertEqual(self.get(server, "/stats")["run_count"], 11)
+        self.get(server, "/stats?uid=2")
+        self.assertEqual(service.calls, 3)
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def test_computation_overlapping_invalidation_is_not_stored(self):
+        cache = ResponseCache(30)
+
+        def compute():
+            cache.invalidate("1", THEME)  # a write lands while the value is being computed
+            return "stale"
+
+        self.assertEqual(cache.get_or_compute(("1", THEME, "stats"), compute), "stale")
+        self.assertEqual(cache.get_or_compute(("1", THEME, "stats"), lambda: "fresh"), "fresh")
+
+
+if __name__ == "__main__":
+    unittest.main()
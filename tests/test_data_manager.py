@@ -0,0 +1,42 @@
+import os
+import tempfile
+import unittest
+
+import src.services.data_manager as data_manager
+from benchmarks.synthetic import RecordGenerator
+
+THEME = "萨卡兹的无终奇语"
+KEPT = ("id", "modeGrade", "success", "score", "band", "startTs", "endTs", "gainRelicList")
+
+
+class MergeTrimmedRecordsTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = data_manager.DB_PATH
+        data_manager.DB_PATH = os.path.join(directory.name, "runs.db")
+        self.addCleanup(setattr, data_manager, "DB_PATH", path)
+        self.db = data_manager.DataManager()
+        self.addCleanup(self.db.close)
+        self.full = RecordGenerator(THEME, seed=3).records(100, end_ts=1_760_000_000)
+        self.db.merge_and_save_runs("1", THEME, self.full)
+
+    def trimmed(self):
+        return [{key: run[key] for key in KEPT if key in run} for run in self.full]
+
+    def test_trimmed_refresh_keeps_stored_fields(self):
+        self.assertEqual(self.db.merge_and_save_runs("1", THEME, self.trimmed()), (0, 0, 100))
+        self.assertEqual(self.db.merge_and_save_runs("1", THEME, self.trimmed()), (0, 0, 100))
+        stored = {run["id"]: run for run in self.db.get_all_runs("1", THEME)}
+        self.assertEqual(stored, {run["id"]: run for run in self.full})
+
+    def test_changed_value_updates_only_that_field(self):
+        runs = self.trimmed()
+        runs[0]["score"] += 1
+        self.assertEqual(self.db.merge_and_save_runs("1", THEME, runs), (0, 1, 99))
+        stored = {run["id"]: run for run in self.db.get_all_runs("1", THEME)}
+        self.assertEqual(stored[runs[0]["id"]], {**self.full[0], "score": self.full[0]["score"] + 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import csv
+import json
+import os
+import tempfile
+import unittest
+
+import src.services.data_manager as data_manager
+from benchmarks.synthetic import RecordGenerator
+from src.services.run_exporter import RunExporter
+
+THEME = "萨卡兹的无终奇语"
+
+
+class RunExporterTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        path = data_manager.DB_PATH
+        data_manager.DB_PATH = os.path.join(self.directory, "runs.db")
+        self.addCleanup(setattr, data_manager, "DB_PATH", path)
+        self.db = data_manager.DataManager()
+        self.addCleanup(self.db.close)
+        runs = RecordGenerator(THEME, seed=5).records(40, end_ts=1_760_000_000)
+        # The first chunks hold trimmed runs only; char lists first appear in the last one.
+        trimmed = [{key: run[key] for key in ("id", "score", "band", "startTs")} for run in runs[:30]]
+        self.db.merge_and_save_runs("1", THEME, trimmed)
+        self.db.merge_and_save_runs("1", THEME, runs[30:])
+        self.exporter = RunExporter(self.db, record_keys=["id", "score"], chunk_size=10)
+
+    def test_fields_of_later_chunks_are_exported(self):
+        for output_format in ("ndjson", "csv"):
+            path, exported = self.exporter.export(os.path.join(self.directory, f"runs.{output_format}"))
+            self.assertEqual(exported, 40)
+            with open(path, encoding="utf-8") as fp:
+                rows = [json.loads(line) for line in fp] if output_format == "ndjson" else list(csv.DictReader(fp))
+            self.assertEqual(list(rows[0])[:5], ["uid", "theme", "id", "score", "band_id"])
+            self.assertIn("lastChars", rows[0])
+            self.assertEqual(sum(1 for row in rows if row["lastChars"]), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import configparser
+import json
+import socket
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from src.api.skland_client import SklandClient
+from src.api.transport import HttpTransport
+
+
+class StubServer:
+    """Local HTTP server answering each request with the next (status, delay) of `responses`; the last repeats."""
+
+    def __init__(self, responses, body=b'{"code": 0}'):
+        self.responses = list(responses)
+        self.body = body
+        self.hits = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status, delay = stub.responses[min(stub.hits, len(stub.responses) - 1)]
+                stub.hits += 1
+                time.sleep(delay)
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(stub.body)))
+                    self.end_headers()
+                    self.wfile.write(stub.body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client gave up waiting
+
+            do_POST = do_GET
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/rogue"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def make_config(**http):
+    config = configparser.ConfigParser()
+    config.read_dict({
+        "APP": {"USER_AGENT": "test", "V_NAME": "1.0.0"},
+        "HTTP": {"CONNECT_TIMEOUT": "1", "READ_TIMEOUT": "2", "MAX_RETRIES": "2",
+                 "BACKOFF_BASE_SECONDS": "0.01", "BACKOFF_MAX_SECONDS": "0.05", **http},
+    })
+    return config
+
+
+def make_transport(**http):
+    return HttpTransport(make_config(**http))
+
+
+class HttpTransportTest(unittest.TestCase):
+    def test_recovers_after_503(self):
+        transport = make_transport()
+        with StubServer([(503, 0), (200, 0)]) as server:
+            response = transport.get(server.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(server.hits, 2)
+        stats = transport.stats()
+        self.assertEqual((stats["requests"], stats["retries"], stats["failures"]), (2, 1, 0))
+
+    def test_persistent_5xx_returns_last_response(self):
+        transport = make_transport()
+        with StubServer([(502, 0)]) as server:
+            response = transport.get(server.url)
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(server.hits, 3)  # first attempt + MAX_RETRIES
+        self.assertEqual(transport.stats()["failures"], 1)
+
+    def test_post_is_not_resent_after_5xx(self):
+        transport = make_transport()
+        with StubServer([(503, 0), (503, 0), (200, 0)]) as server:
+            self.assertEqual(transport.post(server.url, json={}).status_code, 503)
+            self.assertEqual(server.hits, 1)
+            self.assertEqual(transport.post(server.url, json={}, idempotent=True).status_code, 200)
+            self.assertEqual(server.hits, 3)
+
+    def test_connection_refused_raises_after_retries(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        transport = make_transport()
+        with self.assertRaises(requests.ConnectionError):
+            transport.get(f"http://127.0.0.1:{port}/rogue")
+        stats = transport.stats()
+        self.assertEqual((stats["requests"], stats["failures"]), (3, 1))
+
+    def test_deadline_shorter_than_latency(self):
+        transport = make_transport()
+        with StubServer([(200, 1.5)]) as server:
+            started = time.monotonic()
+            with self.assertRaises(requests.Timeout), transport.deadline(0.3):
+                transport.get(server.url)
+            elapsed = time.monotonic() - started
+        self.assertLess(elapsed, 1.0)
+
+
+class SignedGetTest(unittest.TestCase):
+    def setUp(self):
+        self.client = SklandClient(make_config())
+        self.client.cred, self.client.token = "cred", "token"
+
+    def test_rejected_credential_is_not_resent_when_reauth_fails(self):
+        for status, body, expected in ((401, b'{}', None), (200, b'{"code": 10000}', {"code": 10000})):
+            with StubServer([(status, 0)], body=body) as server:
+                for parse in (None, json.load):
+                    hits = server.hits
+                    self.assertEqual(self.client._signed_get(server.url, parse=parse), expected)
+                    self.assertEqual(server.hits - hits, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()